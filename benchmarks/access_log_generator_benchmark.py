@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Access Log Generator Benchmark
+
+1. Throughput: the runner's former per-line access log path (random.choice
+   per field and one logger.info per line through a FileHandler) vs
+   access_log_generator.AccessLogGenerator at several batch sizes, writing
+   to a temporary file on one core.
+2. Status codes by service health: the share of each code among lines served
+   by a running, degraded, critical and down service, against STATUS_WEIGHTS.
+
+    python benchmarks/access_log_generator_benchmark.py [--lines 2000000] [--legacy-lines 100000]
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from access_log_generator import ENDPOINTS, STATUS_WEIGHTS, USER_AGENTS, AccessLogGenerator  # noqa: E402
+
+SERVICES = {
+    'user-service': {'port': 8001, 'status': 'running'},
+    'product-service': {'port': 8002, 'status': 'degraded'},
+    'order-service': {'port': 8003, 'status': 'critical'},
+    'payment-service': {'port': 8004, 'status': 'down'},
+    'inventory-service': {'port': 8005, 'status': 'running'},
+    'notification-service': {'port': 8006, 'status': 'running'},
+}
+
+
+def legacy(path, lines):
+    """The runner's former generate_access_logs loop, one line at a time."""
+    access_logger = logging.getLogger('access_benchmark')
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    access_logger.addHandler(handler)
+    services = list(SERVICES)
+    start = time.perf_counter()
+    for _ in range(lines):
+        endpoint, method, port = random.choice(ENDPOINTS)
+        port = port or random.choice([8001, 8002, 8003, 8004, 8005, 8006])
+        user_agent = random.choice(USER_AGENTS)
+        if '{id}' in endpoint:
+            endpoint = endpoint.replace('{id}', str(random.randint(1000, 9999)))
+        codes, weights = STATUS_WEIGHTS[SERVICES[services[port - 8001]]['status']]
+        status_code = random.choices(codes, weights=weights)[0]
+        response_size = random.randint(45, 2048)
+        response_time = random.uniform(0.05, 5.0)
+        timestamp = time.strftime('%d/%b/%Y:%H:%M:%S +0000')
+        access_logger.info(f'127.0.0.1 - - [{timestamp}] "{method} {endpoint} HTTP/1.1" {status_code} '
+                           f'{response_size} "-" "{user_agent}" {response_time:.3f}s')
+    elapsed = time.perf_counter() - start
+    access_logger.removeHandler(handler)
+    handler.close()
+    return elapsed
+
+
+def throughput(workdir, lines, legacy_lines):
+    print("1. Throughput")
+    print(f"{'mode':>22} {'lines':>10} {'seconds':>8} {'lines/s':>10} {'lines/min':>12} {'MiB/s':>7}")
+
+    def row(label, n, seconds, path):
+        size = os.path.getsize(path) / 2**20
+        print(f"{label:>22} {n:>10,} {seconds:>8.2f} {n / seconds:>10,.0f} {n / seconds * 60:>12,.0f} "
+              f"{size / seconds:>7.1f}")
+        os.remove(path)
+
+    path = os.path.join(workdir, 'legacy.log')
+    row('per line (legacy)', legacy_lines, legacy(path, legacy_lines), path)
+    now = time.time()
+    for batch_size in (1_000, 10_000, 100_000):
+        path = os.path.join(workdir, f'bulk_{batch_size}.log')
+        stats = AccessLogGenerator(SERVICES, seed=1).write(path, lines, now - 3600, now, batch_size=batch_size)
+        row(f'bulk, batch {batch_size:,}', lines, stats['seconds'], path)
+
+
+def status_mix(lines):
+    print(f"\n2. Status codes by service health ({lines:,} lines)")
+    generator = AccessLogGenerator(SERVICES, seed=2)
+    now = time.time()
+    port_status = {config['port']: config['status'] for config in SERVICES.values()}
+    path_port = {path.split('{')[0]: port for path, _, port in ENDPOINTS if port is not None}
+    observed = {state: Counter() for state in STATUS_WEIGHTS}
+    for line in generator.batch(lines, now - 60, now):
+        path, code = line.split('"')[1].split()[1], int(line.split('" ')[1].split()[0])
+        port = next((p for prefix, p in path_port.items() if path.startswith(prefix)), None)
+        if port is not None:        # /health and /metrics do not say which service served them
+            observed[port_status[port]][code] += 1
+    print(f"{'health':>10} {'lines':>9}  code: observed% (expected%)")
+    for state, (codes, weights) in STATUS_WEIGHTS.items():
+        total = sum(observed[state].values())
+        cells = [f"{code}: {observed[state][code] / total:.1%} ({weight / sum(weights):.1%})"
+                 for code, weight in zip(codes, weights)]
+        print(f"{state:>10} {total:>9,}  " + ', '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--lines', type=int, default=2_000_000)
+    parser.add_argument('--legacy-lines', type=int, default=100_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='access_log_bench_')
+    try:
+        throughput(workdir, args.lines, args.legacy_lines)
+        status_mix(min(args.lines, 500_000))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Order ID Generator Benchmark
+
+Generates order IDs with:
+
+- legacy:  f"ord_{int(time.time())}", create_order's old scheme;
+- uuid4:   random 128-bit IDs, for reference;
+- snowflake: id_generator.IdGenerator,
+
+from one thread, from several threads sharing one generator, and from
+several forked worker processes that inherit the parent's generator. Each run
+reports the rate and the number of duplicate IDs. Every thread's IDs must
+also be strictly increasing.
+
+    python benchmarks/id_generator_benchmark.py [--ids 1000000] [--threads 8] [--processes 4]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import uuid
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from id_generator import IdGenerator  # noqa: E402
+
+GENERATOR = IdGenerator()
+
+
+def legacy_id():
+    return f"ord_{int(time.time())}"
+
+
+def uuid_id():
+    return uuid.uuid4().hex
+
+
+SCHEMES = {'legacy': legacy_id, 'uuid4': uuid_id, 'snowflake': GENERATOR.next_id}
+
+
+def report(label, ids, elapsed, ordered=None):
+    duplicates = len(ids) - len(set(ids))
+    print(f"{label:<28} {len(ids):>10,} {len(ids) / elapsed / 1e6:>8.2f} {duplicates:>11,}  "
+          f"{'-' if ordered is None else 'yes' if ordered else 'NO'}")
+
+
+def single_thread(n):
+    for name, next_id in SCHEMES.items():
+        start = time.perf_counter()
+        ids = [next_id() for _ in range(n)]
+        report(f"{name}, 1 thread", ids, time.perf_counter() - start,
+               ordered=all(a < b for a, b in zip(ids, ids[1:])) if name == 'snowflake' else None)
+
+
+def threaded(n, threads):
+    for name, next_id in SCHEMES.items():
+        per_thread = [None] * threads
+
+        def worker(i):
+            per_thread[i] = [next_id() for _ in range(n // threads)]
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        ordered = (all(all(a < b for a, b in zip(ids, ids[1:])) for ids in per_thread)
+                   if name == 'snowflake' else None)
+        report(f"{name}, {threads} threads", [i for ids in per_thread for i in ids], elapsed, ordered)
+
+
+def generate_in_child(n):
+    start = time.time()
+    ids = array('q', (GENERATOR.next_id() for _ in range(n)))
+    return ids.tobytes(), start, time.time(), GENERATOR.worker_id
+
+
+def forked(n, processes):
+    GENERATOR.next_id()    # the children inherit a generator that is mid-block
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        results = pool.map(generate_in_child, [n // processes] * processes)
+    ids = array('q')
+    for data, _, _, _ in results:
+        ids.frombytes(data)
+    elapsed = max(r[2] for r in results) - min(r[1] for r in results)
+    workers = sorted({r[3] for r in results} | {GENERATOR.worker_id})
+    # Each child's IDs come from one thread, so they must be increasing too.
+    chunks = [array('q', data).tolist() for data, _, _, _ in results]
+    report(f"snowflake, {processes} processes", ids.tolist(), elapsed,
+           ordered=all(all(a < b for a, b in zip(c, c[1:])) for c in chunks))
+    print(f"  worker ids: parent {GENERATOR.worker_id}, children {[r[3] for r in results]} "
+          f"({len(workers)} distinct)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--ids', type=int, default=1_000_000, help='IDs per run')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'scheme':<28} {'ids':>10} {'M ids/s':>8} {'duplicates':>11}  ordered")
+    single_thread(args.ids)
+    threaded(args.ids, args.threads)
+    if 'fork' in multiprocessing.get_all_start_methods():
+        forked(args.ids, args.processes)
+    print(f"Generator: {GENERATOR.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Job Executor Benchmark
+
+Models the server's request threads as a fixed thread pool (as a WSGI server
+has) and sends it a burst of heavy requests followed by light probe requests
+(e.g. health checks or searches):
+
+- inline: the heavy handler does the work on its request thread, as
+  /jobs/heavy-computation used to. Probes wait for a free thread.
+- jobs:   the heavy handler submits to job_executor.JobExecutor and returns
+  a job ID. Probes are served at once; requests beyond the queue limit are
+  rejected immediately.
+
+    python benchmarks/job_executor_benchmark.py [--heavy 40] [--work 0.5]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_executor import JobExecutor, JobQueueFull  # noqa: E402
+
+
+def heavy_work(seconds):
+    time.sleep(seconds)
+    return seconds
+
+
+def run(mode, args):
+    executor = JobExecutor(workers=args.workers, max_queue=args.queue) if mode == 'jobs' else None
+    if executor is not None:
+        executor.submit('warm-up', heavy_work, 0)   # start the pool outside the timing
+        while executor.stats()['pending']:
+            time.sleep(0.01)
+
+    def heavy(submitted):
+        if executor is None:
+            heavy_work(args.work)
+            return 200, time.perf_counter() - submitted
+        try:
+            executor.submit('heavy', heavy_work, args.work)
+            return 202, time.perf_counter() - submitted
+        except JobQueueFull:
+            return 429, time.perf_counter() - submitted
+
+    def probe(submitted):
+        return 200, time.perf_counter() - submitted
+
+    with ThreadPoolExecutor(args.threads) as server:
+        heavy_results = [server.submit(heavy, time.perf_counter()) for _ in range(args.heavy)]
+        time.sleep(0.01)
+        probes = [server.submit(probe, time.perf_counter()) for _ in range(args.probes)]
+        probe_latencies = sorted(f.result()[1] for f in probes)
+        heavy_results = [f.result() for f in heavy_results]
+    if executor is not None:
+        while executor.stats()['pending']:
+            time.sleep(0.01)
+        executor.shutdown(wait=True)
+
+    codes = {}
+    for code, _ in heavy_results:
+        codes[code] = codes.get(code, 0) + 1
+    heavy_latency = max(latency for _, latency in heavy_results)
+    print(f"{mode:>7} {probe_latencies[len(probe_latencies) // 2] * 1000:>14.1f} "
+          f"{probe_latencies[-1] * 1000:>14.1f} {heavy_latency * 1000:>17.1f}  "
+          f"{', '.join(f'{n}x{code}' for code, n in sorted(codes.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8, help='request threads')
+    parser.add_argument('--heavy', type=int, default=40, help='heavy requests in the burst')
+    parser.add_argument('--probes', type=int, default=20)
+    parser.add_argument('--work', type=float, default=0.5, help='seconds of work per heavy request')
+    parser.add_argument('--workers', type=int, default=4, help='job worker processes')
+    parser.add_argument('--queue', type=int, default=16, help='job queue limit')
+    args = parser.parse_args()
+
+    print(f"{args.threads} request threads, {args.heavy} heavy requests of {args.work:.1f}s, "
+          f"{args.probes} probes; jobs: {args.workers} workers, queue {args.queue}")
+    print(f"{'mode':>7} {'probe p50 ms':>14} {'probe max ms':>14} {'heavy reply ms':>17}  responses")
+    for mode in ('inline', 'jobs'):
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
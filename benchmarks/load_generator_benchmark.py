@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Load Generator Benchmark
+
+Shows coordinated omission against a local stand-in server that answers in
+about 1 ms but stalls every request for `--stall` seconds once per
+`--period` (a GC pause, a lock convoy or a deadlock-and-timeout):
+
+1. Closed loop: client threads each send a request, wait for the response
+   and pace themselves to the target rate. During a stall they all wait,
+   send nothing and record one slow sample each, so the percentiles hide
+   the stall.
+2. Open loop: load_generator.LoadGenerator at the same rate. Requests keep
+   arriving on schedule during a stall. `latency` (from the intended send
+   time) shows what users saw; `service time` (from the actual send) is what
+   the closed loop measured.
+
+    python benchmarks/load_generator_benchmark.py [--rps 200] [--duration 10] [--stall 0.5] [--period 2.5]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+
+from load_generator import LoadGenerator  # noqa: E402
+from request_metrics import HdrHistogram  # noqa: E402
+
+
+class StallingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, stall, period):
+        super().__init__(('127.0.0.1', 0), StallingHandler)
+        self.stall = stall
+        self.period = period
+        self.started = time.perf_counter()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def wait_for_stall(self):
+        """Sleeps until the current stall (if any) is over."""
+        phase = (time.perf_counter() - self.started) % self.period
+        if phase > self.period - self.stall:
+            time.sleep(self.period - phase)
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StallingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.wait_for_stall()
+        time.sleep(0.001)
+        data = json.dumps([{'id': 'item_123'}]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def closed_loop(url, rps, duration, threads):
+    histogram, lock = HdrHistogram(), threading.Lock()
+    interval = threads / rps
+    deadline = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        next_send = time.perf_counter()
+        while next_send < deadline:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent = time.perf_counter()
+            session.get(url + '/api/v2/products/search', params={'q': 'widget'}, timeout=10).content
+            with lock:
+                histogram.record(int((time.perf_counter() - sent) * 1e6))
+            next_send = max(next_send + interval, time.perf_counter())     # never catches up on missed sends
+        session.close()
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return histogram.to_dict()
+
+
+def row(label, stats):
+    print(f"{label:>26} {stats['count']:>9} {stats['p50_us'] / 1000:>8.1f} {stats['p90_us'] / 1000:>8.1f} "
+          f"{stats['p99_us'] / 1000:>8.1f} {stats['p99.9_us'] / 1000:>9.1f} {stats['max_us'] / 1000:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rps', type=float, default=200.0)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--stall', type=float, default=0.5, help='seconds every request is held per period')
+    parser.add_argument('--period', type=float, default=2.5)
+    parser.add_argument('--threads', type=int, default=8, help='client threads in both modes')
+    args = parser.parse_args()
+
+    server = StallingServer(args.stall, args.period)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stalled = args.stall / args.period
+    print(f"{args.rps:g} rps for {args.duration:g}s; the server stalls {args.stall:g}s every {args.period:g}s "
+          f"({stalled:.0%} of the time), {args.threads} client threads")
+    print(f"{'mode':>26} {'requests':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'max ms':>8}")
+    try:
+        row('closed loop', closed_loop(server.url, args.rps, args.duration, args.threads))
+        mix = {'search': (1, lambda rng: ('GET', '/api/v2/products/search', {'params': {'q': 'widget'}}))}
+        report = LoadGenerator(server.url, mix, args.rps, args.duration, concurrency=args.threads,
+                               arrivals='constant', seed=1).run()
+        row('open loop, latency', report['overall']['latency'])
+        row('open loop, service time', report['overall']['service_time'])
+    finally:
+        server.shutdown()
+    # With a fraction s of the time stalled for S seconds, about s of the
+    # requests arrive during a stall and wait S/2 on average (up to S).
+    print(f"   expected: ~{stalled:.0%} of requests delayed by up to {args.stall * 1000:.0f} ms, so p90 and "
+          f"above are stall-bound")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Lock Manager Benchmark
+
+Replays the order/inventory critical sections of buggy_app.py with scaled-down
+work times, under concurrent load from both code paths:
+
+- legacy:  create_order nests ORDERS -> INVENTORY, process_inventory_update
+           nests INVENTORY -> ORDERS and runs its consistency check while
+           holding both (the original code);
+- ordered-held: both take the locks through lock_profiler.LockManager (one
+           canonical order, timeouts with retry/backoff), but the consistency
+           check still runs while holding both;
+- ordered: as buggy_app.py did before order_store.py, the consistency check
+           runs on a snapshot after the locks are released.
+
+Workers are daemon threads, so a deadlocked legacy run simply stops making
+progress; the report shows completed operations, throughput and how many
+workers were still stuck at the end.
+
+    python benchmarks/lock_manager_benchmark.py [--threads 8] [--duration 3]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lock_profiler import InstrumentedLock, LockAcquisitionTimeout, LockManager, LockRegistry  # noqa: E402
+
+WORK = 0.002    # simulated work inside a critical section (0.1s in the app)
+CHECK = 0.010   # simulated consistency check (0.5s in the app)
+
+
+def legacy_create(orders, inventory, state):
+    with orders:
+        time.sleep(WORK)
+        with inventory:
+            state['stock'] -= 1
+
+
+def legacy_update(orders, inventory, state):
+    with inventory:
+        time.sleep(WORK)
+        with orders:
+            time.sleep(CHECK)
+
+
+def ordered_create(manager, orders, inventory, state):
+    with manager.acquire_all(orders, inventory):
+        time.sleep(WORK)
+        state['stock'] -= 1
+
+
+def ordered_held_update(manager, orders, inventory, state):
+    with manager.acquire_all(inventory, orders):
+        time.sleep(WORK)
+        time.sleep(CHECK)
+
+
+def ordered_update(manager, orders, inventory, state):
+    with manager.acquire_all(inventory, orders):
+        time.sleep(WORK)
+        snapshot = state['stock']
+    time.sleep(CHECK)
+    return snapshot
+
+
+def run(mode, threads, duration):
+    registry = LockRegistry()
+    orders = InstrumentedLock('DB_LOCK_ORDERS', registry)
+    inventory = InstrumentedLock('DB_LOCK_INVENTORY', registry)
+    manager = LockManager(timeout=0.05, retries=5, backoff=0.005)
+    state = {'stock': 10 ** 9}
+    completed, failed = [0] * threads, [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def worker(i):
+        while time.perf_counter() < deadline:
+            try:
+                if mode == 'legacy':
+                    (legacy_create if i % 2 == 0 else legacy_update)(orders, inventory, state)
+                elif mode == 'ordered-held':
+                    (ordered_create if i % 2 == 0 else ordered_held_update)(manager, orders, inventory, state)
+                else:
+                    (ordered_create if i % 2 == 0 else ordered_update)(manager, orders, inventory, state)
+                completed[i] += 1
+            except LockAcquisitionTimeout:
+                failed[i] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join(timeout=max(0.0, deadline - time.perf_counter()) + 1.0)
+    stuck = sum(t.is_alive() for t in workers)
+    snapshot = registry.snapshot()
+    return {
+        'ops': sum(completed),
+        'failed': sum(failed),
+        'throughput': sum(completed) / duration,
+        'stuck': stuck,
+        'inversions': len(snapshot['order_inversions']),
+        'manager': manager.stats() if mode != 'legacy' else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.duration:.1f}s per mode, work {WORK * 1000:.0f} ms, "
+          f"check {CHECK * 1000:.0f} ms")
+    results = {}
+    for mode in ('legacy', 'ordered-held', 'ordered'):
+        results[mode] = result = run(mode, args.threads, args.duration)
+        print(f"{mode:>12}: {result['ops']:6d} ops  {result['throughput']:8.1f} ops/s  "
+              f"{result['failed']} timed out  {result['stuck']} worker(s) deadlocked  "
+              f"{result['inversions']} order inversion(s)")
+        if result['manager']:
+            print(f"              lock manager: {result['manager']}")
+    for mode in ('ordered-held', 'ordered'):
+        legacy, gained = results['legacy']['throughput'], results[mode]['throughput']
+        print(f"Throughput gain of {mode} over legacy: " +
+              (f"{gained / legacy:.1f}x" if legacy else f"legacy made no progress ({gained:.1f} ops/s vs 0)"))
+    held = results['ordered-held']['throughput']
+    if held:
+        print(f"Gain from checking outside the locks: {results['ordered']['throughput'] / held:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Log Queue Benchmark
+
+Latency of one logger.error() call on the calling thread, with several
+threads logging at once, through the runner's handler set (application and
+error log files, console), where every flush of a handler stands in for slow
+storage by sleeping `--flush-delay` seconds:
+
+- direct: stdlib FileHandler/StreamHandler on the logger, as before. Every
+  call formats, writes and flushes under the handler locks.
+- queue, block: log_queue.QueueLogWriter, waiting for room when full.
+- queue, drop: the same with a small queue, dropping records when full.
+
+Reports call latency percentiles, calls per second, how long the writer took
+to catch up after the last call, records dropped and written, and how
+many times the handlers were flushed.
+
+    python benchmarks/log_queue_benchmark.py [--threads 8] [--records 2000] [--flush-delay 0.0002]
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_queue import BatchedFileHandler, BatchedStreamHandler, QueueLogWriter  # noqa: E402
+from request_metrics import HdrHistogram  # noqa: E402
+
+FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class SlowFlushMixin:
+    flush_delay = 0.0
+
+    def flush(self):
+        super().flush()
+        time.sleep(self.flush_delay)
+
+
+class SlowFileHandler(SlowFlushMixin, logging.FileHandler):
+    pass
+
+
+class SlowStreamHandler(SlowFlushMixin, logging.StreamHandler):
+    pass
+
+
+class SlowBatchedFileHandler(SlowFlushMixin, BatchedFileHandler):
+    pass
+
+
+class SlowBatchedStreamHandler(SlowFlushMixin, BatchedStreamHandler):
+    pass
+
+
+def make_handlers(workdir, mode, console, batched):
+    file_class = SlowBatchedFileHandler if batched else SlowFileHandler
+    stream_class = SlowBatchedStreamHandler if batched else SlowStreamHandler
+    app = file_class(os.path.join(workdir, f'{mode}_application.log'))
+    app.addFilter(lambda record: record.levelno < logging.ERROR)
+    errors = file_class(os.path.join(workdir, f'{mode}_error.log'))
+    errors.setLevel(logging.ERROR)
+    handlers = [app, errors, stream_class(console)]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(FORMAT))
+    return handlers
+
+
+def run(logger, threads, records):
+    histogram, lock = HdrHistogram(), threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker(n):
+        latencies = []
+        barrier.wait()
+        for i in range(records):
+            start = time.perf_counter_ns()
+            logger.error("INCIDENT_ID:%s - worker %d record %d: connection pool exhausted", 'inc-42', n, i)
+            latencies.append(time.perf_counter_ns() - start)
+        with lock:
+            for ns in latencies:
+                histogram.record(ns)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return histogram, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--records', type=int, default=2000, help='records per thread')
+    parser.add_argument('--flush-delay', type=float, default=0.0002, help='seconds each handler flush takes')
+    parser.add_argument('--drop-queue', type=int, default=1000, help='queue size for the drop policy')
+    args = parser.parse_args()
+    SlowFlushMixin.flush_delay = args.flush_delay
+
+    workdir = tempfile.mkdtemp(prefix='log_queue_bench_')
+    console = open(os.devnull, 'w')
+    total = args.threads * args.records
+    print(f"{args.threads} threads x {args.records} logger.error() calls, {args.flush_delay * 1e6:.0f} µs per "
+          f"handler flush, 3 handlers")
+    print(f"{'mode':>13} {'p50 µs':>8} {'p99 µs':>8} {'p99.9 µs':>9} {'max µs':>9} {'calls/s':>9} "
+          f"{'catch-up s':>10} {'dropped':>8} {'written':>8} {'flushes':>8}")
+    try:
+        for mode, policy, max_queue in (('direct', None, None), ('queue, block', 'block', 10_000),
+                                        ('queue, drop', 'drop', args.drop_queue)):
+            logger = logging.getLogger(f'log_queue_benchmark.{policy}')
+            logger.propagate = False
+            handlers = make_handlers(workdir, policy or mode, console, batched=policy is not None)
+            writer = None
+            if policy is None:
+                for handler in handlers:
+                    logger.addHandler(handler)
+            else:
+                writer = QueueLogWriter(handlers, max_queue=max_queue, policy=policy).start()
+                logger.addHandler(writer.handler)
+            histogram, elapsed = run(logger, args.threads, args.records)
+            last_call = time.perf_counter()
+            if writer is not None:
+                writer.flush()
+                stats = writer.stats()
+                writer.stop()
+            else:
+                stats = {'dropped': 0, 'written': total, 'batches': total}     # one flush per record
+                for handler in handlers:
+                    handler.close()
+            catch_up = time.perf_counter() - last_call
+            p = histogram.percentiles((50, 99, 99.9))
+            print(f"{mode:>13} {p[50] / 1000:>8.1f} {p[99] / 1000:>8.1f} {p[99.9] / 1000:>9.1f} "
+                  f"{histogram.max / 1000:>9.1f} {total / elapsed:>9,.0f} {catch_up:>10.2f} "
+                  f"{stats['dropped']:>8} {stats['written']:>8} {stats['batches']:>8}")
+    finally:
+        console.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Notification Queue Benchmark
+
+Runs notification_queue.NotificationQueue against a local fake SMTP relay
+(threaded, with a per-message delay standing in for relay latency):
+
+1. Request latency: sending each notification synchronously on the request
+   thread (connect, send, quit) vs enqueueing it, with the time until
+   everything is delivered and the SMTP connections used.
+2. Relay outage: the relay goes down while messages are being queued; they
+   spill to the spool and are delivered once it is back. One recipient is
+   refused permanently and must end up as a dead letter. Every other message
+   must arrive exactly once.
+3. Shared spool: two queues drain one spool directory concurrently; every
+   message must arrive exactly once.
+
+    python benchmarks/notification_queue_benchmark.py [--messages 500] [--relay-delay 0.002]
+"""
+import argparse
+import glob
+import os
+import shutil
+import smtplib
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from email import message_from_bytes
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notification_queue import NotificationQueue  # noqa: E402
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib: EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+    def handle(self):
+        relay = self.server
+        with relay.lock:
+            relay.connections += 1
+            relay.sockets.add(self.connection)
+        try:
+            self._reply('220 fake-relay ESMTP')
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode().strip()
+                verb = command[:4].upper()
+                if verb == 'EHLO':
+                    self._reply('250-fake-relay\r\n250 8BITMIME')
+                elif verb in ('HELO', 'MAIL', 'RSET', 'NOOP'):
+                    self._reply('250 OK')
+                elif verb == 'RCPT':
+                    self._reply('550 No such user' if 'bounce' in command else '250 OK')
+                elif verb == 'DATA':
+                    self._reply('354 End data with <CR><LF>.<CR><LF>')
+                    data = []
+                    for line in self.rfile:
+                        if line in (b'.\r\n', b'.\n'):
+                            break
+                        data.append(line[1:] if line.startswith(b'..') else line)
+                    time.sleep(relay.delay)
+                    message = message_from_bytes(b''.join(data))
+                    with relay.lock:
+                        relay.received.append(message['X-Notification-Id'])
+                    self._reply('250 Queued')
+                elif verb == 'QUIT':
+                    self._reply('221 Bye')
+                    return
+                else:
+                    self._reply('502 Not implemented')
+        except OSError:
+            pass
+        finally:
+            with relay.lock:
+                relay.sockets.discard(self.connection)
+
+    def _reply(self, text):
+        self.wfile.write(text.encode() + b'\r\n')
+
+
+class FakeSMTPRelay(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, delay=0.0):
+        super().__init__(('127.0.0.1', port), FakeSMTPHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.received = []
+        self.sockets = set()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def down(self):
+        """Stops accepting and drops every open connection, like a relay crash."""
+        self.shutdown()
+        self.server_close()
+        with self.lock:
+            for sock in self.sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def request_latency(messages, delay, workdir):
+    relay = FakeSMTPRelay(delay=delay)
+    print(f"1. Request latency ({messages} notifications, relay takes {delay * 1000:.1f} ms per message)")
+    print(f"{'mode':>12} {'p50 ms':>8} {'p99 ms':>8} {'delivered in s':>15} {'connections':>12}")
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(messages):
+        t = time.perf_counter()
+        with smtplib.SMTP('127.0.0.1', relay.port, timeout=5) as conn:
+            conn.sendmail('noreply@ecommerce.example', [f'user{i}@example.com'],
+                          f"Subject: Order\r\nX-Notification-Id: sync-{i}\r\n\r\nConfirmed.")
+        latencies.append(time.perf_counter() - t)
+    print(f"{'synchronous':>12} {percentile(latencies, 0.5) * 1000:>8.3f} {percentile(latencies, 0.99) * 1000:>8.3f} "
+          f"{time.perf_counter() - start:>15.2f} {relay.connections:>12}")
+
+    before = relay.connections
+    notifications = NotificationQueue('127.0.0.1', relay.port, spool_dir=os.path.join(workdir, 'latency'))
+    notifications.start()
+    latencies = []
+    start = time.perf_counter()
+    for i in range(messages):
+        t = time.perf_counter()
+        notifications.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.')
+        latencies.append(time.perf_counter() - t)
+    notifications.flush(60)
+    stats = notifications.stats()
+    print(f"{'queued':>12} {percentile(latencies, 0.5) * 1000:>8.3f} {percentile(latencies, 0.99) * 1000:>8.3f} "
+          f"{time.perf_counter() - start:>15.2f} {relay.connections - before:>12}")
+    print(f"   {stats['sent']} sent in {stats['batches']} batches; batch p50 {stats['batch']['p50_ms']} ms")
+    notifications.stop()
+    relay.down()
+
+
+def outage(messages, delay, workdir):
+    print(f"\n2. Relay outage ({messages} notifications, relay down for the second half)")
+    relay = FakeSMTPRelay(delay=delay)
+    port = relay.port
+    spool = os.path.join(workdir, 'outage')
+    notifications = NotificationQueue('127.0.0.1', port, spool_dir=spool, backoff=0.1, max_backoff=0.5)
+    notifications.start()
+    half = messages // 2
+    for i in range(half):
+        notifications.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.')
+    notifications.enqueue('bounce@example.com', 'Order', 'Confirmed.')
+    notifications.flush(30)
+    relay.down()
+    for i in range(half, messages):
+        notifications.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.')
+    time.sleep(0.5)
+    stats = notifications.stats()
+    print(f"   relay down: state {stats['relay_state']}, {stats['pending']} messages pending, "
+          f"{len(glob.glob(os.path.join(spool, '*.json')))} spool files, {stats['retries']} retries")
+    revived = FakeSMTPRelay(port=port, delay=delay)
+    start = time.perf_counter()
+    notifications.flush(60)
+    stats = notifications.stats()
+    received = relay.received + revived.received
+    print(f"   relay back: drained in {time.perf_counter() - start:.2f}s, state {stats['relay_state']}, "
+          f"{stats['pending']} pending, {stats['dead_letters']} dead letter(s)")
+    print(f"   delivered {len(set(received))} of {messages} distinct messages, "
+          f"{len(received) - len(set(received))} duplicates")
+    notifications.stop()
+    revived.down()
+
+
+def shared_spool(messages, delay, workdir):
+    print(f"\n3. Shared spool ({messages} spooled notifications, two queues draining it)")
+    spool = os.path.join(workdir, 'shared')
+    writer = NotificationQueue(None, spool_dir=spool)    # no relay: everything is spooled
+    for i in range(messages):
+        writer.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.')
+    writer.stop()
+    relay = FakeSMTPRelay(delay=delay)
+    queues = [NotificationQueue('127.0.0.1', relay.port, spool_dir=spool, batch_size=10).start() for _ in range(2)]
+    for notifications in queues:
+        notifications.flush(60)
+    sent = [q.stats()['sent'] for q in queues]
+    print(f"   sent per queue {sent}; delivered {len(set(relay.received))} distinct, "
+          f"{len(relay.received) - len(set(relay.received))} duplicates")
+    for notifications in queues:
+        notifications.stop()
+    relay.down()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--relay-delay', type=float, default=0.002, help='seconds the relay takes per message')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='notification_bench_')
+    try:
+        request_latency(args.messages, args.relay_delay, workdir)
+        outage(args.messages, args.relay_delay, workdir)
+        shared_spool(args.messages, args.relay_delay, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
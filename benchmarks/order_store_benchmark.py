@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Order Store Benchmark
+
+Several worker processes, each with several request threads, place orders
+against one order_store.SQLiteOrderStore database file, as buggy_app.py does
+under a multi-process WSGI server. Total demand is twice the seeded stock, so
+about half the orders must be refused as out of stock.
+
+For each connection pool size the report shows throughput, order latency,
+outcomes and pool saturation (share of acquisitions that had to wait, and the
+slowest wait), then checks the database: no item's stock went negative and
+stock plus ordered quantity equals the seeded stock for every item.
+
+    python benchmarks/order_store_benchmark.py [--processes 4] [--threads 8] [--orders 400]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_store import SQLiteOrderStore, StoreBusy  # noqa: E402
+
+
+def place_orders(path, pool_size, threads, orders, items, seed):
+    """One worker process: `threads` threads placing `orders` single-unit orders in total."""
+    store = SQLiteOrderStore(path, pool_size=pool_size)
+    latencies, outcomes = [], {'created': 0, 'out_of_stock': 0, 'busy': 0}
+    lock = threading.Lock()
+
+    def worker(n, offset):
+        local, counts = [], {'created': 0, 'out_of_stock': 0, 'busy': 0}
+        for i in range(n):
+            item_id = f"item_{(seed + offset + i * 7) % items:04d}"
+            start = time.perf_counter()
+            try:
+                created = store.create_order(f"ord_{uuid.uuid4().hex}", item_id, 1)
+                counts['created' if created else 'out_of_stock'] += 1
+            except StoreBusy:
+                counts['busy'] += 1
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+            for key, value in counts.items():
+                outcomes[key] += value
+
+    started = time.time()
+    share = [orders // threads + (i < orders % threads) for i in range(threads)]
+    pool = [threading.Thread(target=worker, args=(n, i * 131)) for i, n in enumerate(share)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    finished = time.time()
+    pool_stats = store.pool.stats()
+    store.close()
+    return latencies, outcomes, pool_stats, started, finished
+
+
+def run(args, pool_size, workdir):
+    path = os.path.join(workdir, f"orders_pool{pool_size}.db")
+    total = args.processes * args.orders
+    stock = {f"item_{i:04d}": total // args.items // 2 for i in range(args.items)}
+    store = SQLiteOrderStore(path)
+    store.seed_inventory(stock)
+    store.close()
+
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(args.processes) as pool:
+        results = pool.starmap(place_orders, [(path, pool_size, args.threads, args.orders, args.items, p * 17)
+                                              for p in range(args.processes)])
+    # Wall time from the first worker starting to the last one finishing, without process start-up.
+    elapsed = max(result[4] for result in results) - min(result[3] for result in results)
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    outcomes = {key: sum(result[1][key] for result in results) for key in results[0][1]}
+    acquisitions = sum(result[2]['acquisitions'] for result in results)
+    waits = sum(result[2]['waits'] for result in results)
+    max_wait = max(result[2]['wait']['max_ms'] for result in results)
+
+    snapshot = SQLiteOrderStore(path).snapshot()
+    consistent = (all(item['stock'] >= 0 and item['stock'] + item['ordered'] == stock[item_id]
+                      for item_id, item in snapshot.items())
+                  and sum(item['orders'] for item in snapshot.values()) == outcomes['created'])
+    print(f"{pool_size:>5} {len(latencies) / elapsed:>9.0f} {latencies[len(latencies) // 2] * 1000:>8.2f} "
+          f"{latencies[int(len(latencies) * 0.99)] * 1000:>8.2f} {outcomes['created']:>8} "
+          f"{outcomes['out_of_stock']:>7} {outcomes['busy']:>5} {waits / acquisitions:>7.1%} "
+          f"{max_wait:>12.2f}  {'yes' if consistent else 'NO'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processes', type=int, default=4, help='worker processes sharing the database')
+    parser.add_argument('--threads', type=int, default=8, help='request threads per process')
+    parser.add_argument('--orders', type=int, default=400, help='orders placed per process')
+    parser.add_argument('--items', type=int, default=16)
+    parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    print(f"{args.processes} processes x {args.threads} threads, {args.orders} orders per process "
+          f"over {args.items} items (demand = 2x stock)")
+    print(f"{'pool':>5} {'orders/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'created':>8} {'no stock':>7} "
+          f"{'busy':>5} {'waited':>7} {'max wait ms':>12}  consistent")
+    workdir = tempfile.mkdtemp(prefix='order_store_bench_')
+    try:
+        for pool_size in args.pool_sizes:
+            run(args, pool_size, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Payment Client Benchmark
+
+Runs payment_client.PaymentClient against a local stand-in payment server
+(HTTP/1.1 keep-alive, configurable API versions, latency and failures):
+
+1. Connection reuse: sequential payments with a new connection per call
+   (plain requests.post) vs the client's pooled session, with the number of
+   TCP connections the server accepted.
+2. Version negotiation: the server offers only the legacy v2 endpoint, then
+   only v3; the client falls back and later renegotiates.
+3. Circuit breaker: the server fails with 500s, so the breaker opens and
+   fails fast. After each reset timeout one half-open probe is let through:
+   it fails while the server still returns 500 or is slower than the read
+   timeout (reopening the circuit), and closes it once the server recovers.
+
+    python benchmarks/payment_client_benchmark.py [--calls 300]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payment_client import VERSION_PATHS, CircuitBreaker, CircuitOpen, PaymentClient, PaymentError  # noqa: E402
+
+
+class StandInPaymentServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.versions = {'v3'}
+        self.delay = 0.0
+        self.status = 200
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):   # clients that timed out and hung up
+            super().handle_error(request, client_address)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'     # keep connections open between requests
+    # Headers and body are separate writes; with Nagle on, the body waits for the
+    # client's delayed ACK (~40 ms) on every reused connection.
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        versions = [v for v, path in VERSION_PATHS.items() if path == self.path]
+        if not versions or versions[0] not in server.versions:
+            return self._reply(404, {'error': 'Not found'})
+        time.sleep(server.delay)
+        if server.status != 200:
+            return self._reply(server.status, {'error': 'Payment backend unavailable'})
+        self._reply(200, {'status': 'paid', 'order_id': payload.get('order_id'), 'version': versions[0]})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def connection_reuse(server, calls):
+    print(f"1. Connection reuse ({calls} sequential payments)")
+    print(f"{'mode':>18} {'mean ms':>8} {'p99 ms':>8} {'connections':>12}")
+    url = server.url + VERSION_PATHS['v3']
+    client = PaymentClient(server.url)
+    modes = {
+        'new connection': lambda i: requests.post(url, json={'order_id': i, 'amount': 1}, timeout=(0.5, 2.0)),
+        'pooled client': lambda i: client.process(i, 1),
+    }
+    for mode, call in modes.items():
+        before = server.connections
+        latencies = []
+        for i in range(calls):
+            start = time.perf_counter()
+            call(f"ord_{i}")
+            latencies.append(time.perf_counter() - start)
+        print(f"{mode:>18} {sum(latencies) / calls * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f} "
+              f"{server.connections - before:>12}")
+    print(f"   client: {client.stats()['connections']}")
+    client.close()
+
+
+def version_negotiation(server):
+    print("\n2. Version negotiation")
+    client = PaymentClient(server.url)
+    for versions in ({'v2'}, {'v2'}, {'v3'}, {'v3'}):
+        server.versions = versions
+        before = server.requests
+        result = client.process('ord_negotiate', 1)
+        print(f"   server offers {sorted(versions)} -> paid via {result['version']} "
+              f"({server.requests - before} request(s)), client version {client.version}, "
+              f"fallbacks {client.version_fallbacks}")
+    server.versions = set()
+    try:
+        client.process('ord_negotiate', 1)
+    except PaymentError as e:
+        print(f"   server offers nothing -> {type(e).__name__}: {e}")
+    server.versions = {'v3'}
+    client.close()
+
+
+def circuit_breaker(server, reset_timeout):
+    print(f"\n3. Circuit breaker (5 failures to open, reset after {reset_timeout:.1f}s, read timeout 0.2s)")
+    breaker = CircuitBreaker('payment-service', failure_threshold=5, reset_timeout=reset_timeout)
+    client = PaymentClient(server.url, read_timeout=0.2, breaker=breaker)
+    client.process('ord_warm', 1)
+    # (server behaviour, delay, status, calls, wait for the reset timeout first)
+    phases = [('failing (500)', 0.0, 500, 10, False), ('still failing', 0.0, 500, 5, True),
+              ('slow (0.5s)', 0.5, 200, 5, True), ('recovered', 0.0, 200, 5, False),
+              ('recovered', 0.0, 200, 5, True)]
+    print(f"{'server':>14} {'after reset':>11} {'calls':>6} {'paid':>5} {'failed':>7} {'fast-failed':>12} "
+          f"{'mean ms':>8} {'state':>10}")
+    for label, delay, status, calls, after_reset in phases:
+        server.delay, server.status = delay, status
+        if after_reset:
+            time.sleep(reset_timeout)
+        paid = failed = rejected = 0
+        start = time.perf_counter()
+        for i in range(calls):
+            try:
+                client.process(f"ord_cb_{i}", 1)
+                paid += 1
+            except CircuitOpen:
+                rejected += 1
+            except PaymentError:
+                failed += 1
+        elapsed = time.perf_counter() - start
+        print(f"{label:>14} {'yes' if after_reset else 'no':>11} {calls:>6} {paid:>5} {failed:>7} {rejected:>12} {elapsed / calls * 1000:>8.1f} "
+              f"{breaker.state:>10}")
+    stats = client.stats()
+    print(f"   outcomes: {stats['outcomes']}")
+    print(f"   transitions: {stats['breaker']['transitions']}")
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--reset-timeout', type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = StandInPaymentServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        connection_reuse(server, args.calls)
+        version_negotiation(server)
+        circuit_breaker(server, args.reset_timeout)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
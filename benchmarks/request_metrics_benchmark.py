@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Request Metrics Benchmark
+
+1. Accuracy: percentiles of a long-tailed (lognormal) latency sample from
+   request_metrics.HdrHistogram and from lock_profiler.LatencyHistogram
+   (log2 buckets), against the exact values.
+2. Overhead: the cost of recording one request in RequestMetrics, and the
+   per-request difference between a plain and an instrumented Flask app
+   (through Flask's test client, without a network).
+3. A sample /metrics snapshot after a mixed workload (successes, a 4xx, a
+   5xx and an unmatched path).
+
+    python benchmarks/request_metrics_benchmark.py [--samples 200000] [--requests 5000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lock_profiler import LatencyHistogram  # noqa: E402
+from request_metrics import HdrHistogram, RequestMetrics, instrument_flask  # noqa: E402
+
+
+def accuracy(samples):
+    rng = random.Random(7)
+    values = sorted(int(rng.lognormvariate(8, 1.2)) for _ in range(samples))    # µs, median ~3 ms
+    hdr, log2 = HdrHistogram(), LatencyHistogram()
+    for v in values:
+        hdr.record(v)
+        log2.record(v / 1e6)
+    print(f"1. Accuracy ({samples:,} lognormal latencies)")
+    print(f"{'percentile':>10} {'exact µs':>10} {'hdr µs':>10} {'hdr err':>8} {'log2 µs':>10} {'log2 err':>9}")
+    hdr_values = hdr.percentiles()
+    for p in (50, 90, 99, 99.9):
+        exact = values[int(-(-len(values) * p // 100)) - 1]
+        h, l = hdr_values[p], log2.percentile(p) * 1e6
+        print(f"{p:>10g} {exact:>10} {h:>10} {(h - exact) / exact:>8.2%} {l:>10.0f} {(l - exact) / exact:>9.2%}")
+
+
+def make_app(instrumented):
+    app = Flask(f"bench_{instrumented}")
+
+    @app.route('/items/<item_id>')
+    def item(item_id):
+        return jsonify({'id': item_id})
+
+    @app.route('/fail')
+    def fail():
+        raise RuntimeError("boom")
+
+    @app.route('/missing')
+    def missing():
+        return jsonify({'error': 'not found'}), 404
+
+    metrics = instrument_flask(app, RequestMetrics(capacity=8)) if instrumented else None
+    return app, metrics
+
+
+def overhead(requests):
+    metrics = RequestMetrics()
+    n = 200_000
+    start = time.perf_counter()
+    for _ in range(n):
+        t = metrics.begin()
+        metrics.route_started('GET', '/items/<item_id>')
+        metrics.end(t, 'GET', '/items/<item_id>', 200, True)
+    record = (time.perf_counter() - start) / n
+    print(f"\n2. Overhead")
+    print(f"   RequestMetrics begin/route_started/end: {record * 1e6:.2f} µs per request")
+
+    per_request = {}
+    for instrumented in (False, True):
+        app, _ = make_app(instrumented)
+        client = app.test_client()
+        for i in range(200):
+            client.get(f'/items/{i}')
+        best = float('inf')
+        for _ in range(3):
+            start = time.perf_counter()
+            for i in range(requests):
+                client.get(f'/items/{i}')
+            best = min(best, (time.perf_counter() - start) / requests)
+        per_request[instrumented] = best
+    print(f"   Flask test client: plain {per_request[False] * 1e6:.1f} µs, instrumented "
+          f"{per_request[True] * 1e6:.1f} µs per request (+{(per_request[True] - per_request[False]) * 1e6:.1f} µs)")
+
+
+def sample_snapshot():
+    app, metrics = make_app(True)
+    app.logger.disabled = True
+    client = app.test_client()
+    for i in range(50):
+        client.get(f'/items/{i}')
+    client.get('/missing')
+    client.get('/fail')
+    client.get('/no/such/path')
+    snapshot = metrics.snapshot()
+    print("\n3. Sample /metrics snapshot")
+    print(json.dumps(snapshot, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--samples', type=int, default=200_000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    accuracy(args.samples)
+    overhead(args.requests)
+    sample_snapshot()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Result Cache Benchmark
+
+1. Stampede: many threads miss on the same key at once, with a slow loader
+   (standing in for the unindexed query). With single-flight loading the
+   loader runs once and every thread gets its result.
+2. Hot queries: a Zipf-distributed stream of searches against
+   search_index.ProductSearchIndex (synthetic catalog, see
+   search_index_benchmark.py), uncached and through result_cache.ResultCache
+   at several sizes, reporting hit rate, evictions and mean latency.
+
+    python benchmarks/result_cache_benchmark.py [--products 200000] [--threads 64]
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache  # noqa: E402
+from search_index import ProductSearchIndex  # noqa: E402
+from search_index_benchmark import ADJECTIVES, NOUNS, synthetic_catalog  # noqa: E402
+
+LOADER_SECONDS = 0.05
+
+
+def stampede(threads):
+    cache = ResultCache('stampede')
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(LOADER_SECONDS)
+        return ['result']
+
+    barrier = threading.Barrier(threads)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get_or_load('product:search:widget', loader))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    stats = cache.stats()
+    print(f"Stampede: {threads} concurrent misses -> {len(calls)} loader call(s), "
+          f"{stats['coalesced']} coalesced, {len(results)} results in {elapsed * 1000:.0f} ms "
+          f"(loader takes {LOADER_SECONDS * 1000:.0f} ms)")
+
+
+def zipf_queries(n, distinct, s=1.1, seed=5):
+    rng = random.Random(seed)
+    pool = [f"{adj} {noun}" for adj in ADJECTIVES for noun in NOUNS]
+    pool += [f"{adj} {noun[:2]}" for adj in ADJECTIVES for noun in NOUNS]
+    rng.shuffle(pool)
+    pool = pool[:distinct]
+    weights = [1 / (rank + 1) ** s for rank in range(len(pool))]
+    return rng.choices(pool, weights, k=n), len(pool)
+
+
+def hot_queries(index, queries, max_entries):
+    cache = ResultCache('product:search', max_entries=max_entries, ttl=60.0) if max_entries else None
+    start = time.perf_counter()
+    for query in queries:
+        if cache is None:
+            index.search(query)
+        else:
+            cache.get_or_load(query, lambda: index.search(query))
+    elapsed = time.perf_counter() - start
+    return elapsed / len(queries), cache.stats() if cache else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=64)
+    parser.add_argument('--products', type=int, default=200_000)
+    parser.add_argument('--queries', type=int, default=50_000)
+    parser.add_argument('--distinct', type=int, default=1200)
+    args = parser.parse_args()
+
+    stampede(args.threads)
+
+    index = ProductSearchIndex()
+    index.add_products(synthetic_catalog(args.products))
+    gc.freeze()
+    queries, distinct = zipf_queries(args.queries, args.distinct)
+    print(f"\nHot queries: {args.queries:,} Zipf searches over {distinct} distinct queries, "
+          f"{args.products:,} products")
+    print(f"{'cache size':>10} {'hit rate':>9} {'evictions':>10} {'mean µs':>9}")
+    for size in (0, 64, 256, 1024, 4096):
+        mean, stats = hot_queries(index, queries, size)
+        if stats is None:
+            print(f"{'none':>10} {'-':>9} {'-':>10} {mean * 1e6:>9.1f}")
+        else:
+            print(f"{size:>10} {stats['hit_rate']:>9.1%} {stats['evictions']:>10} {mean * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
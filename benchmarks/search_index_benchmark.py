@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Search Index Benchmark
+
+Builds search_index.ProductSearchIndex over a synthetic catalog (brand,
+adjective, noun and model code per name; a department and sub-category per
+product, about a fifth out of stock) and reports, per query shape, the
+latency of ProductSearchIndex.search():
+
+- common:     one frequent word                  ("wireless")
+- two/three:  frequent words, all required       ("wireless speaker", "acme wireless speaker")
+- category:   a department and a product word    ("electronics speaker")
+- rare:       a model code                       ("k417")
+- prefix:     a typed prefix (typeahead)         ("wir", "wireless spe")
+- miss:       a word in no product
+
+plus typeahead completions and incremental updates (stock crossing zero,
+product add and remove), build time and peak RSS. As in buggy_app.py, the
+loaded index is moved out of the garbage collector's reach with gc.freeze().
+
+    python benchmarks/search_index_benchmark.py [--products 1000000] [--queries 2000]
+"""
+import argparse
+import gc
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import ProductSearchIndex  # noqa: E402
+
+BRANDS = ['acme', 'globex', 'initech', 'umbrella', 'stark', 'wayne', 'wonka', 'hooli', 'vandelay', 'soylent',
+          'tyrell', 'cyberdyne', 'aperture', 'monarch', 'oscorp', 'gringotts', 'dunder', 'pied', 'massive', 'zorg']
+ADJECTIVES = ['wireless', 'portable', 'smart', 'compact', 'premium', 'ultra', 'classic', 'deluxe', 'mini', 'pro',
+              'eco', 'rugged', 'slim', 'heavy', 'digital', 'vintage', 'quiet', 'rapid', 'super', 'mega']
+NOUNS = ['speaker', 'headphones', 'charger', 'lamp', 'kettle', 'blender', 'backpack', 'jacket', 'sneakers',
+         'watch', 'camera', 'keyboard', 'mouse', 'monitor', 'router', 'drill', 'tent', 'bottle', 'widget', 'gadget',
+         'toaster', 'vacuum', 'heater', 'fan', 'printer', 'tablet', 'stroller', 'helmet', 'mattress', 'sofa']
+DEPARTMENTS = {'electronics': ['audio', 'computing', 'cameras', 'networking'],
+               'home': ['kitchen', 'lighting', 'furniture', 'appliances'],
+               'outdoors': ['camping', 'cycling', 'hiking'],
+               'fashion': ['outerwear', 'footwear', 'accessories'],
+               'tools': ['power tools', 'hand tools'],
+               'baby': ['travel', 'nursery']}
+
+
+def synthetic_catalog(n, seed=7):
+    rng = random.Random(seed)
+    categories = [f"{dept} {sub}" for dept, subs in DEPARTMENTS.items() for sub in subs]
+    for i in range(n):
+        yield {
+            'id': f"item_{i}",
+            'name': f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} "
+                    f"{rng.choice('abcdefghjkmnpqrstuvwxyz')}{rng.randrange(1000)}",
+            'category': rng.choice(categories),
+            'stock': 0 if rng.random() < 0.2 else rng.randrange(1, 500),
+        }
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def timed(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(label, samples):
+    print(f"{label:<22} {percentile(samples, 50) * 1e6:>9.1f} {percentile(samples, 99) * 1e6:>9.1f} "
+          f"{max(samples) * 1e6:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--products', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=10)
+    args = parser.parse_args()
+    rng = random.Random(11)
+
+    index = ProductSearchIndex()
+    start = time.perf_counter()
+    index.add_products(synthetic_catalog(args.products))
+    build = time.perf_counter() - start
+    gc.freeze()   # keep the collector from re-walking millions of long-lived postings
+    stats = index.stats()
+    print(f"Indexed {stats['products']:,} products ({stats['terms']:,} terms, {stats['postings']:,} postings) "
+          f"in {build:.1f}s, peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+
+    def model():
+        return f"{rng.choice('abcdefghjkmnpqrstuvwxyz')}{rng.randrange(1000)}"
+
+    n = args.queries
+    shapes = {
+        'common': [rng.choice(ADJECTIVES + NOUNS) for _ in range(n)],
+        'two': [f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}" for _ in range(n)],
+        'three': [f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}" for _ in range(n)],
+        'category': [f"{rng.choice(list(DEPARTMENTS))} {rng.choice(NOUNS)}" for _ in range(n)],
+        'rare': [model() for _ in range(n)],
+        'prefix': [rng.choice(ADJECTIVES + NOUNS)[:rng.randrange(1, 4)] for _ in range(n)],
+        'prefix two': [f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)[:rng.randrange(1, 4)]}" for _ in range(n)],
+        'miss': [f"nosuch{i}" for i in range(n)],
+    }
+    for queries in shapes.values():   # warm the trie caches
+        for query in queries[:50]:
+            index.search(query, args.limit)
+
+    print(f"\n{'latency (µs)':<22} {'p50':>9} {'p99':>9} {'max':>9}")
+    for shape, queries in shapes.items():
+        report(f"search: {shape}", timed(index.search, [(q, args.limit) for q in queries]))
+    report("suggest", timed(index.suggest, [(q, 5) for q in shapes['prefix']]))
+
+    items = [f"item_{rng.randrange(args.products)}" for _ in range(n)]
+    report("update_stock (0 <-> n)", timed(index.update_stock, [(item, s) for item in items for s in (0, 5)]))
+    report("update_stock (n -> m)", timed(index.update_stock, [(item, 7) for item in items]))
+    new = list(synthetic_catalog(n, seed=99))
+    report("add_product", timed(index.add_product, [(f"new_{i}", p['name'], p['category'], p['stock'])
+                                                  for i, p in enumerate(new)]))
+    report("search after add", timed(index.search, [(q, args.limit) for q in shapes['prefix']]))
+    report("remove_product", timed(index.remove_product, [(f"new_{i}",) for i in range(n)]))
+
+    sample = shapes['two'][0]
+    print(f"\nTop results for {sample!r}:")
+    for result in index.search(sample, 3):
+        print(f"  {result['score']:>7.3f}  {result['id']:<12} {result['name']} ({result['category']}, "
+              f"stock {result['stock']})")
+
+
+if __name__ == "__main__":
+    main()
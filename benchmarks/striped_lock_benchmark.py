@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Striped Lock Benchmark
+
+Replays create_order's critical section (reserve stock and record the order
+under the item's INVENTORY and ORDERS locks, with scaled-down work) from many
+threads, spreading the orders over a varying number of distinct items:
+
+- global:  one lock per store, as before striping (DB_LOCK_INVENTORY / DB_LOCK_ORDERS);
+- striped: lock_profiler.LockStripes per store, as buggy_app.py used before order_store.py.
+
+Both go through lock_profiler.LockManager. With a global lock throughput stays
+flat however many items there are; with stripes it grows with the number of
+distinct items until the stripes or threads run out. A cross-item audit
+(every stripe, canonical order) runs alongside and must see consistent totals.
+
+    python benchmarks/striped_lock_benchmark.py [--threads 16] [--duration 1.5]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lock_profiler import InstrumentedLock, LockManager, LockRegistry, LockStripes  # noqa: E402
+
+WORK = 0.002          # simulated work inside the critical section (0.1s in the app)
+STOCK = 10 ** 9
+
+
+def run(mode, items, threads, duration, stripes):
+    registry = LockRegistry()
+    if mode == 'striped':
+        inventory_locks = LockStripes('DB_LOCK_INVENTORY', stripes, registry)
+        order_locks = LockStripes('DB_LOCK_ORDERS', stripes, registry)
+    else:
+        inventory_lock = InstrumentedLock('DB_LOCK_INVENTORY', registry)
+        order_lock = InstrumentedLock('DB_LOCK_ORDERS', registry)
+
+    def locks_for(item):
+        if mode == 'striped':
+            return order_locks.for_key(item), inventory_locks.for_key(item)
+        return order_lock, inventory_lock
+
+    def all_locks():
+        if mode == 'striped':
+            return inventory_locks.all() + order_locks.all()
+        return [inventory_lock, order_lock]
+
+    manager = LockManager(timeout=5.0)
+    inventory = {f"item_{i}": STOCK for i in range(items)}
+    orders_by_item = {item: 0 for item in inventory}
+    completed = [0] * threads
+    audits = {'runs': 0, 'inconsistent': 0}
+    deadline = time.perf_counter() + duration
+
+    def worker(i):
+        n = i
+        while time.perf_counter() < deadline:
+            item = f"item_{n % items}"
+            with manager.acquire_all(*locks_for(item)):
+                time.sleep(WORK)
+                inventory[item] -= 1
+                orders_by_item[item] += 1
+            completed[i] += 1
+            n += threads
+
+    def auditor():
+        while time.perf_counter() < deadline:
+            with manager.acquire_all(*all_locks()):
+                audits['runs'] += 1
+                if any(inventory[item] + orders_by_item[item] != STOCK for item in inventory):
+                    audits['inconsistent'] += 1
+            time.sleep(0.05)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=auditor))
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return sum(completed) / duration, audits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=1.5)
+    parser.add_argument('--stripes', type=int, default=16)
+    parser.add_argument('--items', type=int, nargs='+', default=[1, 2, 4, 8, 16, 64])
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.stripes} stripes, {args.duration:.1f}s per run, "
+          f"work {WORK * 1000:.0f} ms per order")
+    print(f"{'items':>6} {'global ops/s':>13} {'striped ops/s':>14} {'speedup':>8} {'audits':>7} {'inconsistent':>13}")
+    for items in args.items:
+        global_rate, _ = run('global', items, args.threads, args.duration, args.stripes)
+        striped_rate, audits = run('striped', items, args.threads, args.duration, args.stripes)
+        print(f"{items:>6} {global_rate:>13.1f} {striped_rate:>14.1f} {striped_rate / global_rate:>7.1f}x "
+              f"{audits['runs']:>7} {audits['inconsistent']:>13}")
+
+
+if __name__ == "__main__":
+    main()
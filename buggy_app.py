@@ -4,24 +4,98 @@ A Deliberately Buggy E-commerce Flask Application for SRE Postmortem Simulation.
 This application contains intentional bugs that correspond to the incidents
 generated by enhanced_ecommerce_runner.py.
 """
+import atexit
+import gc
 import os
 import time
-import threading
 import logging
 from flask import Flask, jsonify, request
 
+from id_generator import IdGenerator
+from job_executor import JobExecutor, JobQueueFull
+from jobs import heavy_computation
+from notification_queue import NotificationQueue, NotificationRejected
+from order_store import DEFAULT_STORE_PATH, SQLiteOrderStore, StoreBusy
+from payment_client import CircuitOpen, PaymentClient, PaymentError, PaymentVersionUnsupported
+from request_metrics import RequestMetrics, instrument_flask
+from result_cache import ResultCache
+from search_index import ProductSearchIndex, load_catalog, tokenize
+
 app = Flask(__name__)
+# Per-route latency histograms, status counts and concurrency, served at /metrics
+# (see request_metrics.py). REQUEST_THREADS is the request thread count per
+# process (e.g. gunicorn --threads), used to report thread-pool occupancy.
+REQUEST_METRICS = instrument_flask(app, RequestMetrics(capacity=int(os.environ.get('REQUEST_THREADS', '0')) or None))
+
+# --- Persistent "database" ---
+# INVENTORY and ORDERS live in one SQLite database in WAL mode (see
+# order_store.py), shared by every worker process serving this app, e.g.
+#   gunicorn -w 4 --threads 8 buggy_app:app
+# Each order is one short transaction with a conditional stock decrement, so no
+# application locks are taken (lock_profiler.py's instrumented locks, LockManager
+# and stripes are not used here). Pool saturation is served at /debug/store.
+# The store is opened at import because the search index below reads its stock;
+# by default it lives next to this file, not in whatever directory imports it.
+ORDER_STORE_PATH = os.environ.get('ORDER_STORE_PATH',
+                                  os.path.join(os.path.dirname(os.path.abspath(__file__)), DEFAULT_STORE_PATH))
+# SQLite admits one writer at a time: more connections per process only wait in
+# SQLite's sleeping busy handler instead of the pool's queue, and throughput drops
+# (see benchmarks/order_store_benchmark.py).
+ORDER_STORE_POOL_SIZE = 2
+INITIAL_INVENTORY = {'item_123': 50, 'item_456': 25}
+ORDER_STORE = SQLiteOrderStore(ORDER_STORE_PATH, pool_size=ORDER_STORE_POOL_SIZE)
+ORDER_STORE.seed_inventory(INITIAL_INVENTORY)
+# Snowflake-style order IDs: unique across threads and worker processes (see id_generator.py).
+ORDER_IDS = IdGenerator()
+
+
+def with_store_stock(products):
+    """Copies of `products` with each one's current stock from ORDER_STORE."""
+    stock = ORDER_STORE.all_stock()
+    return [{**product, 'stock': stock.get(product['id'], 0)} for product in products]
 
-# --- In-memory "database" and state simulation ---
-INVENTORY = {'item_123': 50, 'item_456': 25}
-ORDERS = {}
-DB_LOCK_INVENTORY = threading.Lock()
-DB_LOCK_ORDERS = threading.Lock()
+# Product catalog, served from an in-process inverted index (see search_index.py).
+# Stock levels are read from ORDER_STORE at startup and pushed to the index on
+# every order this process takes; orders taken by other worker processes show
+# up here on restart or catalog reload.
+CATALOG = [
+    {'id': 'item_123', 'name': 'Super Widget', 'category': 'widgets'},
+    {'id': 'item_456', 'name': 'Mega Gadget', 'category': 'gadgets'},
+]
+SEARCH_INDEX = ProductSearchIndex()
+SEARCH_INDEX.add_products(with_store_stock(CATALOG))
+MAX_SEARCH_RESULTS = 50
+# Repeated queries are served from an LRU + TTL cache; concurrent misses for the
+# same query share one index lookup. Results (including stock) may be up to
+# SEARCH_CACHE_TTL seconds stale. Metrics are served at /debug/cache.
+SEARCH_CACHE_TTL = 5.0
+SEARCH_CACHE = ResultCache('product:search', max_entries=4096, ttl=SEARCH_CACHE_TTL)
+
+
+def load_product_catalog(path):
+    """
+    Adds a JSON-lines catalog ({"id", "name", "category", "stock"} per line) to
+    ORDER_STORE and the index. Items already in the store keep their stock.
+    """
+    products = list(load_catalog(path))
+    ORDER_STORE.seed_inventory({product['id']: product.get('stock', 0) for product in products})
+    SEARCH_INDEX.add_products(with_store_stock(products))
+    SEARCH_CACHE.clear()
+    # Millions of long-lived postings would otherwise be re-walked by every full collection.
+    gc.freeze()
+    return len(products)
 
 # --- Configuration (or lack thereof) ---
 # BUG: Missing environment variables will cause `notification-service` to fail.
 SMTP_HOST = os.environ.get('SMTP_HOST')
-PAYMENT_API_VERSION = "v2" # Simulates an older version
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '25'))
+NOTIFICATION_SPOOL_DIR = os.environ.get('NOTIFICATION_SPOOL_DIR',
+                                        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'notification_spool'))
+# The order service reaches the payment service through one pooled client that
+# negotiates the newest API version it offers (see payment_client.py).
+PAYMENT_SERVICE_URL = os.environ.get('PAYMENT_SERVICE_URL', 'http://127.0.0.1:5000')
+PAYMENT_API_VERSIONS = ('v3', 'v2')
+PAYMENT_CLIENT = PaymentClient(PAYMENT_SERVICE_URL, versions=PAYMENT_API_VERSIONS)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -42,17 +116,28 @@ def user_login():
 # ===============================================
 # PRODUCT SERVICE
 # ===============================================
+def cached_search(query, limit):
+    """SEARCH_INDEX.search through SEARCH_CACHE, keyed by the normalised words so spacing and case share entries."""
+    key = (' '.join(tokenize(query)), limit)
+    return SEARCH_CACHE.get_or_load(key, lambda: SEARCH_INDEX.search(query, limit=limit))
+
 @app.route('/api/v2/products/search', methods=['GET'])
 def product_search():
-    # BUG: This simulates a slow query by not using an index (in a real DB)
-    # and performing a time-consuming operation.
-    query = request.args.get('q')
-    logging.info(f"Performing slow search for: {query}")
-    time.sleep(3) # Simulates a complex, unoptimized query
-    return jsonify([
-        {'id': 'item_123', 'name': 'Super Widget'},
-        {'id': 'item_456', 'name': 'Mega Gadget'}
-    ])
+    """
+    Ranked search over SEARCH_INDEX: every word of `q` must match a product's
+    name or category, the last one as a prefix, so partial input works too.
+    """
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), MAX_SEARCH_RESULTS)
+    results = cached_search(query, limit)
+    logging.info(f"Search for {query!r}: {len(results)} results")
+    return jsonify(results)
+
+@app.route('/api/v2/products/suggest', methods=['GET'])
+def product_suggest():
+    """Typeahead: completions of the word being typed, and the best products for the input so far."""
+    query = request.args.get('q', '')
+    return jsonify({'completions': SEARCH_INDEX.suggest(query), 'products': cached_search(query, 5)})
 
 # ===============================================
 # ORDER & INVENTORY SERVICES (Interacting)
@@ -60,100 +145,212 @@ def product_search():
 @app.route('/api/v1/orders/create', methods=['POST'])
 def create_order():
     """
-    BUG: This function and `process_inventory_update` can cause a database deadlock.
-    This function locks ORDERS then INVENTORY.
-    The other function locks INVENTORY then ORDERS.
-    If called concurrently, they can deadlock.
+    Creates an order and reserves stock in one ORDER_STORE transaction: the
+    stock is decremented only if enough is left, so concurrent orders from any
+    worker process can never oversell, and no locks are held between requests.
+    An optional `email` gets a confirmation through NOTIFICATION_QUEUE.
     """
     item_id = request.json.get('item_id')
     quantity = request.json.get('quantity')
-    order_id = f"ord_{int(time.time())}"
-
-    logging.info(f"Attempting to lock ORDERS for order {order_id}")
-    with DB_LOCK_ORDERS:
-        logging.info(f"ORDERS locked for {order_id}. Simulating work...")
-        time.sleep(0.1)
-        logging.info(f"Attempting to lock INVENTORY for order {order_id}")
-        with DB_LOCK_INVENTORY:
-            logging.info(f"INVENTORY locked for {order_id}")
-            if INVENTORY.get(item_id, 0) >= quantity:
-                INVENTORY[item_id] -= quantity
-                ORDERS[order_id] = {'item': item_id, 'quantity': quantity, 'status': 'created'}
-                logging.info(f"Order {order_id} created successfully.")
-                return jsonify(ORDERS[order_id]), 201
-            else:
-                return jsonify({"error": "Out of stock"}), 400
+    order_id = f"ord_{ORDER_IDS.next_id()}"
+
+    try:
+        created = ORDER_STORE.create_order(order_id, item_id, quantity)
+    except StoreBusy as e:
+        logging.error(f"STORE_BUSY: {e}")
+        return jsonify({"error": "Order store is busy, please retry"}), 503
+    if created is None:
+        return jsonify({"error": "Out of stock"}), 400
+    order, stock = created
+    SEARCH_INDEX.update_stock(item_id, stock)
+    email = request.json.get('email')
+    if email:
+        # Only enqueued: the order never waits on (or fails because of) email delivery.
+        try:
+            NOTIFICATION_QUEUE.enqueue(email, f"Order {order_id} confirmed",
+                                       f"Your order of {quantity} x {item_id} is confirmed.")
+        except NotificationRejected as e:
+            logging.warning(f"NOTIFICATION_REJECTED: confirmation for {order_id} not sent: {e}")
+    logging.info(f"Order {order_id} created successfully.")
+    return jsonify(order), 201
 
 @app.route('/background/inventory/update', methods=['POST'])
 def process_inventory_update():
     """
-    BUG: Companion function to `create_order` for causing a deadlock.
-    This function locks INVENTORY then ORDERS.
+    Checks an item's stock against its orders, or every item when no item_id is
+    given. The data is read from one ORDER_STORE snapshot, which does not block
+    `create_order`; the slow consistency check runs on that snapshot.
     """
     item_id = request.json.get('item_id')
-    logging.info(f"BG: Attempting to lock INVENTORY for stock update")
-    with DB_LOCK_INVENTORY:
-        logging.info("BG: INVENTORY locked. Simulating work...")
-        time.sleep(0.1)
-        logging.info("BG: Attempting to lock ORDERS for consistency check")
-        with DB_LOCK_ORDERS:
-            logging.info("BG: ORDERS locked. Both locks acquired.")
-            # Simulate checking all orders for the item_id
-            time.sleep(0.5)
-            logging.info("BG: Consistency check complete.")
-            return jsonify({"message": "Inventory check complete"}), 200
+    try:
+        snapshot = ORDER_STORE.snapshot(None if item_id is None else [item_id])
+    except StoreBusy as e:
+        logging.error(f"STORE_BUSY: {e}")
+        return jsonify({"error": "Inventory is busy, please retry"}), 503
+    # Simulate checking the orders of each item against the snapshot
+    time.sleep(0.5)
+    checked = sum(item['orders'] for item in snapshot.values())
+    logging.info(f"BG: Consistency check complete ({len(snapshot)} items, {checked} orders, "
+                 f"{sum(item['stock'] for item in snapshot.values())} units in stock).")
+    return jsonify({"message": "Inventory check complete", "items": len(snapshot), "orders": checked}), 200
 
 # ===============================================
 # PAYMENT SERVICE
 # ===============================================
 @app.route('/api/v3/payments/process', methods=['POST'])
 def process_payment():
-    # BUG: This endpoint represents a newer version (v3). The order service
-    # will try to call an older, non-existent v2 endpoint, causing a
-    # version compatibility issue.
+    # The current payment API. There is no v2 endpoint any more; PAYMENT_CLIENT
+    # negotiates v3 and only falls back to v2 against an older payment service.
     order_id = request.json.get('order_id')
     amount = request.json.get('amount')
     logging.info(f"Processing v3 payment for {order_id} of amount {amount}")
     return jsonify({"status": "paid", "transaction_id": f"txn_{int(time.time())}"})
 
-def call_payment_service_from_order_service(order_id):
+def call_payment_service_from_order_service(order_id, amount=0.0):
     """
-    BUG: This function simulates the order-service calling the payment-service
-    with an outdated API endpoint.
+    Charges an order through PAYMENT_CLIENT: pooled keep-alive connections,
+    per-call timeouts, a circuit breaker and API version negotiation.
+    Returns True once the payment service reports the order as paid.
     """
-    if PAYMENT_API_VERSION != "v3":
-        logging.error(f"VERSION_COMPATIBILITY_ISSUE: Trying to call /api/{PAYMENT_API_VERSION}/process-payment which is deprecated.")
-        # In a real app, this would be a requests.post() call that would fail.
+    try:
+        payment = PAYMENT_CLIENT.process(order_id, amount)
+    except PaymentVersionUnsupported as e:
+        logging.error(f"VERSION_COMPATIBILITY_ISSUE: {e}")
         return False
-    return True
+    except CircuitOpen as e:
+        logging.warning(f"PAYMENT_CIRCUIT_OPEN: {e}")
+        return False
+    except PaymentError as e:
+        logging.error(f"PAYMENT_FAILED: {e}")
+        return False
+    logging.info(f"Payment for {order_id} via {PAYMENT_CLIENT.version}: {payment.get('status')}")
+    return payment.get('status') == 'paid'
 
 # ===============================================
 # NOTIFICATION SERVICE
 # ===============================================
+# Email is batched and sent by a background worker over one persistent SMTP
+# connection (see notification_queue.py); requests only enqueue, and a full queue
+# is rejected at once. While the relay is down, or SMTP_HOST is unset, the worker
+# spools messages to NOTIFICATION_SPOOL_DIR and delivers them once it is
+# reachable. Metrics are served at /debug/notifications.
+# The worker starts here, not in a request: it also delivers what an earlier run
+# left in the spool, and whatever is still queued at exit is spooled.
+NOTIFICATION_QUEUE = NotificationQueue(SMTP_HOST, SMTP_PORT, spool_dir=NOTIFICATION_SPOOL_DIR).start()
+atexit.register(NOTIFICATION_QUEUE.stop)
+if not SMTP_HOST:
+    logging.error("ENVIRONMENT_VARIABLE_MISSING: SMTP_HOST is not set. Notifications will be spooled, not sent.")
+
 @app.route('/api/v1/notifications/send', methods=['POST'])
 def send_notification():
-    # BUG: This function relies on an environment variable that is not set.
-    if not SMTP_HOST:
-        logging.error("ENVIRONMENT_VARIABLE_MISSING: SMTP_HOST is not set. Cannot send email.")
-        return jsonify({"error": "Notification service is misconfigured"}), 500
-    
+    """Queues an email and answers 202 at once; delivery (and any retrying) happens in the background."""
     email = request.json.get('email')
-    logging.info(f"Sending notification to {email} via {SMTP_HOST}")
-    return jsonify({"message": "Notification sent."})
+    if not email:
+        return jsonify({"error": "email is required"}), 400
+    try:
+        notification_id = NOTIFICATION_QUEUE.enqueue(email, request.json.get('subject', 'Notification'),
+                                                     request.json.get('message', ''))
+    except NotificationRejected as e:
+        logging.warning(f"NOTIFICATION_REJECTED: {e}")
+        response = jsonify({"error": "Too many notifications queued, please retry later"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    logging.info(f"Queued notification {notification_id} to {email}")
+    return jsonify({"message": "Notification queued.", "id": notification_id}), 202
 
 
 # ===============================================
 # WORKER SERVICE (for performance issues)
 # ===============================================
-@app.route('/jobs/heavy-computation')
+# Heavy jobs run in a bounded pool of worker processes (see job_executor.py);
+# request threads only enqueue them, and a full queue is rejected at once.
+HEAVY_JOB_SECONDS = int(os.environ.get('HEAVY_JOB_SECONDS', '10'))
+JOB_WORKERS = 4
+JOB_QUEUE_LIMIT = 16
+# Job functions live in jobs.py: workers import them from there, not from this module.
+JOB_EXECUTOR = JobExecutor(workers=JOB_WORKERS, max_queue=JOB_QUEUE_LIMIT)
+
+@app.route('/jobs/heavy-computation', methods=['GET', 'POST'])
 def run_heavy_computation():
-    # BUG: This simulates a long-running task that can tie up worker threads,
-    # leading to thread pool exhaustion under load.
-    logging.info("Starting heavy computation job...")
-    time.sleep(10) # Simulates a very long operation
-    logging.info("Heavy computation finished.")
-    return "Job complete"
+    """Queues the heavy computation and returns its job ID at once (202), or 429 when the queue is full."""
+    try:
+        job = JOB_EXECUTOR.submit('heavy-computation', heavy_computation, HEAVY_JOB_SECONDS)
+    except JobQueueFull as e:
+        logging.warning(f"JOB_QUEUE_FULL: {e}")
+        response = jsonify({"error": "Too many jobs queued, please retry later"})
+        response.headers['Retry-After'] = str(HEAVY_JOB_SECONDS)
+        return response, 429
+    logging.info(f"Queued heavy computation job {job['id']}")
+    return jsonify({"job_id": job['id'], "status": job['status'],
+                    "status_url": f"/jobs/{job['id']}", "result_url": f"/jobs/{job['id']}/result"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = JOB_EXECUTOR.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify({key: value for key, value in job.items() if key != 'result'})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """The job's result once it succeeded; 202 while it is queued or running, 500 if it failed."""
+    job = JOB_EXECUTOR.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job['status'] == 'succeeded':
+        return jsonify(job['result'])
+    if job['status'] == 'failed':
+        return jsonify({"job_id": job_id, "error": job['error']}), 500
+    return jsonify({"job_id": job_id, "status": job['status']}), 202
+
+@app.route('/jobs', methods=['GET'])
+def job_stats():
+    """Job executor counters: pending, submitted, rejected, succeeded and failed jobs."""
+    return jsonify(JOB_EXECUTOR.stats())
+
+# ===============================================
+# DIAGNOSTICS
+# ===============================================
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-route latency percentiles, status codes, error rates and in-flight counts, plus process concurrency."""
+    return jsonify(REQUEST_METRICS.snapshot(buckets=request.args.get('buckets') == '1'))
+
+@app.route('/debug/store', methods=['GET'])
+def debug_store():
+    """Order store metrics for this worker process: orders, busy errors, connection pool saturation and ID worker."""
+    return jsonify({**ORDER_STORE.stats(), 'order_ids': ORDER_IDS.stats()})
+
+@app.route('/debug/payments', methods=['GET'])
+def debug_payments():
+    """Payment client metrics: outcomes, latency, negotiated version, connection reuse and circuit breaker state."""
+    return jsonify(PAYMENT_CLIENT.stats())
+
+@app.route('/debug/notifications', methods=['GET'])
+def debug_notifications():
+    """Notification queue metrics: queued, rejected, spooled, sent, batches, retries, dead letters and relay state."""
+    return jsonify(NOTIFICATION_QUEUE.stats())
+
+@app.route('/debug/cache', methods=['GET'])
+def debug_cache():
+    """Search result cache metrics: hits, misses, coalesced misses, evictions, expirations and load times."""
+    return jsonify(SEARCH_CACHE.stats())
 
 if __name__ == '__main__':
-    # Running with threaded=True to allow concurrent requests to trigger deadlocks
-    app.run(host='0.0.0.0', port=5000, threaded=True, debug=True)
+    atexit.register(JOB_EXECUTOR.shutdown)
+    atexit.register(ORDER_STORE.close)
+    # Optional full catalog for search, e.g. PRODUCT_CATALOG=products.jsonl
+    catalog_file = os.environ.get('PRODUCT_CATALOG', '')
+    if catalog_file:
+        logging.info(f"Loaded {load_product_catalog(catalog_file)} products from {catalog_file}")
+    # Opt-in runtime call-graph sampling (see runtime_tracer.py), e.g.
+    #   RUNTIME_TRACE_FILE=runtime_profile.json python buggy_app.py
+    trace_file = os.environ.get('RUNTIME_TRACE_FILE', '')
+    if trace_file:
+        from runtime_tracer import SamplingTracer
+        tracer = SamplingTracer(include_files=[__file__], output_path=trace_file).start()
+        atexit.register(tracer.stop)
+        logging.info(f"Runtime tracing enabled, writing profile to {trace_file}")
+    # Single process with a thread per request; for several worker processes on the
+    # same ORDER_STORE use a WSGI server (see the gunicorn example above). The reloader would restart the process and lose the trace, so it is off while tracing.
+    app.run(host='0.0.0.0', port=5000, threaded=True, debug=True, use_reloader=not trace_file)
@@ -6,88 +6,716 @@ This script parses a Python source file (buggy_app.py) using the `ast` module
 to build a knowledge graph of its components and relationships using `networkx`.
 
 The graph includes:
-- Nodes for files, services, functions, database tables (locks), and error types.
+- Nodes for files, services, functions, HTTP endpoints, database tables (locks),
+  and error types. Services and curated errors come from graph_mappings.json
+  (see graph_mappings.py) and can be re-applied without a rebuild.
 - Edges for relationships like `CALLS`, `MODIFIES`, `CAN_CAUSE`, etc.
+- GlobalState nodes for module-level state, with `READS`/`WRITES` edges from
+  the functions that access it (subscript stores, augmented assignments,
+  mutating method calls and `global` rebinding all count as writes).
+- A precomputed reachability index over `CALLS` and `ROUTES_TO` edges, so
+  endpoints are indexed with the functions they reach (see reachability.py).
+
+Calls into local modules (sibling .py files imported with `import module`,
+`from module import fn` or `from .module import fn`) resolve to Function nodes
+named `module.fn`, added for the functions the file actually calls; their own
+calls are not followed. Modules further up (`from ..module import fn`) keep one
+leading dot per extra level: `.module.fn`.
 
 The resulting graph is saved as 'code_intelligence_graph.graphml' and a visualization
 is displayed.
 """
+import argparse
 import ast
+import json
 import networkx as nx
-import matplotlib.pyplot as plt
 import os
+import time
+
+from graph_mappings import DEFAULT_MAPPINGS_PATH, add_can_cause, apply_mappings, load_mappings, overlay_mappings
+from hazard_analysis import HAZARD_RULES, detect_hazards
+from route_index import flask_rule_to_template
+from runtime_tracer import STALE_ATTR, load_runtime_profile, merge_runtime_profile, overlay_runtime_profile
+from reachability import ReachabilityIndex, attach_reachability_index, build_reachability_index
 
 # Helper to get the full source code of a function/class from the AST tree
 from astunparse import unparse
 
+# Constructors recognized as lock definitions, mapped to the lock kind.
+LOCK_CONSTRUCTORS = {
+    'threading.Lock': 'Lock',
+    'threading.RLock': 'RLock',
+    'threading.Semaphore': 'Semaphore',
+    'threading.BoundedSemaphore': 'Semaphore',
+    'threading.Condition': 'Condition',
+    'multiprocessing.Lock': 'Lock',
+    'multiprocessing.RLock': 'RLock',
+    'multiprocessing.Semaphore': 'Semaphore',
+    'lock_profiler.InstrumentedLock': 'Lock',
+    'lock_profiler.InstrumentedRLock': 'RLock',
+    # Striped locks are modeled as one lock: `X.for_key(k)` and `*X.all()` both acquire X.
+    'lock_profiler.LockStripes': 'Lock',
+}
+# Calls that read environment variables.
+ENV_READERS = {'os.environ.get', 'os.getenv'}
+# Module-level values treated as mutable shared state.
+MUTABLE_LITERALS = (ast.Dict, ast.List, ast.Set, ast.DictComp, ast.ListComp, ast.SetComp)
+MUTABLE_FACTORIES = {'dict', 'list', 'set', 'collections.defaultdict', 'collections.OrderedDict',
+                     'collections.deque', 'collections.Counter'}
+# Method calls that mutate the receiver (`STATE.append(x)`, `STATE.update(...)`).
+MUTATING_METHODS = {'append', 'extend', 'insert', 'remove', 'pop', 'popitem', 'clear', 'update',
+                    'setdefault', 'add', 'discard', 'sort', 'reverse', 'appendleft', 'popleft',
+                    'extendleft', 'rotate'}
+# Flask-style route decorators: `@app.route(...)` plus the method shortcuts.
+ROUTE_DECORATORS = {'route', 'get', 'post', 'put', 'patch', 'delete'}
+# Methods of lock_profiler.LockStripes returning one stripe, or every stripe.
+STRIPE_SELECTORS = {'for_key'}
+STRIPE_ALL = {'all'}
+# `with manager.acquire_all(A, B)` takes every lock argument in canonical
+# (name) order, like lock_profiler.LockManager; modeled as sorted acquisitions.
+ORDERED_ACQUIRE_METHODS = {'acquire_all'}
+# Re-acquiring these from the thread that holds them does not block.
+REENTRANT_LOCK_KINDS = {'RLock', 'Condition'}
+
+class SymbolTable:
+    """
+    Symbols collected in the first pass, keyed for O(1) call resolution:
+
+    - functions: qualified name -> True, for module-level functions (`f`),
+      methods (`Class.m`) and nested functions (`outer.inner`).
+    - classes: class name -> {'methods': {name: qualname}, 'bases': [...],
+      'attributes': {attr: class name}} for `self.attr = Class()` assignments.
+    - imports: local alias -> dotted target (`import x as y`, `from m import f`).
+    - modules: imported module that is a sibling .py file -> {function name:
+      {'file', 'lineno', 'source_code'}} for its module-level functions, so
+      `module.fn()` and `from module import fn` calls resolve to them.
+    - instances: module-level variable -> class name for `var = Class()`.
+    - locks: lock id (`NAME` or `Class.attr`) -> {'kind': ..., 'lineno': ...}.
+    - globals: other module-level variables -> {'lineno', 'mutable', 'env_var',
+      'env_default', 'uses'}; `env_var` is set for `X = os.environ.get('VAR')`
+      reads, `uses` lists the module-level names the value is built from
+      (`QUEUE = Queue(HOST)` uses HOST).
+    """
+    def __init__(self):
+        self.functions = {}
+        self.classes = {}
+        self.imports = {}
+        self.modules = {}
+        self.instances = {}
+        self.locks = {}
+        self.globals = {}
+
+    def external_name(self, func):
+        """
+        Dotted name of a reference into an imported module, resolved through
+        import aliases (`import time as t; t.sleep` -> 'time.sleep'), or None.
+        """
+        parts = []
+        while isinstance(func, ast.Attribute):
+            parts.append(func.attr)
+            func = func.value
+        if not isinstance(func, ast.Name) or func.id not in self.imports:
+            return None
+        return '.'.join([self.imports[func.id]] + parts[::-1])
+
+    def load_local_modules(self, filepath):
+        """
+        Parses the imported modules that are .py files next to `filepath` (one
+        directory up per leading dot) for their module-level functions. Files are
+        looked up from the absolute directory, whatever the working directory,
+        and recorded relative to `filepath`'s directory, like `filepath` itself.
+        """
+        directory, shown = os.path.dirname(os.path.abspath(filepath)), os.path.dirname(filepath)
+        for target in set(self.imports.values()):
+            for module in (target, target.rpartition('.')[0]):
+                name = module.lstrip('.')
+                if not name or module in self.modules:
+                    continue
+                relative = os.path.join(*[os.pardir] * (len(module) - len(name)), name.replace('.', os.sep) + '.py')
+                path = os.path.join(directory, relative)
+                if not os.path.isfile(path):
+                    continue
+                with open(path) as f:
+                    tree = ast.parse(f.read(), filename=path)
+                shown_path = os.path.normpath(os.path.join(shown, relative))
+                self.modules[module] = {
+                    node.name: {'file': shown_path, 'lineno': node.lineno, 'source_code': unparse(node).strip()}
+                    for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                }
+
+    def module_function(self, func):
+        """
+        Node name (`module.fn`) of a module-level function in a local module
+        called through an import (`module.fn()`, `alias.fn()` or, after
+        `from module import fn`, `fn()`), or None.
+        """
+        target = self.external_name(func)
+        if target is None:
+            return None
+        module, _, name = target.rpartition('.')
+        return target if name in self.modules.get(module, {}) else None
+
+    def env_read(self, value):
+        """
+        Returns (variable, has_default) if `value` reads an environment variable
+        via os.environ.get / os.getenv / os.environ[...], else None.
+        """
+        if isinstance(value, ast.Call) and self.external_name(value.func) in ENV_READERS:
+            if value.args and isinstance(value.args[0], ast.Constant):
+                has_default = len(value.args) > 1 or any(k.arg == 'default' for k in value.keywords)
+                return value.args[0].value, has_default
+        if (isinstance(value, ast.Subscript) and self.external_name(value.value) == 'os.environ' and
+                isinstance(value.slice, ast.Constant)):
+            return value.slice.value, False
+        return None
+
+    def lock_kind(self, value):
+        """Returns the lock kind if `value` constructs a lock, else None."""
+        if isinstance(value, ast.Call):
+            return LOCK_CONSTRUCTORS.get(self.external_name(value.func))
+        return None
+
+    def find_method(self, class_name, method, _seen=None):
+        """Looks a method up on a class and its locally defined bases."""
+        cls = self.classes.get(class_name)
+        if cls is None:
+            return None
+        if method in cls['methods']:
+            return cls['methods'][method]
+        _seen = (_seen or set()) | {class_name}
+        for base in cls['bases']:
+            if base not in _seen:
+                found = self.find_method(base, method, _seen)
+                if found:
+                    return found
+        return None
+
+    def instantiated_class(self, value):
+        """Returns the local class name if `value` is a `Class(...)` call."""
+        if (isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and
+                value.func.id in self.classes):
+            return value.func.id
+        return None
+
+
+class SymbolCollector(ast.NodeVisitor):
+    """
+    First pass: records every class, method, function, import and alias so the
+    second pass can resolve calls to symbols defined anywhere in the file.
+    """
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.scope = []          # qualified-name parts of enclosing defs
+        self.current_class = None
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.symbols.imports[alias.asname or alias.name.split('.')[0]] = alias.name
+
+    def visit_ImportFrom(self, node):
+        # Relative imports resolve next to the analysed file: `from . import m` and
+        # `from .m import fn` name the sibling module m. Each further level is kept
+        # as a leading dot (`from .. import m` -> '.m').
+        base = '.' * max(node.level - 1, 0) + (node.module or '')
+        for alias in node.names:
+            target = f"{base}.{alias.name}" if node.module else base + alias.name
+            self.symbols.imports[alias.asname or alias.name] = target
+
+    def visit_ClassDef(self, node):
+        self.symbols.classes[node.name] = {
+            'methods': {},
+            'bases': [b.id for b in node.bases if isinstance(b, ast.Name)],
+            'attributes': {},
+        }
+        outer_class, self.current_class = self.current_class, node.name
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+        self.current_class = outer_class
+
+    def visit_FunctionDef(self, node):
+        qualname = '.'.join(self.scope + [node.name])
+        self.symbols.functions[qualname] = True
+        if self.current_class and self.scope[-1] == self.current_class:
+            self.symbols.classes[self.current_class]['methods'][node.name] = qualname
+        outer_class, self.current_class = self.current_class, None
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+        self.current_class = outer_class
+
+        # `self.attr = Class()` inside a method types the instance attribute.
+        if outer_class:
+            for stmt in ast.walk(node):
+                if isinstance(stmt, ast.Assign):
+                    for target in stmt.targets:
+                        if (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name) and
+                                target.value.id == 'self'):
+                            self.symbols.classes[outer_class]['attributes'][target.attr] = stmt.value
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Assign(self, node):
+        if not self.scope:
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    self.symbols.instances[target.id] = node.value
+        self.generic_visit(node)
+
+    def finalize(self):
+        """
+        Resolves recorded assignment values to class names and lock definitions
+        once all classes and imports are known.
+        """
+        for var, value in self.symbols.instances.items():
+            if self.symbols.lock_kind(value):
+                self.symbols.locks[var] = {'kind': self.symbols.lock_kind(value), 'lineno': value.lineno}
+                continue
+            env = self.symbols.env_read(value)
+            factory = (self.symbols.external_name(value.func) or getattr(value.func, 'id', None)
+                       if isinstance(value, ast.Call) else None)
+            self.symbols.globals[var] = {
+                'lineno': value.lineno,
+                'mutable': isinstance(value, MUTABLE_LITERALS) or factory in MUTABLE_FACTORIES,
+                'env_var': env[0] if env else None,
+                'env_default': env[1] if env else None,
+                'uses': sorted({node.id for node in ast.walk(value) if isinstance(node, ast.Name)}),
+            }
+        for class_name, cls in self.symbols.classes.items():
+            for attr, value in cls['attributes'].items():
+                if self.symbols.lock_kind(value):
+                    self.symbols.locks[f"{class_name}.{attr}"] = {'kind': self.symbols.lock_kind(value),
+                                                                  'lineno': value.lineno}
+        for cls in self.symbols.classes.values():
+            cls['attributes'] = {attr: self.symbols.instantiated_class(value)
+                                 for attr, value in cls['attributes'].items()
+                                 if self.symbols.instantiated_class(value)}
+        self.symbols.instances = {var: self.symbols.instantiated_class(value)
+                                  for var, value in self.symbols.instances.items()
+                                  if self.symbols.instantiated_class(value)}
+
+
 class CodeVisitor(ast.NodeVisitor):
     """
     Traverses the Abstract Syntax Tree to find nodes and relationships.
+    Calls are resolved against the SymbolTable from the first pass, so method
+    calls (`self.repo.save()`), class-level calls and calls to functions
+    defined later in the file all produce CALLS edges.
     """
-    def __init__(self, graph, filepath):
+    def __init__(self, graph, filepath, symbols=None):
         self.graph = graph
         self.filepath = filepath
+        self.symbols = symbols or SymbolTable()
         self.current_function = None
+        self.current_class = None
+        self.method_owner = None
+        self.scope = []
+        self.function_scopes = []   # enclosing function qualnames, innermost last
+        self.local_types = {}       # local variable -> class name, per function
+        self.local_locks = {}       # local variable -> lock ids it may hold (`locks = [A, B]`)
+        self.held_locks = []        # locks held at the current point, in acquisition order
+        # Lock acquisitions and calls made while holding locks, consumed by
+        # CodeGraphBuilder._analyze_lock_order once the call graph is complete.
+        self.lock_events = []
+        self.locked_calls = []
+        # Facts for the static hazard detector (hazard_analysis.py).
+        self.local_names = set()    # names local to the current function
+        self.loop_stack = []        # enclosing loops in the current function
+        self.external_calls = []
+        self.global_reads = []
+        self.global_writes = []
+        self.augmented = set()      # ids of AugAssign targets (read and written)
+        self.write_only = set()     # ids of Name nodes that are only written through
+        self.env_reads = []
+        self.loops = []
+
+    def visit_ClassDef(self, node):
+        self.graph.add_node(node.name, type='Class', file=self.filepath, lineno=node.lineno)
+        self.graph.add_edge(self.filepath, node.name, type='CONTAINS')
+        outer_class, self.current_class = self.current_class, node.name
+        self.scope.append(node.name)
+        self.generic_visit(node)
+        self.scope.pop()
+        self.current_class = outer_class
 
     def visit_FunctionDef(self, node):
         """Called for each function definition."""
-        self.current_function = node.name
+        qualname = '.'.join(self.scope + [node.name])
         # Add the function node with its source code
         self.graph.add_node(
-            node.name, 
+            qualname, 
             type='Function', 
             file=self.filepath,
+            lineno=node.lineno,
             source_code=unparse(node).strip()
         )
-        self.graph.add_edge(self.filepath, node.name, type='CONTAINS')
-        
+        if self.current_class and self.scope[-1] == self.current_class:
+            self.graph.add_edge(self.current_class, qualname, type='CONTAINS')
+        else:
+            self.graph.add_edge(self.filepath, qualname, type='CONTAINS')
+        self._add_routes(node, qualname)
+        # Decorators run at definition time, not as part of the function body.
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+
+        is_method = bool(self.current_class and self.scope[-1] == self.current_class)
+        outer = (self.current_function, self.current_class, self.method_owner, self.local_types,
+                 self.local_locks, self.held_locks, self.local_names, self.loop_stack)
+        self.current_function, self.local_types, self.local_locks, self.held_locks = qualname, {}, {}, []
+        self.local_names, self.loop_stack = self._local_names(node), []
+        # Nested functions inside a method still see `self` of that method's class.
+        self.method_owner = self.current_class if is_method else self.method_owner
+        self.current_class = None
+        self.scope.append(node.name)
+        self.function_scopes.append(qualname)
         # Let the visitor visit the children of this node
+        self.visit(node.args)
+        for stmt in node.body:
+            self.visit(stmt)
+        self.function_scopes.pop()
+        self.scope.pop()
+        (self.current_function, self.current_class, self.method_owner, self.local_types,
+         self.local_locks, self.held_locks, self.local_names, self.loop_stack) = outer
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    @staticmethod
+    def _local_names(node):
+        """Parameters and assigned names of a function, minus `global` declarations."""
+        args = node.args
+        names = {a.arg for a in args.posonlyargs + args.args + args.kwonlyargs}
+        names |= {a.arg for a in (args.vararg, args.kwarg) if a}
+        declared_global = set()
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name) and isinstance(child.ctx, (ast.Store, ast.Del)):
+                names.add(child.id)
+            elif isinstance(child, ast.Global):
+                declared_global.update(child.names)
+        return names - declared_global
+
+    def _is_global(self, name):
+        return name in self.symbols.globals and name not in self.local_names
+
+    def _state_base(self, expr):
+        """The module-level Name at the root of `STATE`, `STATE[k][j]` or `STATE.attr`, else None."""
+        while isinstance(expr, (ast.Subscript, ast.Attribute)):
+            expr = expr.value
+        return expr if isinstance(expr, ast.Name) and self._is_global(expr.id) else None
+
+    def _record_access(self, accesses, name, lineno, kind=None):
+        access = {'function': self.current_function, 'name': name, 'line': lineno,
+                  'held': list(self.held_locks)}
+        if kind:
+            access['kind'] = kind
+        accesses.append(access)
+
+    def _record_write(self, target, base, kind):
+        """Records a write through `base`; only augmented targets also count as a read."""
+        self._record_access(self.global_writes, base.id, target.lineno, kind)
+        if id(target) not in self.augmented:
+            self.write_only.add(id(base))
+
+    def visit_Name(self, node):
+        if not self.current_function or not self._is_global(node.id):
+            return
+        if isinstance(node.ctx, ast.Load):
+            if id(node) not in self.write_only:
+                self._record_access(self.global_reads, node.id, node.lineno)
+        else:
+            # Only reachable for names declared `global` in this function.
+            self._record_access(self.global_writes, node.id, node.lineno,
+                                'augmented' if id(node) in self.augmented else 'rebind')
+            if id(node) in self.augmented:
+                self._record_access(self.global_reads, node.id, node.lineno)
+
+    def visit_AugAssign(self, node):
+        self.augmented.add(id(node.target))
         self.generic_visit(node)
-        self.current_function = None
+
+    def visit_Attribute(self, node):
+        if self.current_function and isinstance(node.ctx, (ast.Store, ast.Del)):
+            base = self._state_base(node.value)
+            if base is not None:
+                self._record_write(node, base, 'attribute')
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        if not self.current_function:
+            self.generic_visit(node)
+            return
+        # `for x in STATE`, `for k, v in STATE.items()`, `for x in sorted(STATE)`...
+        iterated = node.iter
+        while isinstance(iterated, ast.Call):
+            iterated = iterated.func.value if isinstance(iterated.func, ast.Attribute) else (
+                iterated.args[0] if iterated.args else None)
+        shared = iterated.id if isinstance(iterated, ast.Name) and self._is_global(iterated.id) else None
+        self.loops.append({'function': self.current_function, 'line': node.lineno, 'kind': 'for',
+                           'shared_state': shared, 'held': list(self.held_locks), 'unbounded': False})
+        self.loop_stack.append(node)
+        self.generic_visit(node)
+        self.loop_stack.pop()
+
+    def visit_While(self, node):
+        if not self.current_function:
+            self.generic_visit(node)
+            return
+        infinite = isinstance(node.test, ast.Constant) and bool(node.test.value)
+        exits = any(isinstance(child, (ast.Break, ast.Return, ast.Raise)) for child in ast.walk(node))
+        self.loops.append({'function': self.current_function, 'line': node.lineno, 'kind': 'while',
+                           'shared_state': None, 'held': list(self.held_locks),
+                           'unbounded': infinite and not exits})
+        self.loop_stack.append(node)
+        self.generic_visit(node)
+        self.loop_stack.pop()
+
+    def _add_routes(self, node, handler):
+        """
+        Adds an Endpoint node (`METHOD /path/{param}`) with a ROUTES_TO edge for
+        every route decorator on the handler.
+        """
+        for decorator in node.decorator_list:
+            if not (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute) and
+                    decorator.func.attr in ROUTE_DECORATORS and decorator.args and
+                    isinstance(decorator.args[0], ast.Constant) and isinstance(decorator.args[0].value, str)):
+                continue
+            rule = decorator.args[0].value
+            if decorator.func.attr == 'route':
+                methods = ['GET']
+                for keyword in decorator.keywords:
+                    if keyword.arg == 'methods' and isinstance(keyword.value, (ast.List, ast.Tuple, ast.Set)):
+                        methods = [elt.value.upper() for elt in keyword.value.elts
+                                   if isinstance(elt, ast.Constant) and isinstance(elt.value, str)]
+            else:
+                methods = [decorator.func.attr.upper()]
+            template = flask_rule_to_template(rule)
+            for method in methods:
+                endpoint = f"{method} {template}"
+                self.graph.add_node(endpoint, type='Endpoint', method=method, path=template, rule=rule,
+                                    lineno=decorator.lineno)
+                self.graph.add_edge(endpoint, handler, type='ROUTES_TO')
+
+    def visit_Assign(self, node):
+        if self.current_function:
+            cls = self.symbols.instantiated_class(node.value)
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    if cls:
+                        self.local_types[target.id] = cls
+                    else:
+                        self.local_types.pop(target.id, None)
+                    # Assignments in different branches accumulate (conservative).
+                    locks = self.lock_set(node.value)
+                    if locks:
+                        self.local_locks[target.id] = self.local_locks.get(target.id, set()) | locks
+        self.generic_visit(node)
+
+    def _type_of(self, expr):
+        """Best-effort static type (local class name) of an expression."""
+        if isinstance(expr, ast.Name):
+            if expr.id in ('self', 'cls'):
+                return self.method_owner
+            if expr.id in self.local_types:
+                return self.local_types[expr.id]
+            if expr.id in self.symbols.classes:
+                return expr.id
+            return self.symbols.instances.get(expr.id)
+        if isinstance(expr, ast.Attribute):
+            owner = self._type_of(expr.value)
+            if owner in self.symbols.classes:
+                return self.symbols.classes[owner]['attributes'].get(expr.attr)
+        return None
+
+    def resolve_call(self, func):
+        """Resolves a call target to a function node name, or None if external."""
+        if isinstance(func, ast.Name):
+            # Enclosing function scopes first (nested defs), then module level.
+            for scope in reversed(self.function_scopes):
+                if f"{scope}.{func.id}" in self.symbols.functions:
+                    return f"{scope}.{func.id}"
+            if func.id in self.symbols.functions:
+                return func.id
+            if func.id in self.symbols.classes:
+                return self.symbols.find_method(func.id, '__init__')
+            return self._module_function(func)
+        if isinstance(func, ast.Attribute):
+            owner = self._type_of(func.value)
+            if owner:
+                return self.symbols.find_method(owner, func.attr)
+            return self._module_function(func)
+        return None
+
+    def _module_function(self, func):
+        """Resolves a call into a local module, adding the callee's Function node the first time."""
+        name = self.symbols.module_function(func)
+        if name is not None and not self.graph.has_node(name):
+            module, _, function = name.rpartition('.')
+            info = self.symbols.modules[module][function]
+            self.graph.add_node(name, type='Function', **info)
+            self.graph.add_node(info['file'], type='File')
+            self.graph.add_edge(info['file'], name, type='CONTAINS')
+        return name
+
+    def external_name(self, func):
+        return self.symbols.external_name(func)
+
+    def visit_Subscript(self, node):
+        env = self.symbols.env_read(node)
+        if env and self.current_function:
+            self.env_reads.append({'function': self.current_function, 'var': env[0],
+                                   'has_default': False, 'line': node.lineno})
+        if self.current_function and isinstance(node.ctx, (ast.Store, ast.Del)):
+            base = self._state_base(node.value)
+            if base is not None:
+                self._record_write(node, base, 'delete' if isinstance(node.ctx, ast.Del) else 'subscript')
+        self.generic_visit(node)
+
+    def lock_ref(self, expr):
+        """Resolves an expression to a known lock id (`NAME` or `Class.attr`), or None."""
+        if isinstance(expr, ast.Name):
+            return expr.id if expr.id in self.symbols.locks else None
+        if (isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) and
+                expr.func.attr in STRIPE_SELECTORS):
+            return self.lock_ref(expr.func.value)
+        if isinstance(expr, ast.Attribute):
+            owner = self._type_of(expr.value)
+            if owner and f"{owner}.{expr.attr}" in self.symbols.locks:
+                return f"{owner}.{expr.attr}"
+        return None
+
+    def lock_set(self, expr):
+        """
+        Lock ids an expression may denote: a lock, `stripes.all()`, a list,
+        tuple, `+` or starred combination of those, or a local variable that
+        was assigned one.
+        """
+        lock = self.lock_ref(expr)
+        if lock:
+            return {lock}
+        if isinstance(expr, (ast.List, ast.Tuple)):
+            return set().union(*(self.lock_set(elt) for elt in expr.elts))
+        if isinstance(expr, ast.BinOp) and isinstance(expr.op, ast.Add):
+            return self.lock_set(expr.left) | self.lock_set(expr.right)
+        if isinstance(expr, ast.Starred):
+            return self.lock_set(expr.value)
+        if isinstance(expr, ast.Name):
+            return set(self.local_locks.get(expr.id, ()))
+        if (isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) and
+                expr.func.attr in STRIPE_ALL):
+            return {self.lock_ref(expr.func.value)} - {None}
+        return set()
+
+    def ordered_locks(self, expr):
+        """Locks taken by `manager.acquire_all(A, B, ...)`, in canonical order."""
+        if not (isinstance(expr, ast.Call) and isinstance(expr.func, ast.Attribute) and
+                expr.func.attr in ORDERED_ACQUIRE_METHODS):
+            return []
+        return sorted(set().union(*(self.lock_set(arg) for arg in expr.args)))
+
+    def _acquire(self, lock, lineno, kind):
+        order = sum(1 for e in self.lock_events if e['function'] == self.current_function)
+        self.lock_events.append({
+            'function': self.current_function, 'lock': lock, 'line': lineno,
+            'held': list(self.held_locks), 'kind': kind,
+        })
+        if not self.graph.has_edge(self.current_function, lock):
+            self.graph.add_edge(self.current_function, lock, type='ACQUIRES', line=lineno, order=order)
+        # Locks named `<PREFIX>LOCK_<TABLE>` guard a conceptual database table.
+        if 'LOCK_' in lock:
+            table_name = lock.rsplit('LOCK_', 1)[1]
+            if not self.graph.has_node(table_name):
+                self.graph.add_node(table_name, type='DatabaseTable')
+            if not self.graph.has_edge(self.current_function, table_name):
+                self.graph.add_edge(self.current_function, table_name, type='MODIFIES', order=order)
+        self.held_locks.append(lock)
+
+    def _release(self, lock):
+        if lock in self.held_locks:
+            del self.held_locks[len(self.held_locks) - 1 - self.held_locks[::-1].index(lock)]
 
     def visit_Call(self, node):
         """Called for each function call."""
-        if self.current_function and isinstance(node.func, ast.Name):
-            callee_name = node.func.id
+        if self.current_function:
+            callee_name = self.resolve_call(node.func)
             # We only add call edges for functions defined in our app
-            if callee_name in self.graph:
+            if callee_name:
                 self.graph.add_edge(self.current_function, callee_name, type='CALLS')
+                if self.held_locks:
+                    self.locked_calls.append({
+                        'function': self.current_function, 'callee': callee_name,
+                        'line': node.lineno, 'held': list(self.held_locks),
+                    })
+            external = self.external_name(node.func)
+            if external is None and isinstance(node.func, ast.Name) and node.func.id == 'open':
+                external = 'open'
+            if external:
+                seconds = (node.args[0].value if node.args and isinstance(node.args[0], ast.Constant) and
+                           isinstance(node.args[0].value, (int, float)) else None)
+                self.external_calls.append({
+                    'function': self.current_function, 'name': external, 'line': node.lineno,
+                    'held': list(self.held_locks), 'in_loop': bool(self.loop_stack), 'seconds': seconds,
+                })
+            if isinstance(node.func, ast.Attribute) and node.func.attr in MUTATING_METHODS:
+                base = self._state_base(node.func.value)
+                if base is not None:
+                    self._record_access(self.global_writes, base.id, node.lineno, node.func.attr)
+                    self.write_only.add(id(base))
+            env = self.symbols.env_read(node)
+            if env:
+                self.env_reads.append({'function': self.current_function, 'var': env[0],
+                                       'has_default': env[1], 'line': node.lineno})
+            # Explicit `lock.acquire()` / `lock.release()` pairs.
+            if isinstance(node.func, ast.Attribute) and node.func.attr in ('acquire', 'release'):
+                lock = self.lock_ref(node.func.value)
+                if lock and node.func.attr == 'acquire':
+                    self.generic_visit(node)
+                    self._acquire(lock, node.lineno, 'acquire')
+                    return
+                if lock:
+                    self._release(lock)
         self.generic_visit(node)
         
     def visit_With(self, node):
         """Called for 'with' statements, used here to detect lock usage."""
-        if not self.current_function:
-            self.generic_visit(node)
-            return
-            
+        acquired = []
         for item in node.items:
-            if isinstance(item.context_expr, ast.Name):
-                lock_name = item.context_expr.id
-                if lock_name in ['DB_LOCK_INVENTORY', 'DB_LOCK_ORDERS']:
-                    # Map lock variable to a conceptual database table
-                    table_name = lock_name.replace('DB_LOCK_', '')
-                    if not self.graph.has_node(table_name):
-                        self.graph.add_node(table_name, type='DatabaseTable')
-                    
-                    self.graph.add_edge(self.current_function, table_name, type='MODIFIES')
-        self.generic_visit(node)
+            self.visit(item.context_expr)
+            if item.optional_vars:
+                self.visit(item.optional_vars)
+            lock = self.lock_ref(item.context_expr)
+            if lock and self.current_function:
+                self._acquire(lock, node.lineno, 'with')
+                acquired.append(lock)
+            elif self.current_function:
+                for lock in self.ordered_locks(item.context_expr):
+                    self._acquire(lock, node.lineno, 'ordered')
+                    acquired.append(lock)
+        for stmt in node.body:
+            self.visit(stmt)
+        for lock in reversed(acquired):
+            self._release(lock)
 
 class CodeGraphBuilder:
     """
     Builds and manages the Code Intelligence Graph.
     """
-    def __init__(self, filepath):
+    def __init__(self, filepath, mappings_path=DEFAULT_MAPPINGS_PATH):
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Source file not found: {filepath}")
         self.filepath = filepath
+        self.mappings_path = mappings_path
         self.graph = nx.DiGraph()
         self.source_code = ""
 
-    def build(self):
+    def build(self, runtime_profile: dict = None):
         """
         Main method to build the graph.
         1. Parses code with AST.
-        2. Adds manual, high-level mappings.
+        2. Applies service/error mappings and inference rules from the mappings file,
+           then merges `runtime_profile` (see runtime_tracer.py) if given, so the
+           passes below also follow the calls only seen at runtime.
+        3. Precomputes the call-graph reachability index.
+        4. Builds the lock-order graph and precomputes its deadlock cycles.
+        5. Detects performance hazards and adds weighted CAN_CAUSE edges.
         """
         print(f"1. Parsing source file: {self.filepath}...")
         with open(self.filepath, 'r') as f:
@@ -97,53 +725,154 @@ class CodeGraphBuilder:
         self.graph.add_node(self.filepath, type='File')
         
         tree = ast.parse(self.source_code)
-        visitor = CodeVisitor(self.graph, self.filepath)
+        # Pass 1: symbol table of classes, methods, functions and imports.
+        symbols = SymbolTable()
+        collector = SymbolCollector(symbols)
+        collector.visit(tree)
+        collector.finalize()
+        symbols.load_local_modules(self.filepath)
+        # Pass 2: nodes and edges, with calls resolved against the symbol table.
+        for lock, info in symbols.locks.items():
+            self.graph.add_node(lock, type='Lock', kind=info['kind'], file=self.filepath, lineno=info['lineno'])
+        visitor = CodeVisitor(self.graph, self.filepath, symbols)
         visitor.visit(tree)
+        states = self._add_state_edges(visitor, symbols)
         print("   - AST parsing complete. Found functions and relationships.")
+        print(f"   - {states} shared-state node(s) with READS/WRITES edges.")
         
-        print("2. Adding manual intelligence layer (Services, Errors)...")
-        self._add_manual_mappings()
-        print("   - Manual mappings applied.")
-
-    def _add_manual_mappings(self):
-        """
-        This is a crucial step where we add domain knowledge that can't be
-        inferred from the AST alone. We map functions to services and potential errors.
-        """
-        # --- Map Functions to Services ---
-        service_mapping = {
-            'user-service': ['user_login'],
-            'product-service': ['product_search'],
-            'order-service': ['create_order', 'call_payment_service_from_order_service'],
-            'inventory-service': ['process_inventory_update'],
-            'payment-service': ['process_payment'],
-            'notification-service': ['send_notification'],
-            'worker-service': ['run_heavy_computation']
-        }
-        for service, funcs in service_mapping.items():
-            self.graph.add_node(service, type='Service')
-            for func in funcs:
-                if self.graph.has_node(func):
-                    self.graph.add_edge(service, func, type='IMPLEMENTS')
-
-        # --- Map Functions to Potential Errors (The "Intelligence") ---
-        error_mapping = {
-            'sql_injection_attempt': ['user_login'],
-            'database_slow_queries': ['product_search'],
-            'database_deadlock': ['create_order', 'process_inventory_update'],
-            'version_compatibility_issue': ['call_payment_service_from_order_service'],
-            'environment_variable_missing': ['send_notification'],
-            'thread_pool_exhaustion': ['run_heavy_computation']
-        }
-        for error, funcs in error_mapping.items():
-            self.graph.add_node(error, type='ErrorType')
-            for func in funcs:
-                if self.graph.has_node(func):
-                    self.graph.add_edge(func, error, type='CAN_CAUSE')
-                    
+        print(f"2. Applying service and error mappings from {self.mappings_path}...")
+        counts = apply_mappings(self.graph, load_mappings(self.mappings_path))
+        print(f"   - {counts['services']} explicit and {counts['inferred']} inferred service assignment(s), "
+              f"{counts['errors']} error mapping(s).")
+        if runtime_profile is not None:
+            counts = merge_runtime_profile(self.graph, runtime_profile)
+            print(f"   - Runtime profile merged: {counts['edges']} observed call edge(s), "
+                  f"{counts['runtime_only_edges']} missed by static analysis.")
+
+        print("3. Computing call-graph reachability index...")
+        index = build_reachability_index(self.graph)
+        attach_reachability_index(self.graph, index)
+        print(f"   - Indexed {sum(len(m) for m in index['members'])} functions and endpoints "
+              f"in {len(index['members'])} components.")
+
+        print("4. Analyzing lock acquisition order...")
+        cycles = self._analyze_lock_order(visitor, symbols, ReachabilityIndex(index))
+        print(f"   - {len(symbols.locks)} locks, {len(cycles)} potential deadlock cycle(s).")
+
+        print("5. Detecting static performance hazards...")
+        handlers = {v for u, v, t in self.graph.edges(data='type') if t == 'ROUTES_TO'}
+        findings = detect_hazards(visitor, handlers, ReachabilityIndex(index))
+        for finding in findings:
+            for error, weight in HAZARD_RULES[finding['hazard']]:
+                self._add_can_cause(finding['function'], error, round(weight * finding['factor'], 3),
+                                    'static_analysis',
+                                    [{key: finding[key] for key in ('hazard', 'line', 'detail')}])
+        print(f"   - {len(findings)} hazard finding(s) in {len({f['function'] for f in findings})} function(s).")
+        self.graph.graph.pop(STALE_ATTR, None)
+
+    def _add_can_cause(self, func, error, weight, source, evidence=None):
+        """Adds or strengthens a CAN_CAUSE edge; see graph_mappings.add_can_cause."""
+        add_can_cause(self.graph, func, error, weight, source, evidence)
+
+    def _add_state_edges(self, visitor, symbols):
+        """
+        Adds a GlobalState node (`module.NAME`, so it cannot clash with the
+        DatabaseTable nodes derived from lock names) for every module-level
+        variable a function touches, plus one edge per function and state:
+        WRITES if the function ever writes it, else READS. The edge's `accesses`
+        lists every access (line, mode, kind of write, locks held). The node's
+        `common_locks` is the set of locks held at every access; empty with
+        writers present means the state is not consistently guarded.
+        Returns the number of state nodes.
+        """
+        module = os.path.splitext(os.path.basename(self.filepath))[0]
+        accesses = {}
+        for mode, recorded in (('read', visitor.global_reads), ('write', visitor.global_writes)):
+            for access in recorded:
+                entry = {'line': access['line'], 'mode': mode, 'held': access['held']}
+                if 'kind' in access:
+                    entry['kind'] = access['kind']
+                accesses.setdefault((access['function'], access['name']), []).append(entry)
+
+        locksets = {}
+        for (func, name), entries in accesses.items():
+            state = f"{module}.{name}"
+            if not self.graph.has_node(state):
+                info = symbols.globals[name]
+                self.graph.add_node(state, type='GlobalState', name=name, file=self.filepath,
+                                    lineno=info['lineno'], mutable=info['mutable'])
+            entries.sort(key=lambda entry: entry['line'])
+            writes = any(entry['mode'] == 'write' for entry in entries)
+            self.graph.add_edge(func, state, type='WRITES' if writes else 'READS', accesses=json.dumps(entries))
+            for entry in entries:
+                held = set(entry['held'])
+                locksets[state] = locksets[state] & held if state in locksets else held
+        for state, locks in locksets.items():
+            self.graph.nodes[state]['common_locks'] = json.dumps(sorted(locks))
+        return len(locksets)
+
+    def _analyze_lock_order(self, visitor, symbols, reachability):
+        """
+        Builds the lock-order graph: an edge A -> B means some code path acquires
+        B while holding A, either directly (nested `with`/`acquire`) or through a
+        call made while holding A to a function that transitively acquires B.
+        Every cycle in that graph is a potential deadlock; cycles are stored on
+        the graph and their functions get CAN_CAUSE edges to `database_deadlock`.
+        """
+        direct = {}
+        for event in visitor.lock_events:
+            direct.setdefault(event['function'], set()).add(event['lock'])
+
+        def transitive_acquires(func):
+            locks = set(direct.get(func, ()))
+            for callee in reachability.descendants(func):
+                locks |= direct.get(callee, set())
+            return locks
+
+        lock_graph = nx.DiGraph()
+        lock_graph.add_nodes_from(symbols.locks)
+
+        def add_order(held, lock, site):
+            for holder in held:
+                if holder == lock and symbols.locks[lock]['kind'] in REENTRANT_LOCK_KINDS:
+                    continue
+                if not lock_graph.has_edge(holder, lock):
+                    lock_graph.add_edge(holder, lock, sites=[])
+                if site not in lock_graph[holder][lock]['sites']:
+                    lock_graph[holder][lock]['sites'].append(site)
+
+        for event in visitor.lock_events:
+            add_order(event['held'], event['lock'],
+                      {'function': event['function'], 'line': event['line'], 'via': None})
+        for call in visitor.locked_calls:
+            for lock in sorted(transitive_acquires(call['callee'])):
+                add_order(call['held'], lock,
+                          {'function': call['function'], 'line': call['line'], 'via': call['callee']})
+
+        for holder, lock, data in lock_graph.edges(data=True):
+            self.graph.add_edge(holder, lock, type='LOCK_ORDER', sites=json.dumps(data['sites']))
+
+        cycles = []
+        for cycle in nx.simple_cycles(lock_graph):
+            edges = [{'from': a, 'to': b, 'sites': lock_graph[a][b]['sites']}
+                     for a, b in zip(cycle, cycle[1:] + cycle[:1])]
+            functions = sorted({site['function'] for edge in edges for site in edge['sites']})
+            cycles.append({'locks': cycle, 'edges': edges, 'functions': functions})
+        self.graph.graph['deadlock_cycles'] = json.dumps(cycles)
+
+        for cycle in cycles:
+            for edge in cycle['edges']:
+                for site in edge['sites']:
+                    via = f" via {site['via']}" if site['via'] else ""
+                    self._add_can_cause(site['function'], 'database_deadlock', 0.9, 'lock_analysis', [{
+                        'hazard': 'lock_order_cycle', 'line': site['line'],
+                        'detail': f"acquires {edge['to']} while holding {edge['from']}{via}",
+                    }])
+        return cycles
+
     def save_graph(self, output_path="code_intelligence_graph.graphml"):
         """Saves the graph to a file."""
-        print(f"3. Saving graph to {output_path}...")
+        print(f"6. Saving graph to {output_path}...")
         # Add source code as a graph attribute
         self.graph.graph['source_code'] = self.source_code
         nx.write_graphml(self.graph, output_path)
@@ -151,15 +880,17 @@ class CodeGraphBuilder:
 
     def visualize_graph(self):
         """Creates and displays a visualization of the graph."""
-        print("4. Generating graph visualization...")
+        print("7. Generating graph visualization...")
+        import matplotlib.pyplot as plt
         plt.figure(figsize=(20, 20))
         
         pos = nx.spring_layout(self.graph, k=0.9, iterations=50)
 
         # Define colors for each node type
         color_map = {
-            'File': 'gold', 'Service': 'skyblue', 'Function': 'lightgreen',
-            'DatabaseTable': 'salmon', 'ErrorType': 'tomato'
+            'File': 'gold', 'Service': 'skyblue', 'Function': 'lightgreen', 'Class': 'palegreen',
+            'DatabaseTable': 'salmon', 'ErrorType': 'tomato', 'Lock': 'orchid',
+            'Endpoint': 'khaki', 'GlobalState': 'lightsalmon'
         }
         node_colors = [color_map.get(self.graph.nodes[n].get('type', 'default'), 'grey') for n in self.graph.nodes]
         
@@ -176,6 +907,53 @@ class CodeGraphBuilder:
 
 def main():
     """Main execution function."""
+    parser = argparse.ArgumentParser(description="Build the Code Intelligence Graph.")
+    parser.add_argument("--mappings", default=DEFAULT_MAPPINGS_PATH,
+                        help="service/error mappings file (default: %(default)s)")
+    parser.add_argument("--mappings-only", action="store_true",
+                        help="re-apply the mappings to the saved graph without re-parsing the source")
+    parser.add_argument("--runtime-profile", metavar="PROFILE",
+                        help="merge a runtime_tracer.py profile (observed calls and hotness); with "
+                             "--mappings-only or on its own it is applied to the saved graph, which on its "
+                             "own is then rebuilt if the profile changes the runtime-only calls")
+    parser.add_argument("--no-visualize", action="store_true", help="skip the matplotlib visualization")
+    args = parser.parse_args()
+    graph_file = "code_intelligence_graph.graphml"
+
+    if args.runtime_profile and not args.mappings_only:
+        if os.path.exists(graph_file):
+            start = time.perf_counter()
+            counts = overlay_runtime_profile(graph_file, args.runtime_profile)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"✅ Merged runtime profile '{args.runtime_profile}' into '{graph_file}' in {elapsed_ms:.1f} ms: "
+                  f"{counts['functions']} function(s), {counts['edges']} observed call edge(s), "
+                  f"{counts['runtime_only_edges']} missed by static analysis.")
+            if not counts['call_graph_changed']:
+                return
+            print("   - The runtime-only calls changed; rebuilding so lock-order cycles and hazards follow them.")
+        else:
+            print(f"'{graph_file}' not found; running a full build first.")
+
+    if args.mappings_only:
+        if not os.path.exists(graph_file):
+            print(f"ERROR: '{graph_file}' not found. Run a full build first.")
+            return
+        start = time.perf_counter()
+        counts = overlay_mappings(graph_file, args.mappings)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if counts.get('unchanged'):
+            print(f"Mappings in '{args.mappings}' are already applied ({elapsed_ms:.1f} ms).")
+        else:
+            print(f"✅ Re-applied '{args.mappings}' to '{graph_file}' in {elapsed_ms:.1f} ms: "
+                  f"{counts['services']} explicit and {counts['inferred']} inferred service assignment(s), "
+                  f"{counts['errors']} error mapping(s).")
+        if args.runtime_profile:
+            counts = overlay_runtime_profile(graph_file, args.runtime_profile)
+            print(f"✅ Merged runtime profile '{args.runtime_profile}'.")
+            if counts['call_graph_changed']:
+                print("   - Lock-order cycles and hazards predate its runtime-only calls.")
+        return
+
     source_file = "buggy_app.py"
     if not os.path.exists(source_file):
         print(f"ERROR: The source file '{source_file}' was not found.")
@@ -192,10 +970,11 @@ def main():
         subprocess.check_call([sys.executable, "-m", "pip", "install", "astunparse"])
         print("'astunparse' installed successfully.")
 
-    builder = CodeGraphBuilder(source_file)
-    builder.build()
-    builder.save_graph()
-    builder.visualize_graph()
+    builder = CodeGraphBuilder(source_file, args.mappings)
+    builder.build(load_runtime_profile(args.runtime_profile) if args.runtime_profile else None)
+    builder.save_graph(graph_file)
+    if not args.no_visualize:
+        builder.visualize_graph()
     
     print("\n✅ Ingestion process complete!")
     print("Your Code Intelligence Graph is ready and saved as 'code_intelligence_graph.graphml'.")
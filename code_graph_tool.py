@@ -1,40 +1,58 @@
-import networkx as nx
 import os
 from crewai.tools import tool # <-- FINAL FIX: The correct path is 'crewai.tools'
+from context_builder import ContextBuilder, DEFAULT_TOKEN_BUDGET
+from path_query import PathQuerySyntaxError
+from query_graph import GraphQueryEngine
 
-# The logic engine remains the same, no changes needed here.
-class GraphQueryEngine:
-    """A query engine for the Code Intelligence Graph."""
-    def __init__(self, graph_path="code_intelligence_graph.graphml"):
-        if not os.path.exists(graph_path):
-            raise FileNotFoundError(f"Graph file not found: {graph_path}.")
-        self.graph = nx.read_graphml(graph_path)
-
-    def find_functions_causing_error(self, error_type: str) -> list[str]:
-        culprits = []
-        if not self.graph.has_node(error_type): return []
-        for predecessor in self.graph.predecessors(error_type):
-            if (self.graph.nodes[predecessor].get('type') == 'Function' and
-                self.graph[predecessor][error_type].get('type') == 'CAN_CAUSE'):
-                culprits.append(predecessor)
-        return culprits
-
-    def find_modified_tables(self, function_names: list[str]) -> dict:
-        modification_map = {}
-        for func_name in function_names:
-            modified_tables = []
-            if not self.graph.has_node(func_name): continue
-            for successor in self.graph.successors(func_name):
-                if (self.graph.nodes[successor].get('type') == 'DatabaseTable' and
-                    self.graph[func_name][successor].get('type') == 'MODIFIES'):
-                    modified_tables.append(successor)
-            modification_map[func_name] = modified_tables
-        return modification_map
-
-    def get_function_source_code(self, function_name: str) -> str:
-        if self.graph.has_node(function_name):
-            return self.graph.nodes[function_name].get('source_code', '# Source code not found.')
-        return f"# Function '{function_name}' not found in graph."
+GRAPH_PATH = "code_intelligence_graph.graphml"
+
+# Upper bound on the source-code context returned to the agent.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CODE_GRAPH_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+_engine_cache = {}
+
+def get_engine(graph_path=GRAPH_PATH) -> GraphQueryEngine:
+    """
+    Returns a GraphQueryEngine for the graph file, reloading it only when the
+    file changes so its indexes and compiled query plans survive across tool calls.
+    """
+    if not os.path.exists(graph_path):
+        raise FileNotFoundError(f"Graph file not found: {graph_path}.")
+    mtime = os.path.getmtime(graph_path)
+    cached = _engine_cache.get(graph_path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, GraphQueryEngine(graph_path))
+        _engine_cache[graph_path] = cached
+    return cached[1]
+
+
+def format_deadlock_cycles(cycles: list[dict]) -> str:
+    """Renders precomputed lock-order cycles as the exact conflicting acquisition sites."""
+    if not cycles:
+        return ""
+    text = f"Lock-order analysis found {len(cycles)} deadlock cycle(s):\n"
+    for i, cycle in enumerate(cycles, 1):
+        text += f"  Cycle {i}: {' -> '.join(cycle['locks'] + cycle['locks'][:1])}\n"
+        for edge in cycle['edges']:
+            for site in edge['sites']:
+                via = f" via call to {site['via']}" if site['via'] else ""
+                text += (f"    - {site['function']} (line {site['line']}) acquires {edge['to']} "
+                         f"while holding {edge['from']}{via}\n")
+    return text + "\n"
+
+
+def format_shared_state(func: str, shared: dict) -> str:
+    """Renders the mutable module-level state a function shares with other functions."""
+    text = ""
+    for state, info in sorted(shared.items()):
+        if not info['others'] or not (info['writes'] or any(e['writes'] for e in info['others'].values())):
+            continue
+        others = ', '.join(f"{other} ({'writes' if entry['writes'] else 'reads'})"
+                           for other, entry in sorted(info['others'].items()))
+        guard = (f"guarded by {', '.join(info['common_locks'])}" if info['common_locks']
+                 else "no lock common to all accesses")
+        text += f"Shared State: {'writes' if info['writes'] else 'reads'} {state}, also used by {others}; {guard}\n"
+    return text
 
 
 @tool("Code Intelligence Graph Tool")
@@ -45,28 +63,111 @@ def code_graph_tool(error_type: str) -> str:
     such as 'database_deadlock' or 'sql_injection_attempt'.
     """
     try:
-        engine = GraphQueryEngine()
+        engine = get_engine()
         
         culprit_functions = engine.find_functions_causing_error(error_type)
         if not culprit_functions:
             return f"No functions found in the knowledge graph that are known to cause '{error_type}'."
         
         table_modifications = engine.find_modified_tables(culprit_functions)
+        context = ContextBuilder(engine.graph, token_budget=CONTEXT_TOKEN_BUDGET).build(culprit_functions)
         
         result = f"Analysis for ErrorType '{error_type}':\n"
+        if engine.analysis_stale:
+            result += ("Note: calls observed at runtime were merged after static analysis; lock-order "
+                       "and hazard findings may be incomplete until the graph is rebuilt.\n")
         result += f"Found {len(culprit_functions)} potential culprit function(s): {', '.join(culprit_functions)}\n\n"
+
+        if error_type == 'database_deadlock':
+            result += format_deadlock_cycles(engine.find_deadlock_cycles(culprit_functions))
         
-        for func in culprit_functions:
-            source_code = engine.get_function_source_code(func)
-            modified = table_modifications.get(func, [])
-            result += f"--- Details for function: {func} ---\n"
-            if modified:
-                result += f"Modifies Resources: {', '.join(modified)}\n"
-            result += "Source Code:\n```python\n"
-            result += source_code + "\n```\n\n"
+        for snippet in context['snippets']:
+            func = snippet['name']
+            if snippet['role'] == 'culprit':
+                result += f"--- Details for function: {func} ---\n"
+                modified = table_modifications.get(func, [])
+                if modified:
+                    result += f"Modifies Resources: {', '.join(modified)}\n"
+                for evidence in engine.get_error_evidence(func, error_type):
+                    result += f"Evidence (line {evidence['line']}): {evidence['detail']}\n"
+                result += format_shared_state(func, engine.find_shared_state(func))
+            else:
+                result += f"--- Related helper: {func} ---\n"
+            if snippet['elided']:
+                result += "Source Code (body elided to fit the context budget):\n```python\n"
+            else:
+                result += "Source Code:\n```python\n"
+            result += snippet['code'] + "\n```\n\n"
+
+        if context['omitted']:
+            result += f"Omitted lower-ranked helpers: {', '.join(context['omitted'])}\n"
+        result += (f"Context: {context['tokens_used']}/{context['token_budget']} tokens used, "
+                   f"{context['tokens_saved']} of {context['tokens_original']} tokens saved.\n")
+        if context['tokens_over_budget']:
+            result += (f"Warning: culprit signatures alone exceed the context budget by "
+                       f"{context['tokens_over_budget']} tokens.\n")
             
         return result
     except FileNotFoundError as e:
         return f"Error: The code intelligence graph file has not been generated yet. Please run build_graph.py. Details: {e}"
     except Exception as e:
-        return f"An unexpected error occurred while querying the code graph: {e}"
\ No newline at end of file
+        return f"An unexpected error occurred while querying the code graph: {e}"
+
+
+@tool("Graph Path Query Tool")
+def graph_path_query_tool(query: str) -> str:
+    """
+    Answers multi-hop questions about the codebase in a single call using a
+    Cypher-like path pattern over the Code Intelligence Graph. Node types are
+    Function, Class, Endpoint, Service, DatabaseTable, Lock, GlobalState,
+    ErrorType and File; edge types are CALLS, ROUTES_TO, MODIFIES, ACQUIRES,
+    LOCK_ORDER, READS, WRITES, CAN_CAUSE, IMPLEMENTS and CONTAINS. Example input:
+    "MATCH (ep:Endpoint)-[:ROUTES_TO]->(f:Function)-[:CAN_CAUSE]->({name: 'thread_pool_exhaustion'}) RETURN ep, f"
+    """
+    try:
+        engine = get_engine()
+        rows = engine.query(query)
+        if not rows:
+            return "The query matched nothing in the knowledge graph."
+        lines = [", ".join(f"{var}={value}" for var, value in row.items()) for row in rows]
+        return f"{len(rows)} match(es):\n" + "\n".join(lines)
+    except PathQuerySyntaxError as e:
+        return f"Invalid path query: {e}"
+    except FileNotFoundError as e:
+        return f"Error: The code intelligence graph file has not been generated yet. Please run build_graph.py. Details: {e}"
+    except Exception as e:
+        return f"An unexpected error occurred while querying the code graph: {e}"
+
+
+@tool("Access Log Route Tool")
+def access_log_route_tool(access_log: str) -> str:
+    """
+    Maps failing requests (HTTP 5xx) in raw access log lines to the handler
+    functions that serve them, and lists the ErrorTypes each handler is known
+    to cause. The input is one or more access log lines containing request
+    lines such as '"POST /api/v1/orders/create HTTP/1.1" 503'.
+    """
+    try:
+        engine = get_engine()
+        resolved = engine.find_failing_handlers(access_log.splitlines())
+        handlers, unmatched = resolved['handlers'], resolved['unmatched']
+        if not handlers and not unmatched:
+            return "No failing (5xx) requests found in the provided access log."
+
+        result = ""
+        for handler, entry in sorted(handlers.items(), key=lambda item: -item[1]['count']):
+            statuses = ', '.join(f"{code} x{count}" for code, count in sorted(entry['statuses'].items()))
+            routes = ', '.join(entry['routes'])
+            errors = [e for e in engine.graph.successors(handler)
+                      if engine.graph[handler][e].get('type') == 'CAN_CAUSE']
+            result += f"- {handler}: {entry['count']} failing request(s) [{statuses}] on {routes}\n"
+            if errors:
+                result += f"  Known to cause: {', '.join(errors)}\n"
+        if unmatched:
+            result += "Requests with no handler in this codebase: "
+            result += ', '.join(f"{route} x{count}" for route, count in unmatched.most_common()) + "\n"
+        return result
+    except FileNotFoundError as e:
+        return f"Error: The code intelligence graph file has not been generated yet. Please run build_graph.py. Details: {e}"
+    except Exception as e:
+        return f"An unexpected error occurred while querying the code graph: {e}"
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Token-Budgeted Context Builder
+
+Assembles the source-code context that `code_graph_tool` hands to the LLM.
+Instead of concatenating the full source of every culprit function, snippets
+are ranked by their relevance in the Code Intelligence Graph and packed into
+a fixed token budget:
+
+- Culprit functions (CAN_CAUSE the error) are packed first, in the order
+  given. Helpers reached over CALLS edges follow, ranked lower the further
+  away they are and higher when a merged runtime profile shows the call to be
+  hot; their scores stay below a culprit's.
+- Docstrings and comments are stripped from every snippet.
+- Snippets that do not fit the budget are reduced to their signature with the
+  body elided, or dropped entirely. Culprits always keep their signature; if
+  that alone overruns the budget, the overrun is reported.
+- Helpers shared by several culprits are emitted once.
+"""
+import ast
+import re
+import textwrap
+
+from astunparse import unparse
+
+from runtime_tracer import HOTNESS_BOOST
+
+DEFAULT_TOKEN_BUDGET = 1500
+
+# Rough BPE approximation: every identifier/number and every punctuation
+# character counts as one token. Good enough for budgeting, no tokenizer needed.
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# How far (in CALLS hops) to look for helpers around the culprits, and how much
+# a helper is worth relative to a culprit at distance 1.
+HELPER_DEPTH = 2
+CALLEE_WEIGHT = 0.5
+CALLER_WEIGHT = 0.3
+# Helper scores are capped here, below a culprit's 1.0.
+MAX_HELPER_SCORE = 0.99
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximates the number of LLM tokens in a piece of text."""
+    return len(_TOKEN_PATTERN.findall(text))
+
+
+def _parse_snippet(source_code: str):
+    """Parses a stored function snippet, returning None if it is not valid Python."""
+    try:
+        return ast.parse(textwrap.dedent(source_code))
+    except SyntaxError:
+        return None
+
+
+def _drop_docstring(node):
+    body = getattr(node, 'body', None)
+    if (body and isinstance(body[0], ast.Expr) and
+            isinstance(body[0].value, ast.Constant) and isinstance(body[0].value.value, str)):
+        node.body = body[1:] or [ast.Pass()]
+
+
+def strip_docstrings_and_comments(source_code: str) -> str:
+    """
+    Removes docstrings and comments from a snippet. Comments disappear on the
+    AST round-trip; docstrings are dropped from every function and class body.
+    """
+    tree = _parse_snippet(source_code)
+    if tree is None:
+        return "\n".join(line for line in source_code.splitlines()
+                         if not line.lstrip().startswith('#'))
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            _drop_docstring(node)
+    return unparse(tree).strip()
+
+
+def elide_body(source_code: str) -> str:
+    """Reduces a function snippet to its decorators and signature."""
+    tree = _parse_snippet(source_code)
+    if tree is None or not tree.body:
+        return source_code.splitlines()[0] if source_code else ''
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            node.body = [ast.Expr(ast.Constant(Ellipsis))]
+    return unparse(tree).strip()
+
+
+class ContextBuilder:
+    """
+    Ranks and packs function snippets from the Code Intelligence Graph into
+    a token budget.
+    """
+    def __init__(self, graph, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.graph = graph
+        self.token_budget = token_budget
+
+    def _is_function(self, node) -> bool:
+        return self.graph.nodes[node].get('type') == 'Function'
+
+    def _calls_neighbours(self, node, reverse=False):
+        """Yields (neighbour, hotness of the CALLS edge) pairs."""
+        neighbours = self.graph.predecessors(node) if reverse else self.graph.successors(node)
+        for other in neighbours:
+            edge = self.graph[other][node] if reverse else self.graph[node][other]
+            if edge.get('type') == 'CALLS' and self._is_function(other):
+                yield other, edge.get('hotness', 0.0)
+
+    def rank_functions(self, culprit_functions: list[str]) -> dict:
+        """
+        Scores every function within HELPER_DEPTH CALLS hops of the culprits.
+        Culprits score 1.0. A helper shared by several culprits accumulates
+        their scores, so it ranks higher but is still a single entry, and never
+        reaches a culprit's score (MAX_HELPER_SCORE).
+        """
+        scores = {name: 1.0 for name in culprit_functions if self.graph.has_node(name)}
+        for culprit in list(scores):
+            for reverse, weight in ((False, CALLEE_WEIGHT), (True, CALLER_WEIGHT)):
+                frontier, seen = [culprit], {culprit}
+                for depth in range(1, HELPER_DEPTH + 1):
+                    next_frontier = []
+                    for node in frontier:
+                        for other, hotness in self._calls_neighbours(node, reverse=reverse):
+                            if other in seen:
+                                continue
+                            seen.add(other)
+                            next_frontier.append(other)
+                            if other not in culprit_functions:
+                                boost = 1 + HOTNESS_BOOST * hotness
+                                scores[other] = scores.get(other, 0.0) + boost * weight / depth
+                    frontier = next_frontier
+        for name in scores:
+            if name not in culprit_functions:
+                scores[name] = min(scores[name], MAX_HELPER_SCORE)
+        return scores
+
+    def build(self, culprit_functions: list[str]) -> dict:
+        """
+        Selects snippets for the given culprits within the token budget.
+
+        Culprits are packed before any helper. Returns a dict with the ordered
+        `snippets` (culprits first, then helpers by rank) and token accounting:
+        `tokens_used`, `tokens_original` (the raw, unstripped source of every
+        candidate), `tokens_saved` and `tokens_over_budget` (how far the
+        culprit signatures alone went past the budget, 0 if they fit).
+        """
+        scores = self.rank_functions(culprit_functions)
+        culprits = list(dict.fromkeys(name for name in culprit_functions if name in scores))
+        helpers = sorted((name for name in scores if name not in culprit_functions),
+                         key=lambda name: (-scores[name], name))
+        ranked = culprits + helpers
+
+        # Room kept for the signatures of culprits not packed yet, so an early
+        # culprit's full body cannot push a later one past the budget.
+        signatures = {name: elide_body(self.graph.nodes[name].get('source_code', '')) for name in culprits}
+        reserved = sum(estimate_tokens(code) for code in signatures.values())
+
+        snippets, remaining = [], self.token_budget
+        tokens_original = 0
+        omitted = []
+        for name in ranked:
+            raw = self.graph.nodes[name].get('source_code', '')
+            tokens_original += estimate_tokens(raw)
+            is_culprit = name in culprit_functions
+            if is_culprit:
+                reserved -= estimate_tokens(signatures[name])
+            full = strip_docstrings_and_comments(raw)
+            full_tokens = estimate_tokens(full)
+            if full_tokens <= remaining - reserved:
+                code, tokens, elided = full, full_tokens, False
+            else:
+                code = elide_body(raw)
+                tokens, elided = estimate_tokens(code), True
+                # Culprits always keep at least their signature.
+                if tokens > remaining - reserved and not is_culprit:
+                    omitted.append(name)
+                    continue
+            remaining = max(remaining - tokens, 0)
+            snippets.append({
+                'name': name,
+                'role': 'culprit' if is_culprit else 'helper',
+                'score': round(scores[name], 3),
+                'code': code,
+                'tokens': tokens,
+                'elided': elided,
+            })
+
+        snippets.sort(key=lambda s: (s['role'] != 'culprit',
+                                     culprit_functions.index(s['name']) if s['role'] == 'culprit' else 0,
+                                     -s['score']))
+        tokens_used = sum(s['tokens'] for s in snippets)
+        return {
+            'snippets': snippets,
+            'omitted': omitted,
+            'token_budget': self.token_budget,
+            'tokens_used': tokens_used,
+            'tokens_original': tokens_original,
+            'tokens_saved': max(tokens_original - tokens_used, 0),
+            'tokens_over_budget': max(tokens_used - self.token_budget, 0),
+        }
@@ -5,6 +5,8 @@ This file generates comprehensive, realistic errors and issues for postmortem an
 with structured data for RAG knowledge base population
 """
 
+import argparse
+import atexit
 import sys
 import time
 import random
@@ -13,10 +15,14 @@ import json
 import os
 import uuid
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
 import requests
 import psutil
 
+from access_log_generator import AccessLogGenerator
+from load_generator import LoadGenerator
+from log_queue import BatchedFileHandler, BatchedStreamHandler, QueueLogWriter
+from virtual_clock import SystemClock, VirtualClock, use_for_logging
+
 # Ensure log directory exists
 os.makedirs("logs", exist_ok=True)
 os.makedirs("incident_data", exist_ok=True)
@@ -30,6 +36,15 @@ error_log_file = f"logs/error_{timestamp}.log"
 access_log_file = f"logs/access_{timestamp}.log"
 incident_file = f"incident_data/incident_{timestamp}.json"
 
+# buggy_app.py instance the load tests run against
+LOAD_TEST_URL = os.environ.get("LOAD_TEST_URL", "http://127.0.0.1:5000")
+# Log records are written by a background thread from a bounded queue (see
+# log_queue.py); when it is full, 'block' waits for room and 'drop' discards
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_QUEUE_POLICY = os.environ.get("LOG_QUEUE_POLICY", "block")
+# Lines per second assumed for the first access log batch, which has no previous one to start from
+ACCESS_LOG_RATE = 50
+
 # Custom filter to separate error logs from application logs
 class ErrorFilter(logging.Filter):
     def filter(self, record):
@@ -46,37 +61,42 @@ def setup_logging():
     app_logger.setLevel(logging.INFO)
     
     # Application log handler (INFO and WARNING)
-    app_handler = logging.FileHandler(app_log_file)
+    app_handler = BatchedFileHandler(app_log_file)
     app_handler.setLevel(logging.INFO)
     app_handler.addFilter(AppFilter())
     app_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     app_handler.setFormatter(app_formatter)
     
     # Error log handler (ERROR and CRITICAL only)
-    error_handler = logging.FileHandler(error_log_file)
+    error_handler = BatchedFileHandler(error_log_file)
     error_handler.setLevel(logging.ERROR)
     error_handler.addFilter(ErrorFilter())
     error_formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
     error_handler.setFormatter(error_formatter)
     
     # Console handler (all levels)
-    console_handler = logging.StreamHandler()
+    console_handler = BatchedStreamHandler()
     console_handler.setLevel(logging.INFO)
     console_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
     console_handler.setFormatter(console_formatter)
     
-    # Add handlers to logger
-    app_logger.addHandler(app_handler)
-    app_logger.addHandler(error_handler)
-    app_logger.addHandler(console_handler)
+    # The handlers run on the log writer thread; callers only enqueue records
+    log_writer = QueueLogWriter([app_handler, error_handler, console_handler],
+                                max_queue=LOG_QUEUE_SIZE, policy=LOG_QUEUE_POLICY)
+    app_logger.addHandler(log_writer.handler)
+    log_writer.start()
+    atexit.register(log_writer.stop)
     
-    return app_logger
+    return app_logger, log_writer
 
 # Setup logging
-logger = setup_logging()
+logger, log_writer = setup_logging()
 
 class EcommercePlatform:
-    def __init__(self):
+    def __init__(self, clock=None):
+        # Every timestamp and sleep goes through the clock; a VirtualClock
+        # (see virtual_clock.py) runs the whole timeline without waiting
+        self.clock = clock or SystemClock()
         self.services = {
             'user-service': {'port': 8001, 'status': 'running', 'cpu_usage': 0, 'version': 'v1.2.3'},
             'product-service': {'port': 8002, 'status': 'running', 'cpu_usage': 0, 'version': 'v2.1.0'},
@@ -88,6 +108,8 @@ class EcommercePlatform:
         self.database_connection_pool = 20
         self.redis_connections = 100
         self.current_incident = None
+        self.access_logs_until = None   # end of the time the access log covers
+        self.access_log_stats = {'lines': 0, 'bytes': 0, 'seconds': 0.0}
         
         # Enhanced incident scenarios with categories for RAG knowledge base
         self.incident_scenarios = {
@@ -141,7 +163,7 @@ class EcommercePlatform:
             'incident_type': incident_type,
             'service': service_name,
             'error_hash': hash(str(error_details)),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': self.clock.now().isoformat()
         }
         return str(uuid.uuid4())[:8]
     
@@ -150,7 +172,7 @@ class EcommercePlatform:
         incident_id = str(uuid.uuid4())
         incident_data = {
             'incident_id': incident_id,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': self.clock.now().isoformat(),
             'incident_type': incident_type,
             'service': service_name,
             'severity': severity,
@@ -301,6 +323,17 @@ class EcommercePlatform:
         logger.critical("Payment processing halted - database unreachable")
         self.services[service]['status'] = 'degraded'
 
+    def _third_party_api_failure(self):
+        service = 'payment-service'
+        incident_id = self.save_incident_metadata('third_party_api_failure', service, 'critical',
+                                                 {'api_provider': 'stripe', 'status_code': 502, 'error_rate': '64%'})
+        logger.error(f"INCIDENT_ID:{incident_id} - THIRD-PARTY API FAILURE")
+        logger.error("Stripe API returning HTTP 502: Bad Gateway")
+        logger.error("64% of payment requests failed in the last 5 minutes")
+        logger.error("requests.exceptions.ReadTimeout: HTTPSConnectionPool(host='api.stripe.com', port=443)")
+        logger.critical("Checkout unavailable - payments cannot be processed")
+        self.services[service]['status'] = 'critical'
+
     # Enhanced API Failures
     def _api_rate_limiting(self):
         incident_id = self.save_incident_metadata('api_rate_limiting', 'payment-service', 'medium',
@@ -370,7 +403,50 @@ class EcommercePlatform:
         logger.error("Full GC triggered 15 times in last minute")
         logger.critical("Application pauses causing timeout failures")
 
+    def _memory_leak(self):
+        service = 'order-service'
+        incident_id = self.save_incident_metadata('memory_leak', service, 'high',
+                                                 {'memory_usage': '94%', 'growth_rate': '120MB/h', 'uptime': '3d 4h'})
+        logger.error(f"INCIDENT_ID:{incident_id} - MEMORY LEAK DETECTED")
+        logger.error("Heap usage growing 120MB/h without release (now 94%)")
+        logger.error("Unreleased session objects retained by order cache")
+        logger.error("java.lang.OutOfMemoryError: Java heap space")
+        logger.critical("Pod restarts imminent - OOMKilled expected")
+        self.services[service]['status'] = 'degraded'
+
+    def _high_cpu_usage(self):
+        service = 'product-service'
+        incident_id = self.save_incident_metadata('high_cpu_usage', service, 'high',
+                                                 {'cpu_usage': '98%', 'threshold': '80%', 'hot_endpoint': '/api/v2/products/search'})
+        logger.error(f"INCIDENT_ID:{incident_id} - HIGH CPU USAGE")
+        logger.error("CPU utilization at 98% for 10 minutes (threshold: 80%)")
+        logger.error("Hot path: /api/v2/products/search full catalog scan")
+        logger.error("Request latency p99 increased to 4.8s")
+        logger.warning("Autoscaler adding replicas")
+        self.services[service]['cpu_usage'] = 98
+        self.services[service]['status'] = 'degraded'
+
     # Enhanced Infrastructure Issues
+    def _disk_space_issue(self):
+        incident_id = self.save_incident_metadata('disk_space_issue', 'database', 'critical',
+                                                 {'disk_usage': '97%', 'volume': '/var/lib/postgresql', 'largest_consumer': 'WAL archive'})
+        logger.error(f"INCIDENT_ID:{incident_id} - DISK SPACE CRITICAL")
+        logger.error("Volume /var/lib/postgresql at 97% capacity")
+        logger.error("WAL archive not rotated - 180GB retained")
+        logger.error("OSError: [Errno 28] No space left on device")
+        logger.critical("Database writes failing - orders cannot be saved")
+
+    def _network_timeout(self):
+        service = 'inventory-service'
+        incident_id = self.save_incident_metadata('network_timeout', service, 'high',
+                                                 {'timeout': '30s', 'packet_loss': '12%', 'affected_link': 'order-service -> inventory-service'})
+        logger.error(f"INCIDENT_ID:{incident_id} - NETWORK TIMEOUT")
+        logger.error("Connection to inventory-service:8005 timed out after 30s")
+        logger.error("Packet loss between availability zones: 12%")
+        logger.error("TCP retransmissions increased 25x")
+        logger.warning("Retry storms amplifying network load")
+        self.services[service]['status'] = 'degraded'
+
     def _dns_resolution_failure(self):
         incident_id = self.save_incident_metadata('dns_resolution_failure', 'dns', 'high',
                                                  {'failed_domains': ['payment-gateway.com', 'inventory-api.internal']})
@@ -401,6 +477,17 @@ class EcommercePlatform:
         logger.critical("Cannot handle current load - service degradation inevitable")
 
     # Enhanced Security Issues
+    def _authentication_failure(self):
+        service = 'user-service'
+        incident_id = self.save_incident_metadata('authentication_failure', service, 'high',
+                                                 {'failed_logins': 1240, 'auth_provider': 'oauth2', 'error': 'invalid_token'})
+        logger.error(f"INCIDENT_ID:{incident_id} - AUTHENTICATION FAILURE")
+        logger.error("1240 login failures in 5 minutes: invalid_token")
+        logger.error("JWT signature verification failed - signing key rotated")
+        logger.error("OAuth2 token endpoint returning HTTP 401")
+        logger.critical("Users unable to log in")
+        self.services[service]['status'] = 'degraded'
+
     def _sql_injection_attempt(self):
         incident_id = self.save_incident_metadata('sql_injection_attempt', 'user-service', 'critical',
                                                  {'attack_pattern': "' OR '1'='1", 'source_ip': '203.0.113.42'})
@@ -438,6 +525,17 @@ class EcommercePlatform:
         logger.warning("Account lockout mechanism triggered")
 
     # Enhanced Deployment Issues  
+    def _configuration_error(self):
+        service = 'order-service'
+        incident_id = self.save_incident_metadata('configuration_error', service, 'high',
+                                                 {'config_key': 'DB_POOL_SIZE', 'deployed_value': '0', 'expected_value': '20'})
+        logger.error(f"INCIDENT_ID:{incident_id} - CONFIGURATION ERROR")
+        logger.error("Invalid configuration: DB_POOL_SIZE=0 (expected: 20)")
+        logger.error("ValueError: connection pool size must be positive")
+        logger.error("Configuration drift between staging and production")
+        logger.critical("Service failing to start after deployment")
+        self.services[service]['status'] = 'critical'
+
     def _deployment_rollback_failure(self):
         service = 'product-service'
         incident_id = self.save_incident_metadata('deployment_rollback_failure', service, 'critical',
@@ -500,80 +598,24 @@ class EcommercePlatform:
                 })
         return affected
 
-    def generate_access_logs(self):
-        """Generate realistic access log entries with error patterns"""
-        # Create separate access logger
-        access_logger = logging.getLogger('access')
-        access_logger.setLevel(logging.INFO)
-        
-        # Remove any existing handlers to avoid duplicates
-        access_logger.handlers.clear()
-        
-        # Create access log handler
-        access_handler = logging.FileHandler(access_log_file)
-        access_handler.setFormatter(logging.Formatter('%(message)s'))
-        access_logger.addHandler(access_handler)
-        access_logger.propagate = False  # Prevent propagation to parent logger
-        
-        # Enhanced endpoints with more realistic patterns
-        endpoints = [
-            ('/api/v1/users/profile', 'GET', 8001),
-            ('/api/v1/users/register', 'POST', 8001),
-            ('/api/v1/users/login', 'POST', 8001),
-            ('/api/v2/products/search', 'GET', 8002),
-            ('/api/v2/products/categories', 'GET', 8002),
-            ('/api/v1/orders/create', 'POST', 8003),
-            ('/api/v1/orders/status/{id}', 'GET', 8003),
-            ('/api/v3/payments/process', 'POST', 8004),
-            ('/api/v1/inventory/check', 'GET', 8005),
-            ('/api/v1/notifications/send', 'POST', 8006),
-            ('/health', 'GET', random.choice([8001, 8002, 8003, 8004, 8005, 8006])),
-            ('/metrics', 'GET', random.choice([8001, 8002, 8003, 8004, 8005, 8006]))
-        ]
-        
-        user_agents = [
-            'curl/7.68.0',
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'PostmanRuntime/7.28.4',
-            'monitoring/1.0',
-            'python-requests/2.28.2',
-            'mobile-app/2.1.0',
-            'react-frontend/1.5.2'
-        ]
-        
-        for _ in range(random.randint(15, 35)):
-            endpoint, method, port = random.choice(endpoints)
-            user_agent = random.choice(user_agents)
-            
-            # More realistic endpoint patterns
-            if '{id}' in endpoint:
-                endpoint = endpoint.replace('{id}', str(random.randint(1000, 9999)))
-            
-            # Determine status code based on service health and add incident-specific patterns
-            service_name = list(self.services.keys())[port-8001]
-            service_status = self.services[service_name]['status']
-            
-            if service_status == 'running':
-                status_code = random.choices([200, 201, 400, 404, 422], weights=[80, 5, 8, 5, 2])[0]
-            elif service_status == 'degraded':
-                status_code = random.choices([200, 500, 502, 503, 504], weights=[50, 20, 10, 15, 5])[0]
-            elif service_status == 'critical':
-                status_code = random.choices([500, 502, 503, 504], weights=[35, 20, 30, 15])[0]
-            else:  # down
-                status_code = random.choices([502, 503, 504], weights=[30, 50, 20])[0]
-            
-            response_size = random.randint(45, 2048)
-            response_time = random.uniform(0.05, 5.0)
-            timestamp = datetime.now().strftime('%d/%b/%Y:%H:%M:%S +0000')
-            
-            # Add response time to access logs for better analysis
-            access_entry = f'127.0.0.1 - - [{timestamp}] "{method} {endpoint} HTTP/1.1" {status_code} {response_size} "-" "{user_agent}" {response_time:.3f}s'
-            access_logger.info(access_entry)
+    def generate_access_logs(self, lines=None):
+        """Generate realistic access log entries with error patterns, tied to current service health"""
+        # Sampled and written in bulk (see access_log_generator.py). The lines
+        # cover the time since the previous call, as traffic that arrived meanwhile
+        lines = lines if lines is not None else random.randint(15, 35)
+        now = self.clock.time()
+        since = self.access_logs_until if self.access_logs_until is not None else now - lines / ACCESS_LOG_RATE
+        generator = AccessLogGenerator(self.services, seed=random.getrandbits(64))
+        stats = generator.write(access_log_file, lines, since, now)
+        self.access_logs_until = now
+        for key in ('lines', 'bytes', 'seconds'):
+            self.access_log_stats[key] += stats[key]
+        return stats
 
     def generate_metrics(self):
         """Generate realistic metrics for monitoring with incident correlation"""
         metrics = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': self.clock.now().isoformat(),
             'incident_id': self.current_incident['incident_id'] if self.current_incident else None,
             'services': {},
             'system': {
@@ -653,61 +695,44 @@ class EcommercePlatform:
         logger.info("=== HEALTH CHECK COMPLETED ===")
 
     def run_load_test(self):
-        """Simulate comprehensive load testing that triggers various issues"""
-        logger.info("🔄 Starting comprehensive load test simulation...")
+        """Drive buggy_app.py with open-loop load (see load_generator.py) and log what it saw"""
+        logger.info(f"🔄 Starting load test against {LOAD_TEST_URL}...")
         
-        # Simulate different types of load patterns
+        # Each pattern exercises an incident: normal traffic, an order spike
+        # racing the inventory check, and heavy jobs saturating the workers
         load_patterns = [
-            {'name': 'normal_load', 'requests': 10, 'workers': 3},
-            {'name': 'spike_load', 'requests': 25, 'workers': 8},
-            {'name': 'sustained_high_load', 'requests': 50, 'workers': 12}
+            {'name': 'normal_load', 'mix': 'browse', 'rps': 20, 'duration': 5, 'concurrency': 8},
+            {'name': 'spike_load', 'mix': 'contention', 'rps': 60, 'duration': 5, 'concurrency': 32},
+            {'name': 'sustained_high_load', 'mix': 'saturation', 'rps': 40, 'duration': 10, 'concurrency': 32}
         ]
         
         pattern = random.choice(load_patterns)
-        logger.info(f"Load pattern: {pattern['name']} - {pattern['requests']} requests, {pattern['workers']} workers")
-        
-        # Simulate concurrent requests
-        with ThreadPoolExecutor(max_workers=pattern['workers']) as executor:
-            futures = []
-            for i in range(pattern['requests']):
-                future = executor.submit(self._simulate_request, f"load_test_req_{i}", pattern['name'])
-                futures.append(future)
-            
-            # Wait for completion and potentially trigger errors
-            success_count = 0
-            error_count = 0
-            for future in futures:
-                try:
-                    future.result(timeout=5)
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Load test request failed: {str(e)}")
-                    error_count += 1
-        
-        logger.info(f"Load test completed - Success: {success_count}, Errors: {error_count}")
-
-    def _simulate_request(self, request_id, load_pattern):
-        """Simulate individual service requests with realistic patterns"""
-        # Random delay to simulate processing
-        base_delay = 0.1 if load_pattern == 'normal_load' else 0.5
-        time.sleep(random.uniform(base_delay, base_delay * 3))
-        
-        # Adjust failure rate based on load pattern and service status
-        failure_rate = 0.1 if load_pattern == 'normal_load' else 0.3
-        
-        # Higher failure rate if services are degraded
-        degraded_services = [s for s, c in self.services.items() if c['status'] != 'running']
-        if degraded_services:
-            failure_rate += 0.2
-        
-        if random.random() < failure_rate:
-            service = random.choice(list(self.services.keys()))
-            error_types = ['connection_timeout', 'service_unavailable', 'internal_error', 'rate_limit_exceeded']
-            error = random.choice(error_types)
-            logger.error(f"Request {request_id} failed on {service}: {error}")
-            raise Exception(f"Service {service} error: {error}")
-        
-        logger.info(f"Request {request_id} completed successfully")
+        logger.info(f"Load pattern: {pattern['name']} - {pattern['mix']} mix at {pattern['rps']} rps "
+                    f"for {pattern['duration']}s, {pattern['concurrency']} client threads")
+        
+        generator = LoadGenerator(LOAD_TEST_URL, pattern['mix'], pattern['rps'], pattern['duration'],
+                                  pattern['concurrency'])
+        report = generator.run()
+        # The load test ran in real time; move a virtual clock past it
+        self.clock.advance(report['duration_s'])
+        
+        for endpoint, stats in report['endpoints'].items():
+            latency = stats['latency']
+            summary = (f"Load test {endpoint}: {stats['requests']} requests, statuses {stats['statuses']}, "
+                       f"p50 {latency['p50_us'] / 1000:.1f} ms, p99 {latency['p99_us'] / 1000:.1f} ms")
+            if stats['errors']:
+                logger.error(f"{summary}, client errors {stats['errors']}")
+            elif stats['error_rate'] > 0:
+                logger.error(f"{summary}, error rate {stats['error_rate']:.1%}")
+            else:
+                logger.info(summary)
+        
+        overall = report['overall']
+        logger.info(f"LOAD_TEST: {json.dumps(report, indent=2)}")
+        logger.info(f"Load test completed - {overall['requests']} requests at {report['sent_rps']} rps, "
+                    f"error rate {overall['error_rate']:.1%}, "
+                    f"p99 {overall['latency']['p99_us'] / 1000:.1f} ms")
+        return report
 
     def simulate_recovery_scenario(self):
         """Simulate service recovery for realistic incident lifecycle"""
@@ -810,66 +835,106 @@ def create_rag_knowledge_structure():
     
     logger.info("📚 RAG knowledge base structure created")
 
-def main():
-    """Main execution function that generates comprehensive scenarios for postmortem analysis"""
-    print("🚀 Starting Enhanced E-commerce Platform Simulation")
-    print("=" * 70)
+def run_simulation(platform, incidents=None, incident_gap=2.0, load_test=True, access_log_lines=None):
+    """The simulated timeline: baseline, load tests, incidents with metrics, logs and recoveries"""
+    clock = platform.clock
     
-    platform = EcommercePlatform()
+    # Create RAG knowledge base structure
+    create_rag_knowledge_structure()
     
-    try:
-        # Create RAG knowledge base structure
-        create_rag_knowledge_structure()
-        
-        # Initial health check
-        platform.health_check()
-        time.sleep(2)
-        
-        # Generate baseline metrics
-        logger.info("📊 Generating baseline metrics...")
-        platform.generate_metrics()
-        
-        # Generate initial access logs
-        logger.info("🌐 Generating access logs...")
-        platform.generate_access_logs()
-        time.sleep(2)
-        
-        # Simulate normal operations
-        logger.info("✅ Platform running normally...")
-        time.sleep(3)
-        
-        # Multiple load test cycles
+    # Initial health check
+    platform.health_check()
+    clock.sleep(2)
+    
+    # Generate baseline metrics
+    logger.info("📊 Generating baseline metrics...")
+    platform.generate_metrics()
+    
+    # Generate initial access logs
+    logger.info("🌐 Generating access logs...")
+    platform.generate_access_logs(access_log_lines)
+    clock.sleep(2)
+    
+    # Simulate normal operations
+    logger.info("✅ Platform running normally...")
+    clock.sleep(3)
+    
+    # Multiple load test cycles
+    if load_test:
         for cycle in range(2):
             logger.info(f"🔄 Load test cycle {cycle + 1}")
             platform.run_load_test()
-            time.sleep(2)
+            clock.sleep(2)
+    
+    # Trigger multiple incidents with recovery scenarios
+    logger.info("🎯 Simulating comprehensive incident scenarios...")
+    for i in range(incidents if incidents is not None else random.randint(3, 6)):
+        platform.simulate_incident()
+        clock.sleep(random.uniform(0.5, 1.5) * incident_gap)
         
-        # Trigger multiple incidents with recovery scenarios
-        logger.info("🎯 Simulating comprehensive incident scenarios...")
-        for i in range(random.randint(3, 6)):
-            platform.simulate_incident()
-            time.sleep(random.uniform(1, 3))
-            
-            # Generate metrics during incident
-            platform.generate_metrics()
-            platform.generate_access_logs()
-            
-            # Generate business impact data
-            platform.generate_business_impact_data()
-            
-            # Sometimes simulate recovery
-            if random.random() < 0.4:  # 40% chance of recovery
-                time.sleep(2)
-                platform.simulate_recovery_scenario()
-                platform.generate_metrics()
+        # Generate metrics during incident
+        platform.generate_metrics()
+        platform.generate_access_logs(access_log_lines)
         
-        # Final health check and metrics
-        time.sleep(2)
-        platform.health_check()
-        final_metrics = platform.generate_metrics()
+        # Generate business impact data
+        platform.generate_business_impact_data()
+        
+        # Sometimes simulate recovery
+        if random.random() < 0.4:  # 40% chance of recovery
+            clock.sleep(incident_gap)
+            platform.simulate_recovery_scenario()
+            platform.generate_metrics()
+    
+    # Final health check and metrics
+    clock.sleep(2)
+    platform.health_check()
+    return platform.generate_metrics()
+
+def main():
+    """Main execution function that generates comprehensive scenarios for postmortem analysis"""
+    parser = argparse.ArgumentParser(description="Enhanced E-commerce Platform Runner")
+    parser.add_argument('--virtual-clock', action='store_true',
+                        help='simulate time instead of sleeping: the whole timeline runs in moments')
+    parser.add_argument('--start', type=datetime.fromisoformat,
+                        help='simulated start time (ISO 8601) for --virtual-clock; default now')
+    parser.add_argument('--incidents', type=int, help='number of incidents (default 3-6)')
+    parser.add_argument('--incident-gap', type=float, default=2.0,
+                        help='mean seconds between incidents, e.g. 1800 for a long virtual timeline')
+    parser.add_argument('--load-test', action=argparse.BooleanOptionalAction,
+                        help=f'run live load tests against {LOAD_TEST_URL} (default: on, off with --virtual-clock)')
+    parser.add_argument('--access-log-lines', type=int,
+                        help='access log lines per batch, e.g. 1000000 for a bulk corpus (default 15-35)')
+    parser.add_argument('--seed', type=int, help='random seed for a reproducible timeline')
+    args = parser.parse_args()
+    
+    if args.seed is not None:
+        random.seed(args.seed)
+    if args.virtual_clock:
+        clock = VirtualClock(args.start)
+        use_for_logging(clock)
+    else:
+        clock = SystemClock()
+    load_test = args.load_test if args.load_test is not None else not args.virtual_clock
+    
+    print("🚀 Starting Enhanced E-commerce Platform Simulation")
+    print("=" * 70)
+    
+    platform = EcommercePlatform(clock)
+    started = time.perf_counter()
+    
+    try:
+        run_simulation(platform, args.incidents, args.incident_gap, load_test, args.access_log_lines)
+        log_writer.flush()
         
         print("\n" + "=" * 70)
         print("🏁 Enhanced simulation completed!")
+        if args.virtual_clock:
+            print(f"⏱️  {timedelta(seconds=round(clock.elapsed))} of simulated time "
+                  f"in {time.perf_counter() - started:.2f}s")
+        access = platform.access_log_stats
+        if access['seconds']:
+            print(f"🌐 {access['lines']:,} access log lines ({access['bytes'] / 2**20:.1f} MiB) "
+                  f"at {access['lines'] / access['seconds']:,.0f} lines/s")
         print("📝 Generated comprehensive incident data:")
         print("   - Application logs with structured errors")
         print("   - Access logs with realistic traffic patterns") 
@@ -883,11 +948,13 @@ def main():
         
     except KeyboardInterrupt:
         logger.info("🛑 Platform simulation interrupted by user")
+        log_writer.flush()
         print("\nSimulation stopped by user")
     except Exception as e:
         logger.critical(f"💥 FATAL ERROR: {str(e)}")
+        log_writer.flush()
         print(f"\nFatal error occurred: {e}")
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Service and Error Mappings Overlay
+
+Domain knowledge that cannot be read from the AST (which service owns a
+function, which errors it is known to cause) lives in graph_mappings.json:
+
+    {
+      "services":  {"order-service": ["call_payment_service_from_order_service"]},
+      "errors":    {"sql_injection_attempt": ["user_login"],
+                    "version_compatibility_issue": {"call_payment_service_from_order_service": 0.8}},
+      "inference": {"url_prefix": {"/api/v1/orders": "order-service"},
+                    "module":     {"payment_client": "payment-service"}}
+    }
+
+Error entries are either a list of functions (weight 1.0) or a dict of
+function -> weight. Inference rules assign a service to every handler whose
+route starts with a URL prefix (longest prefix wins) and to every function
+defined in a module; explicit `services` entries take precedence.
+
+The mappings are an overlay: applying them first strips everything a previous
+overlay added (IMPLEMENTS edges, and the 'manual' share of CAN_CAUSE edges,
+which may also hold static-analysis evidence), so a saved graph can be
+re-mapped in milliseconds without re-parsing any source:
+
+    python build_graph.py --mappings-only
+"""
+import hashlib
+import json
+import os
+
+import networkx as nx
+
+DEFAULT_MAPPINGS_PATH = "graph_mappings.json"
+MANUAL_SOURCE = 'manual'
+INFERRED_SOURCE = 'inferred'
+
+
+def load_mappings(path: str = DEFAULT_MAPPINGS_PATH) -> dict:
+    """Reads and validates a mappings file."""
+    with open(path, 'r') as f:
+        mappings = json.load(f)
+    unknown = set(mappings) - {'services', 'errors', 'inference'}
+    if unknown:
+        raise ValueError(f"Unknown mapping sections in {path}: {', '.join(sorted(unknown))}")
+    for error, funcs in mappings.get('errors', {}).items():
+        if not isinstance(funcs, (list, dict)):
+            raise ValueError(f"Error mapping for '{error}' must be a list or a dict of weights")
+    unknown = set(mappings.get('inference', {})) - {'url_prefix', 'module'}
+    if unknown:
+        raise ValueError(f"Unknown inference rules in {path}: {', '.join(sorted(unknown))}")
+    return mappings
+
+
+def mappings_digest(mappings: dict) -> str:
+    return hashlib.sha1(json.dumps(mappings, sort_keys=True).encode()).hexdigest()
+
+
+def add_can_cause(graph, func, error, weight, source, evidence=None):
+    """
+    Adds or strengthens a Function -CAN_CAUSE-> ErrorType edge. Each source
+    keeps its own weight (the edge weight is the highest of them) and its
+    evidence entries are tagged with the source, so one source can later be
+    removed without disturbing the others. Lists are stored as JSON since
+    GraphML attributes are scalars.
+    """
+    if not graph.has_node(func):
+        return
+    if not graph.has_node(error):
+        graph.add_node(error, type='ErrorType')
+    if not graph.has_edge(func, error):
+        graph.add_edge(func, error, type='CAN_CAUSE', weight=weight, source=source,
+                       weights='{}', evidence='[]')
+    edge = graph[func][error]
+    weights = json.loads(edge.get('weights', '{}'))
+    weights[source] = max(weights.get(source, 0.0), weight)
+    edge['weights'] = json.dumps(weights, sort_keys=True)
+    edge['weight'] = max(weights.values())
+    edge['source'] = ','.join(sorted(weights))
+    tagged = [{**item, 'source': source} for item in evidence or []]
+    edge['evidence'] = json.dumps(json.loads(edge.get('evidence', '[]')) + tagged)
+
+
+def remove_source(graph, source):
+    """Removes everything `source` contributed to CAN_CAUSE and IMPLEMENTS edges."""
+    for func, error, data in list(graph.edges(data=True)):
+        if data.get('type') == 'IMPLEMENTS' and data.get('source', MANUAL_SOURCE) == source:
+            graph.remove_edge(func, error)
+        elif data.get('type') == 'CAN_CAUSE':
+            weights = json.loads(data.get('weights', '{}'))
+            if source not in weights:
+                continue
+            del weights[source]
+            if not weights:
+                graph.remove_edge(func, error)
+                continue
+            data['weights'] = json.dumps(weights, sort_keys=True)
+            data['weight'] = max(weights.values())
+            data['source'] = ','.join(sorted(weights))
+            data['evidence'] = json.dumps([item for item in json.loads(data.get('evidence', '[]'))
+                                           if item.get('source') != source])
+    orphans = [node for node, node_type in graph.nodes(data='type')
+               if node_type in ('Service', 'ErrorType') and graph.degree(node) == 0]
+    graph.remove_nodes_from(orphans)
+
+
+def infer_services(graph, rules: dict) -> dict:
+    """Returns {function: (service, reason)} from the URL-prefix and module rules."""
+    inferred = {}
+    prefixes = sorted(rules.get('url_prefix', {}).items(), key=lambda item: -len(item[0]))
+    for node, data in graph.nodes(data=True):
+        if data.get('type') != 'Endpoint':
+            continue
+        service = next((svc for prefix, svc in prefixes if data['path'].startswith(prefix)), None)
+        if service is None:
+            continue
+        for handler in graph.successors(node):
+            if graph[node][handler].get('type') == 'ROUTES_TO':
+                inferred.setdefault(handler, (service, f"route {node}"))
+
+    modules = rules.get('module', {})
+    if modules:
+        for node, data in graph.nodes(data=True):
+            if data.get('type') != 'Function' or 'file' not in data:
+                continue
+            module = os.path.splitext(os.path.basename(data['file']))[0]
+            if module in modules:
+                inferred.setdefault(node, (modules[module], f"module {module}"))
+    return inferred
+
+
+def apply_mappings(graph, mappings: dict) -> dict:
+    """
+    Replaces the previous overlay on `graph` with `mappings`. Returns counts of
+    what was applied.
+    """
+    remove_source(graph, MANUAL_SOURCE)
+    remove_source(graph, INFERRED_SOURCE)
+
+    def implement(service, func, source, reason=None):
+        if not graph.has_node(func):
+            return False
+        graph.add_node(service, type='Service')
+        graph.add_edge(service, func, type='IMPLEMENTS', source=source, **({'reason': reason} if reason else {}))
+        return True
+
+    explicit, counts = set(), {'services': 0, 'inferred': 0, 'errors': 0}
+    for service, funcs in mappings.get('services', {}).items():
+        for func in funcs:
+            if implement(service, func, MANUAL_SOURCE):
+                explicit.add(func)
+                counts['services'] += 1
+    for func, (service, reason) in infer_services(graph, mappings.get('inference', {})).items():
+        if func not in explicit and implement(service, func, INFERRED_SOURCE, reason):
+            counts['inferred'] += 1
+
+    for error, funcs in mappings.get('errors', {}).items():
+        weighted = funcs if isinstance(funcs, dict) else dict.fromkeys(funcs, 1.0)
+        for func, weight in weighted.items():
+            if graph.has_node(func):
+                add_can_cause(graph, func, error, float(weight), MANUAL_SOURCE)
+                counts['errors'] += 1
+
+    graph.graph['mappings_digest'] = mappings_digest(mappings)
+    return counts
+
+
+def overlay_mappings(graph_path: str, mappings_path: str = DEFAULT_MAPPINGS_PATH) -> dict:
+    """Re-applies a mappings file to a saved graph in place. Returns the counts."""
+    mappings = load_mappings(mappings_path)
+    graph = nx.read_graphml(graph_path)
+    if graph.graph.get('mappings_digest') == mappings_digest(mappings):
+        return {'unchanged': True}
+    counts = apply_mappings(graph, mappings)
+    nx.write_graphml(graph, graph_path)
+    return counts
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Static Performance-Hazard Detector
+
+Derives CAN_CAUSE edges from code patterns instead of a hand-curated mapping.
+build_graph.py's CodeVisitor records raw facts while walking the AST (external
+calls with the locks held at the call site, loops, reads of module-level
+state and environment variables); this module turns them into findings:
+
+- blocking_call_in_handler: sleeps, synchronous HTTP/socket/SMTP/subprocess
+  calls or file I/O in a request handler, or in a function a handler reaches.
+- blocking_call_under_lock: the same calls made while holding a lock.
+- unbounded_loop_over_shared_state: loops over module-level mutable state
+  (cost grows with the data) and `while True` loops with no exit.
+- missing_env_var_read: environment variables read without a default, either
+  directly, through a module-level `X = os.environ.get('X')`, or through a
+  module-level object built from one (`CLIENT = Client(X)`).
+
+Each finding carries its evidence line, and HAZARD_RULES maps it to weighted
+ErrorTypes.
+"""
+
+# Hazard -> [(ErrorType, base weight)]
+HAZARD_RULES = {
+    'blocking_call_in_handler': [('thread_pool_exhaustion', 0.8)],
+    'blocking_call_under_lock': [('thread_pool_exhaustion', 0.7), ('database_slow_queries', 0.6)],
+    'unbounded_loop_over_shared_state': [('database_slow_queries', 0.5), ('high_cpu_usage', 0.5)],
+    'missing_env_var_read': [('environment_variable_missing', 0.9)],
+}
+
+# Exact external calls and module prefixes that block the calling thread.
+BLOCKING_CALLS = {
+    'time.sleep': 'blocking sleep',
+    'open': 'file I/O',
+    'socket.create_connection': 'socket I/O',
+    'urllib.request.urlopen': 'synchronous HTTP call',
+}
+BLOCKING_PREFIXES = (
+    ('requests.', 'synchronous HTTP call'),
+    ('http.client.', 'synchronous HTTP call'),
+    ('smtplib.', 'SMTP I/O'),
+    ('subprocess.', 'subprocess call'),
+    ('socket.', 'socket I/O'),
+)
+
+# Calls reached from a handler through other functions are weighted down.
+INDIRECT_FACTOR = 0.7
+
+
+def classify_blocking(name: str):
+    """Returns a description if the dotted call name blocks, else None."""
+    if name in BLOCKING_CALLS:
+        return BLOCKING_CALLS[name]
+    for prefix, description in BLOCKING_PREFIXES:
+        if name.startswith(prefix):
+            return description
+    return None
+
+
+def _duration_factor(seconds):
+    """Longer constant sleeps are more likely to matter: 0.1s -> 0.55, >=1s -> 1.0."""
+    if seconds is None:
+        return 1.0
+    return min(1.0, 0.5 + seconds / 2)
+
+
+def detect_hazards(visitor, handlers: set, reachability) -> list[dict]:
+    """
+    Returns findings as dicts: function, hazard, line, detail and factor (a
+    0..1 multiplier applied to the rule weights).
+    """
+    findings = []
+
+    for call in visitor.external_calls:
+        description = classify_blocking(call['name'])
+        if description is None:
+            continue
+        factor = _duration_factor(call['seconds'])
+        detail = f"{call['name']}({call['seconds']})" if call['seconds'] is not None else call['name']
+        if call['held']:
+            findings.append({
+                'function': call['function'], 'hazard': 'blocking_call_under_lock', 'line': call['line'],
+                'detail': f"{description} {detail} while holding {', '.join(call['held'])}",
+                'factor': factor,
+            })
+        if call['function'] in handlers:
+            findings.append({
+                'function': call['function'], 'hazard': 'blocking_call_in_handler', 'line': call['line'],
+                'detail': f"{description} {detail} in request handler", 'factor': factor,
+            })
+        else:
+            callers = sorted(h for h in handlers if reachability.can_reach(h, call['function']))
+            if callers:
+                findings.append({
+                    'function': call['function'], 'hazard': 'blocking_call_in_handler', 'line': call['line'],
+                    'detail': f"{description} {detail} reached from handler(s) {', '.join(callers)}",
+                    'factor': factor * INDIRECT_FACTOR,
+                })
+
+    for loop in visitor.loops:
+        if loop['shared_state']:
+            held = f" while holding {', '.join(loop['held'])}" if loop['held'] else ""
+            findings.append({
+                'function': loop['function'], 'hazard': 'unbounded_loop_over_shared_state',
+                'line': loop['line'], 'detail': f"loop over shared {loop['shared_state']}{held}",
+                'factor': 1.0 if loop['held'] else 0.8,
+            })
+        elif loop['unbounded']:
+            findings.append({
+                'function': loop['function'], 'hazard': 'unbounded_loop_over_shared_state',
+                'line': loop['line'], 'detail': "`while True` loop with no exit", 'factor': 0.8,
+            })
+
+    for read in visitor.env_reads:
+        if not read['has_default']:
+            findings.append({
+                'function': read['function'], 'hazard': 'missing_env_var_read', 'line': read['line'],
+                'detail': f"reads environment variable {read['var']} with no default", 'factor': 1.0,
+            })
+    env_globals = _env_globals(visitor.symbols.globals)
+    seen = set()
+    for read in visitor.global_reads:
+        source = env_globals.get(read['name'])
+        if source and (read['function'], read['name']) not in seen:
+            seen.add((read['function'], read['name']))
+            info = visitor.symbols.globals[source]
+            built = f", built from {source}" if source != read['name'] else ""
+            findings.append({
+                'function': read['function'], 'hazard': 'missing_env_var_read', 'line': read['line'],
+                'detail': (f"uses {read['name']}{built}, read from environment variable {info['env_var']} "
+                           f"with no default (line {info['lineno']})"),
+                'factor': 1.0,
+            })
+    return findings
+
+
+def _env_globals(module_globals: dict) -> dict:
+    """
+    Maps each module-level variable that depends on an environment variable read
+    without a default, directly or through the variables its value is built
+    from, to the variable holding the read.
+    """
+    sources = {name: name for name, info in module_globals.items() if info['env_var'] and not info['env_default']}
+    changed = True
+    while changed:
+        changed = False
+        for name, info in module_globals.items():
+            if name in sources:
+                continue
+            source = next((sources[used] for used in info.get('uses', ()) if used in sources), None)
+            if source:
+                sources[name] = source
+                changed = True
+    return sources
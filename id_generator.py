@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Order ID Generator
+
+Snowflake-style 63-bit IDs for buggy_app.py's orders, replacing
+`ord_<unix seconds>`, which gave every order created in the same second the
+same ID:
+
+    | 41 bits: ms since EPOCH_MS | 10 bits: worker id | 12 bits: sequence |
+
+- IDs are unique per worker and strictly increasing per thread. Because the
+  timestamp comes first they sort roughly by creation time across workers.
+- The fast path takes no lock. The current millisecond's block is one tuple
+  (end time in ns, prefix, counter), read atomically, and `next()` on an
+  itertools.count is atomic under the GIL. A lock is taken only to open the
+  next block, at most once per millisecond or per 4096 IDs. When a block's
+  sequence runs out, or the clock steps back, the next block borrows the
+  following millisecond, so IDs never repeat or go backwards.
+- Worker ids are leased per host. Each process holds an flock on one of
+  MAX_WORKERS files in a lease directory, so concurrent worker processes
+  never share an id. The lease ends when the process exits. A forked child
+  leases its own id and starts a fresh block. Without fcntl (Windows) the id
+  is taken from the pid, which is unique only modulo MAX_WORKERS.
+"""
+import itertools
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+EPOCH_MS = 1_735_689_600_000    # 2025-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKERS = 1 << WORKER_BITS
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+DEFAULT_LEASE_DIR = os.path.join(tempfile.gettempdir(), "order-id-workers")
+
+
+# Every live generator, re-leased in forked children. Weak, so the fork hook
+# does not keep generators alive.
+_GENERATORS = weakref.WeakSet()
+
+
+def _restart_after_fork():
+    for generator in list(_GENERATORS):
+        generator._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+class WorkerIdsExhausted(RuntimeError):
+    """Raised when every worker id in the lease directory is held by a live process."""
+
+
+class IdGenerator:
+    """Lock-free, fork-safe snowflake ID generator."""
+    def __init__(self, worker_id: int = None, epoch_ms: int = EPOCH_MS, lease_dir: str = DEFAULT_LEASE_DIR):
+        if worker_id is not None and not 0 <= worker_id < MAX_WORKERS:
+            raise ValueError(f"worker_id must be in [0, {MAX_WORKERS})")
+        self.epoch_ms = epoch_ms
+        self.lease_dir = lease_dir
+        self._fixed_worker_id = worker_id
+        self._lease = None          # open lease file descriptor, if any
+        self._lock = threading.Lock()
+        self.blocks = 0             # blocks opened (slow-path entries that advanced)
+        self.borrowed = 0           # blocks opened ahead of the clock
+        self._start()
+        _GENERATORS.add(self)
+
+    def _start(self):
+        self.worker_id = self._fixed_worker_id if self._fixed_worker_id is not None else self._lease_worker_id()
+        self._timestamp = -1        # ms since epoch_ms of the current block
+        self._block = (0, 0, itertools.count(MAX_SEQUENCE + 1))   # exhausted: the first call opens a block
+
+    def _after_fork(self):
+        self._lock = threading.Lock()   # may have been held by another thread at fork time
+        if self._lease is not None:
+            os.close(self._lease)       # the parent still holds the flock through its own descriptor
+            self._lease = None
+        if self._fixed_worker_id is not None:
+            # An explicit id cannot be shared with the parent safely; fall back to leasing.
+            self._fixed_worker_id = None
+        self._start()
+
+    def _lease_worker_id(self) -> int:
+        if fcntl is None:
+            return os.getpid() % MAX_WORKERS
+        os.makedirs(self.lease_dir, exist_ok=True)
+        start = os.getpid() % MAX_WORKERS
+        for offset in range(MAX_WORKERS):
+            worker_id = (start + offset) % MAX_WORKERS
+            fd = os.open(os.path.join(self.lease_dir, f"{worker_id:04d}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                continue
+            self._lease = fd
+            return worker_id
+        raise WorkerIdsExhausted(f"All {MAX_WORKERS} worker ids in {self.lease_dir} are leased")
+
+    def next_id(self) -> int:
+        block = self._block
+        sequence = next(block[2])
+        if sequence <= MAX_SEQUENCE and time.time_ns() < block[0]:
+            return block[1] | sequence
+        return self._next_block_id(block)
+
+    def _next_block_id(self, seen_block):
+        with self._lock:
+            if self._block is seen_block:
+                now = time.time_ns() // 1_000_000 - self.epoch_ms
+                if now <= self._timestamp:
+                    now = self._timestamp + 1
+                    self.borrowed += 1
+                self._timestamp = now
+                # Once the clock has passed this millisecond, the next call opens a new block.
+                end_ns = (now + self.epoch_ms + 1) * 1_000_000
+                self._block = (end_ns, (now << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS),
+                               itertools.count())
+                self.blocks += 1
+        return self.next_id()
+
+    def parse(self, id_: int) -> dict:
+        """Splits an ID into its creation time (unix ms), worker id and sequence."""
+        return {
+            'timestamp_ms': (id_ >> (WORKER_BITS + SEQUENCE_BITS)) + self.epoch_ms,
+            'worker_id': (id_ >> SEQUENCE_BITS) & (MAX_WORKERS - 1),
+            'sequence': id_ & MAX_SEQUENCE,
+        }
+
+    def stats(self) -> dict:
+        return {'worker_id': self.worker_id, 'pid': os.getpid(), 'blocks': self.blocks,
+                'borrowed_ms': self.borrowed}
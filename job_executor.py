@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Background Job Executor
+
+Runs heavy work (buggy_app.py's /jobs/heavy-computation) in a bounded pool of
+worker processes, so request threads only enqueue and return a job ID:
+
+- at most `workers` jobs run at once and at most `max_queue` more wait; a
+  submit beyond that raises JobQueueFull immediately instead of queueing
+  without bound (buggy_app.py answers 429 with Retry-After);
+- every job has a record (queued / running / succeeded / failed, timestamps,
+  result or error) that can be polled by ID. Finished records are kept up to
+  `max_finished`, oldest dropped first;
+- worker processes come from a forkserver (spawn where unavailable), not a
+  fork of the multi-threaded server, so they never inherit a lock held by
+  another thread at fork time. The pool starts on first use and is rebuilt if
+  a worker dies.
+
+Job functions and arguments must be picklable: module-level functions only,
+in a module without import-time side effects (see jobs.py), since every
+worker process imports it.
+"""
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+DEFAULT_MAX_QUEUE = 16
+DEFAULT_MAX_FINISHED = 1000
+
+
+class JobQueueFull(RuntimeError):
+    """Raised by JobExecutor.submit when every worker is busy and the queue is at its limit."""
+
+
+def _run(fn, args):
+    """Runs in the worker process; returns the start and finish wall times with the result."""
+    started = time.time()
+    result = fn(*args)
+    return started, time.time(), result
+
+
+class JobExecutor:
+    """A bounded process pool with pollable job records."""
+    def __init__(self, workers: int = None, max_queue: int = DEFAULT_MAX_QUEUE,
+                 max_finished: int = DEFAULT_MAX_FINISHED, start_method: str = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_finished = max_finished
+        methods = multiprocessing.get_all_start_methods()
+        self.start_method = start_method or ('forkserver' if 'forkserver' in methods else 'spawn')
+        self._pool = None
+        self._jobs = {}              # job id -> record
+        self._finished = deque()     # ids of finished jobs, oldest first
+        self._pending = 0            # submitted and not finished
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.pool_restarts = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(self.start_method))
+        return self._pool
+
+    def submit(self, kind: str, fn, *args) -> dict:
+        """Queues fn(*args) and returns the new job's record. Raises JobQueueFull when at capacity."""
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise JobQueueFull(f"{self._pending} jobs pending (limit {self.workers + self.max_queue})")
+            job_id = uuid.uuid4().hex
+            job = {'id': job_id, 'kind': kind, 'status': 'queued', 'submitted_at': time.time(),
+                   'started_at': None, 'finished_at': None, 'result': None, 'error': None, 'future': None}
+            try:
+                future = self._get_pool().submit(_run, fn, args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); the old pool is unusable.
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.pool_restarts += 1
+                future = self._get_pool().submit(_run, fn, args)
+            job['future'] = future
+            self._jobs[job_id] = job
+            self._pending += 1
+            self.submitted += 1
+        future.add_done_callback(lambda f: self._finish(job, f))
+        return self._view(job)
+
+    def _finish(self, job, future):
+        error = None
+        try:
+            started, finished, result = future.result()
+        except BaseException as e:
+            started, finished, result = None, time.time(), None
+            error = ''.join(traceback.format_exception_only(type(e), e)).strip()
+        with self._lock:
+            job.update(started_at=started, finished_at=finished, result=result, error=error,
+                       status='failed' if error else 'succeeded', future=None)
+            self._pending -= 1
+            if error:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+            self._finished.append(job['id'])
+            while len(self._finished) > self.max_finished:
+                self._jobs.pop(self._finished.popleft(), None)
+
+    @staticmethod
+    def _view(job) -> dict:
+        view = {key: value for key, value in job.items() if key != 'future'}
+        future = job['future']
+        if future is not None and future.running():
+            view['status'] = 'running'   # handed to a worker (its call queue holds a few extra)
+        return view
+
+    def get(self, job_id: str):
+        """Returns the job's record, or None if unknown or already dropped."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'pending': self._pending,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'pool_restarts': self.pool_restarts,
+                'start_method': self.start_method,
+            }
+
+    def shutdown(self, wait: bool = False):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
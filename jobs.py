@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Background Jobs
+
+Job functions that buggy_app.py runs through JOB_EXECUTOR (see
+job_executor.py). They live here, not in buggy_app.py, because worker
+processes import a job's module to unpickle it: this module must stay free
+of import-time side effects (no store, index, clients or logging setup).
+"""
+import time
+
+
+def heavy_computation(seconds):
+    """The heavy job itself. Runs in a JOB_EXECUTOR worker process, never on a request thread."""
+    time.sleep(seconds) # Simulates a very long operation
+    return {"message": "Job complete", "seconds": seconds}
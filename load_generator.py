@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Open-Loop Load Generator
+
+Drives buggy_app.py over HTTP at a target request rate:
+
+- open-loop arrivals. Each request has an intended send time from a Poisson
+  (or constant-rate) schedule fixed in advance, and the schedule never waits
+  for responses. A stalled server therefore keeps receiving requests, the way
+  it does from real users, instead of being given a break by a closed loop of
+  clients that are all stuck waiting;
+- coordinated-omission correction. `latency` is measured from the intended
+  send time, so time a request spent waiting for a free client thread (because
+  earlier requests were stuck) counts against the server. `service_time` is
+  measured from the actual send, which is what a closed-loop tool would report;
+- endpoint mixes (MIXES): weighted endpoints with generated parameters and
+  bodies, named after the incident they exercise;
+- one requests.Session with a keep-alive connection pool as large as the
+  number of client threads.
+
+Both histograms are request_metrics.HdrHistogram (µs, 2 significant digits),
+per endpoint and overall, with status codes and client-side errors
+(timeouts, refused connections).
+
+    python load_generator.py --url http://127.0.0.1:5000 --mix checkout --rps 50 --duration 20
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from request_metrics import HdrHistogram
+
+DEFAULT_URL = 'http://127.0.0.1:5000'
+DEFAULT_TIMEOUT = (1.0, 10.0)        # connect, read seconds
+ITEM_IDS = ('item_123', 'item_456')
+SEARCH_TERMS = ('widget', 'gadget', 'super', 'mega wid', 'gad', 'super widget', 'w')
+
+
+def _search(rng):
+    return 'GET', '/api/v2/products/search', {'params': {'q': rng.choice(SEARCH_TERMS)}}
+
+
+def _suggest(rng):
+    term = rng.choice(SEARCH_TERMS)
+    return 'GET', '/api/v2/products/suggest', {'params': {'q': term[:rng.randint(1, len(term))]}}
+
+
+def _login(rng):
+    return 'POST', '/api/v1/users/login', {'json': {'username': f"user{rng.randint(1, 10_000)}"}}
+
+
+def _create_order(rng):
+    body = {'item_id': rng.choice(ITEM_IDS), 'quantity': 1}
+    if rng.random() < 0.5:
+        body['email'] = f"user{rng.randint(1, 10_000)}@example.com"
+    return 'POST', '/api/v1/orders/create', {'json': body}
+
+
+def _inventory_update(rng):
+    return 'POST', '/background/inventory/update', {'json': {'item_id': rng.choice(ITEM_IDS)}}
+
+
+def _payment(rng):
+    return 'POST', '/api/v3/payments/process', {'json': {'order_id': f"ord_{rng.getrandbits(48)}",
+                                                         'amount': round(rng.uniform(5, 500), 2)}}
+
+
+def _notification(rng):
+    return 'POST', '/api/v1/notifications/send', {'json': {'email': f"user{rng.randint(1, 10_000)}@example.com",
+                                                           'subject': 'Load test', 'message': 'Hello'}}
+
+
+def _heavy_job(rng):
+    return 'POST', '/jobs/heavy-computation', {}
+
+
+# name -> {endpoint name: (weight, request builder)}. A builder takes a
+# random.Random and returns (method, path, keyword arguments for requests).
+MIXES = {
+    # Read-mostly traffic: search, typeahead and logins.
+    'browse': {
+        'search': (6, _search),
+        'suggest': (3, _suggest),
+        'login': (1, _login),
+    },
+    # Orders, payments and confirmation emails alongside browsing.
+    'checkout': {
+        'search': (4, _search),
+        'create_order': (3, _create_order),
+        'payment': (2, _payment),
+        'notification': (1, _notification),
+    },
+    # Orders racing the inventory consistency check on the same items: the
+    # former deadlock between create_order and process_inventory_update, and
+    # order store connection pool exhaustion (503 STORE_BUSY).
+    'contention': {
+        'create_order': (5, _create_order),
+        'inventory_update': (2, _inventory_update),
+        'search': (3, _search),
+    },
+    # Heavy jobs beyond the job queue's capacity (429 JOB_QUEUE_FULL) while
+    # ordinary requests must stay fast: worker/thread pool exhaustion.
+    'saturation': {
+        'heavy_job': (1, _heavy_job),
+        'search': (6, _search),
+        'create_order': (3, _create_order),
+    },
+}
+
+
+class _EndpointStats:
+    __slots__ = ('latency', 'service_time', 'statuses', 'errors')
+
+    def __init__(self):
+        self.latency = HdrHistogram()         # from the intended send time
+        self.service_time = HdrHistogram()    # from the actual send time
+        self.statuses = Counter()
+        self.errors = Counter()               # client-side exceptions by type
+
+    def to_dict(self, buckets=False):
+        count = sum(self.statuses.values()) + sum(self.errors.values())
+        failed = sum(n for code, n in self.statuses.items() if code >= 500) + sum(self.errors.values())
+        return {
+            'requests': count,
+            'statuses': {str(code): n for code, n in sorted(self.statuses.items())},
+            'errors': dict(self.errors),
+            'error_rate': round(failed / count, 4) if count else 0.0,
+            'latency': self.latency.to_dict(buckets),
+            'service_time': self.service_time.to_dict(buckets),
+        }
+
+
+class LoadGenerator:
+    """
+    Sends `rps` requests per second for `duration` seconds, drawn from `mix`
+    (a MIXES name or a dict in the same format), through `concurrency` client
+    threads. run() blocks until every request has finished and returns the
+    report.
+    """
+    def __init__(self, base_url: str = DEFAULT_URL, mix='browse', rps: float = 20.0, duration: float = 10.0,
+                 concurrency: int = 32, arrivals: str = 'poisson', timeout=DEFAULT_TIMEOUT, seed: int = None):
+        if arrivals not in ('poisson', 'constant'):
+            raise ValueError(f"arrivals must be 'poisson' or 'constant', not {arrivals!r}")
+        if rps <= 0 or duration <= 0:
+            raise ValueError("rps and duration must be positive")
+        self.base_url = base_url.rstrip('/')
+        self.mix_name = mix if isinstance(mix, str) else 'custom'
+        self.mix = MIXES[mix] if isinstance(mix, str) else mix
+        self.rps = rps
+        self.duration = duration
+        self.concurrency = concurrency
+        self.arrivals = arrivals
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self._names = list(self.mix)
+        self._weights = list(itertools.accumulate(weight for weight, _ in self.mix.values()))
+        self._lock = threading.Lock()
+        self._stats = {name: _EndpointStats() for name in self._names}
+        self.max_schedule_lag = 0.0     # how late the scheduler itself submitted a request
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def schedule(self):
+        """Intended send times, in seconds from the start of the run."""
+        t = 0.0
+        while True:
+            t += self.rng.expovariate(self.rps) if self.arrivals == 'poisson' else 1.0 / self.rps
+            if t >= self.duration:
+                return
+            yield t
+
+    def _send(self, name, method, path, kwargs, intended):
+        sent = time.perf_counter()
+        status = error = None
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            response.content        # read the body: a request is done when its response is
+            status = response.status_code
+        except requests.RequestException as e:
+            error = type(e).__name__
+        done = time.perf_counter()
+        with self._lock:
+            stats = self._stats[name]
+            stats.latency.record(int((done - intended) * 1e6))
+            stats.service_time.record(int((done - sent) * 1e6))
+            if error is None:
+                stats.statuses[status] += 1
+            else:
+                stats.errors[error] += 1
+
+    def run(self, buckets: bool = False) -> dict:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='load') as executor:
+            for offset in self.schedule():
+                intended = start + offset
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_schedule_lag = max(self.max_schedule_lag, -delay)
+                name = self.rng.choices(self._names, cum_weights=self._weights)[0]
+                method, path, kwargs = self.mix[name][1](self.rng)
+                executor.submit(self._send, name, method, path, kwargs, intended)
+            scheduled = time.perf_counter() - start
+        elapsed = time.perf_counter() - start
+        self.session.close()
+        return self.report(scheduled, elapsed, buckets)
+
+    def report(self, scheduled: float, elapsed: float, buckets: bool = False) -> dict:
+        with self._lock:
+            overall = _EndpointStats()
+            for stats in self._stats.values():
+                overall.latency.merge(stats.latency)
+                overall.service_time.merge(stats.service_time)
+                overall.statuses.update(stats.statuses)
+                overall.errors.update(stats.errors)
+            endpoints = {name: stats.to_dict(buckets) for name, stats in self._stats.items()
+                         if stats.latency.count}
+        total = overall.to_dict(buckets)
+        return {
+            'url': self.base_url,
+            'mix': self.mix_name,
+            'arrivals': self.arrivals,
+            'target_rps': self.rps,
+            'sent_rps': round(total['requests'] / scheduled, 2) if scheduled else 0.0,
+            'duration_s': round(elapsed, 3),
+            'concurrency': self.concurrency,
+            'max_schedule_lag_ms': round(self.max_schedule_lag * 1000, 3),
+            'overall': total,
+            'endpoints': endpoints,
+        }
+
+
+def format_report(report: dict) -> str:
+    """The report as an aligned table, latencies in ms (corrected / service time)."""
+    lines = [f"{report['mix']} mix against {report['url']}: {report['target_rps']:g} rps target, "
+             f"{report['sent_rps']:g} rps sent ({report['arrivals']}), {report['duration_s']:.1f}s, "
+             f"{report['concurrency']} client threads, scheduler lag up to {report['max_schedule_lag_ms']:.1f} ms",
+             f"{'endpoint':>18} {'requests':>9} {'err %':>6} {'p50 ms':>15} {'p99 ms':>15} {'p99.9 ms':>15}  statuses"]
+    rows = list(report['endpoints'].items()) + [('overall', report['overall'])]
+    for name, stats in rows:
+        cells = []
+        for p in ('p50_us', 'p99_us', 'p99.9_us'):
+            cells.append(f"{stats['latency'][p] / 1000:.1f}/{stats['service_time'][p] / 1000:.1f}")
+        outcomes = {**stats['statuses'], **stats['errors']}
+        lines.append(f"{name:>18} {stats['requests']:>9} {stats['error_rate'] * 100:>6.1f} "
+                     f"{cells[0]:>15} {cells[1]:>15} {cells[2]:>15}  {outcomes}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default=DEFAULT_URL)
+    parser.add_argument('--mix', default='browse', choices=sorted(MIXES))
+    parser.add_argument('--rps', type=float, default=20.0)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of arrivals')
+    parser.add_argument('--concurrency', type=int, default=32, help='client threads (and pooled connections)')
+    parser.add_argument('--arrivals', default='poisson', choices=('poisson', 'constant'))
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    generator = LoadGenerator(args.url, args.mix, args.rps, args.duration, args.concurrency, args.arrivals,
+                              seed=args.seed)
+    report = generator.run()
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
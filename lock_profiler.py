@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Lock Contention Profiler
+
+InstrumentedLock / InstrumentedRLock are drop-in replacements for
+threading.Lock / threading.RLock that record, per lock:
+
+- wait-time and hold-time histograms (log2 buckets from 1 µs),
+- acquisition, contention and timeout counts,
+- the current owner thread and how long it has held the lock,
+
+and, across locks, the order in which each thread nests them. A pair seen in
+both orders (A then B, and B then A) is reported as an order inversion: a
+deadlock waiting to happen even if it has not hung yet.
+
+The uncontended path is a non-blocking acquire, one clock read and a few
+counter updates; the registry lock is only taken when locks are nested.
+
+DeadlockMonitor checks the wait-for graph (thread -> thread owning the lock it
+waits on) in the background. A cycle is a live deadlock: it is logged once with
+the stacks of every thread involved and kept in the registry, so it shows up
+in LockRegistry.snapshot().
+
+LockManager takes several locks as one unit in a canonical global order, with
+timeouts and jittered retries, so no two code paths can nest them in opposite
+orders.
+
+buggy_app.py no longer takes application locks (its orders are SQLite
+transactions, see order_store.py), so the lock types, LockManager and
+LockStripes are library-only: for code that does guard shared state with
+locks, exercised by benchmarks/lock_manager_benchmark.py and
+benchmarks/striped_lock_benchmark.py, and recognised by build_graph.py's lock
+analysis. LatencyHistogram is used across the app's clients and stores.
+"""
+import logging
+import random
+import sys
+import threading
+import time
+import traceback
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+# Histogram buckets: 1 µs * 2**i, i.e. up to ~1.2 hours in the last bucket.
+_BUCKET_BASE = 1e-6
+_BUCKET_COUNT = 32
+MAX_DEADLOCK_REPORTS = 20
+
+
+class LatencyHistogram:
+    """A fixed log2-bucketed latency histogram. Callers serialise record()."""
+    def __init__(self):
+        self.buckets = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        index = min(max(int(seconds / _BUCKET_BASE), 1).bit_length() - 1, _BUCKET_COUNT - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the p-th percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(_BUCKET_BASE * 2 ** (index + 1), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 3),
+            'p99_ms': round(self.percentile(99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+            'buckets_ms': {f"<={_BUCKET_BASE * 2 ** (i + 1) * 1000:g}": n
+                           for i, n in enumerate(self.buckets) if n},
+        }
+
+
+class LockRegistry:
+    """Tracks every instrumented lock, which thread waits on what, and nesting order."""
+    def __init__(self):
+        self.locks = {}           # name -> InstrumentedLock
+        self.waiting = {}         # thread ident -> lock it is blocked on
+        self.held = {}            # thread ident -> names of locks held, in acquisition order
+        self.order = Counter()    # (outer, inner) -> times inner was acquired while holding outer
+        self.deadlocks = []
+        self._lock = threading.Lock()
+
+    def register(self, lock):
+        self.locks[lock.name] = lock
+
+    def _record_order(self, held, name):
+        with self._lock:
+            for outer in held:
+                if outer != name:
+                    self.order[(outer, name)] += 1
+
+    def order_inversions(self) -> list[dict]:
+        """Lock pairs acquired in both orders by some threads."""
+        with self._lock:
+            order = dict(self.order)
+        return [{'locks': [a, b], 'count': order[(a, b)], 'reverse_count': order[(b, a)]}
+                for (a, b) in sorted(order) if a < b and (b, a) in order]
+
+    def snapshot(self) -> dict:
+        now = time.perf_counter()
+        waiting = dict(self.waiting)
+        with self._lock:
+            order = sorted(self.order.items(), key=lambda item: -item[1])
+        return {
+            'locks': {name: lock.stats(now, sum(1 for l in waiting.values() if l is lock))
+                      for name, lock in sorted(self.locks.items())},
+            'acquisition_order': [{'outer': a, 'inner': b, 'count': n} for (a, b), n in order],
+            'order_inversions': self.order_inversions(),
+            'deadlocks': list(self.deadlocks),
+        }
+
+
+lock_registry = LockRegistry()
+
+
+def _thread_name(ident) -> str:
+    thread = threading._active.get(ident)
+    return thread.name if thread else str(ident)
+
+
+class InstrumentedLock:
+    """A threading.Lock that records wait/hold times, owner and nesting order."""
+    kind = 'Lock'
+    _factory = staticmethod(threading.Lock)
+
+    def __init__(self, name: str, registry: LockRegistry = lock_registry):
+        self.name = name
+        self.registry = registry
+        self._lock = self._factory()
+        self._depth = 0
+        self.owner = None          # thread ident while held
+        self.acquired_at = None
+        self.acquisitions = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.wait_times = LatencyHistogram()
+        self.hold_times = LatencyHistogram()
+        self._failures = threading.Lock()   # guards `timeouts`, updated without holding the lock
+        registry.register(self)
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        me = threading.get_ident()
+        held = self.registry.held.get(me)
+        if held and self.name not in held:
+            # Recorded before blocking, so the order that deadlocks is recorded too.
+            self.registry._record_order(held, self.name)
+        if self._lock.acquire(False):
+            waited = 0.0
+        else:
+            start = time.perf_counter()
+            if blocking:
+                self.registry.waiting[me] = self
+                try:
+                    acquired = self._lock.acquire(True, timeout)
+                finally:
+                    self.registry.waiting.pop(me, None)
+            else:
+                acquired = False
+            waited = time.perf_counter() - start
+            if not acquired:
+                with self._failures:
+                    self.timeouts += 1
+                return False
+            self.contended += 1
+        self._depth += 1
+        if self._depth == 1:
+            if held is None:
+                held = self.registry.held[me] = []
+            held.append(self.name)
+            self.owner = me
+            self.acquisitions += 1
+            self.wait_times.record(waited)
+            self.acquired_at = time.perf_counter()
+        return True
+
+    def release(self):
+        if self._depth == 1:
+            self.hold_times.record(time.perf_counter() - self.acquired_at)
+            owner = self.owner
+            held = self.registry.held.get(owner, [])
+            if self.name in held:
+                del held[len(held) - 1 - held[::-1].index(self.name)]
+            if not held:
+                self.registry.held.pop(owner, None)
+            self.owner = self.acquired_at = None
+        self._depth -= 1
+        self._lock.release()
+
+    def locked(self) -> bool:
+        return self._depth > 0
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stats(self, now: float = None, waiters: int = 0) -> dict:
+        owner, acquired_at = self.owner, self.acquired_at
+        now = now or time.perf_counter()
+        return {
+            'kind': self.kind,
+            'owner': {'thread_id': owner, 'thread': _thread_name(owner),
+                      'held_for_ms': round((now - acquired_at) * 1000, 3) if acquired_at else None}
+                     if owner else None,
+            'waiters': waiters,
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'timeouts': self.timeouts,
+            'wait': self.wait_times.to_dict(),
+            'hold': self.hold_times.to_dict(),
+        }
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.name} owner={self.owner}>"
+
+
+class InstrumentedRLock(InstrumentedLock):
+    """Reentrant variant; nested acquisitions by the owner are not re-counted."""
+    kind = 'RLock'
+    _factory = staticmethod(threading.RLock)
+
+
+class LockStripes:
+    """
+    A fixed set of instrumented locks guarding one store, split by key: a key
+    always maps to the same stripe, so work on keys in different stripes runs
+    in parallel. Stripe names (`NAME#00`, `NAME#01`, ...) sort in index order,
+    so taking several stripes, or all of them for a cross-key operation,
+    through LockManager always happens in one global order.
+    """
+    def __init__(self, name: str, count: int = 16, registry: LockRegistry = lock_registry):
+        self.name = name
+        self.locks = [InstrumentedLock(f"{name}#{i:02d}", registry) for i in range(count)]
+
+    def for_key(self, key) -> InstrumentedLock:
+        # crc32 rather than hash(): stable across processes, so stripes match in logs.
+        return self.locks[zlib.crc32(str(key).encode()) % len(self.locks)]
+
+    def all(self) -> list:
+        return list(self.locks)
+
+
+class LockAcquisitionTimeout(RuntimeError):
+    """Raised when LockManager cannot get all requested locks within its retries."""
+
+
+class LockManager:
+    """
+    Acquires several locks as one unit, always in a canonical global order (lock
+    name), so two code paths can never hold them in opposite orders. Each lock
+    is acquired with a timeout; on a timeout every lock taken so far is released
+    and the whole set is retried after an exponential backoff with full jitter.
+    Conflicts, retries and give-ups are counted in stats().
+    """
+    def __init__(self, timeout=1.0, retries=3, backoff=0.05, max_backoff=1.0):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._stats_lock = threading.Lock()
+        self.acquisitions = 0
+        self.retried = 0
+        self.failures = 0
+        self.conflicts = Counter()   # lock name -> attempts that timed out waiting for it
+        self.wait_seconds = 0.0
+
+    @staticmethod
+    def canonical_order(locks):
+        return sorted(locks, key=lambda lock: (getattr(lock, 'name', ''), id(lock)))
+
+    @contextmanager
+    def acquire_all(self, *locks):
+        ordered = self.canonical_order(set(locks))
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            taken = []
+            for lock in ordered:
+                if not lock.acquire(timeout=self.timeout):
+                    break
+                taken.append(lock)
+            if len(taken) == len(ordered):
+                break
+            for lock in reversed(taken):
+                lock.release()
+            with self._stats_lock:
+                self.conflicts[getattr(ordered[len(taken)], 'name', repr(ordered[len(taken)]))] += 1
+                if attempt == self.retries:
+                    self.failures += 1
+                else:
+                    self.retried += 1
+            if attempt == self.retries:
+                raise LockAcquisitionTimeout(
+                    f"Could not acquire {', '.join(getattr(l, 'name', repr(l)) for l in ordered)} "
+                    f"after {self.retries + 1} attempts")
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+        with self._stats_lock:
+            self.acquisitions += 1
+            self.wait_seconds += time.perf_counter() - start
+        try:
+            yield
+        finally:
+            for lock in reversed(ordered):
+                lock.release()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'acquisitions': self.acquisitions,
+                'retries': self.retried,
+                'failures': self.failures,
+                'conflicts': dict(self.conflicts),
+                'mean_wait_ms': round(self.wait_seconds / self.acquisitions * 1000, 3) if self.acquisitions else 0.0,
+            }
+
+
+def find_wait_cycles(registry: LockRegistry) -> list[list[tuple]]:
+    """
+    Returns cycles in the wait-for graph as lists of (thread ident, lock it
+    waits on). Each waiting thread has one outgoing edge (to the owner of its
+    lock), so following the chain from every thread finds every cycle.
+    """
+    waiting = dict(registry.waiting)
+    cycles, seen = [], set()
+    for start in waiting:
+        path, thread = [], start
+        while thread in waiting and thread not in [t for t, _ in path]:
+            lock = waiting[thread]
+            owner = lock.owner
+            if owner is None:
+                break
+            path.append((thread, lock))
+            thread = owner
+        threads = [t for t, _ in path]
+        if thread in threads:
+            cycle = path[threads.index(thread):]
+            key = frozenset((t, l.name) for t, l in cycle)
+            if key not in seen:
+                seen.add(key)
+                cycles.append(cycle)
+    return cycles
+
+
+class DeadlockMonitor:
+    """Background wait-for-graph checker that reports each live deadlock once."""
+    def __init__(self, registry: LockRegistry = lock_registry, interval: float = 1.0,
+                 logger: logging.Logger = None):
+        self.registry = registry
+        self.interval = interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._reported = set()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='deadlock-monitor', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def check(self) -> list[dict]:
+        """Runs one detection pass and returns reports for newly found deadlocks."""
+        reports = []
+        frames = None
+        for cycle in find_wait_cycles(self.registry):
+            key = frozenset((t, l.name) for t, l in cycle)
+            if key in self._reported:
+                continue
+            self._reported.add(key)
+            frames = frames or sys._current_frames()
+            report = {
+                'detected_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'threads': [{
+                    'thread_id': thread,
+                    'thread': _thread_name(thread),
+                    'waiting_for': lock.name,
+                    'holding': list(self.registry.held.get(thread, [])),
+                    'stack': ''.join(traceback.format_stack(frames[thread])) if thread in frames else '',
+                } for thread, lock in cycle],
+            }
+            reports.append(report)
+            self.registry.deadlocks.append(report)
+            del self.registry.deadlocks[:-MAX_DEADLOCK_REPORTS]
+            text = "\n".join(f"Thread {t['thread']} holds {', '.join(t['holding']) or 'nothing'} and waits for "
+                             f"{t['waiting_for']}:\n{t['stack']}" for t in report['threads'])
+            self.logger.critical(f"DEADLOCK detected between {len(cycle)} threads:\n{text}")
+        return reports
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Log Queue
+
+Non-blocking logging for enhanced_ecommerce_runner.py. Loggers get one
+QueueLogHandler, which only puts records on a bounded queue; a QueueLogWriter
+thread takes them off in batches and passes each to the real handlers (files,
+console), flushing every handler once per batch instead of once per record.
+
+When the queue is full, the policy decides:
+
+- 'block' (default): the logging thread waits for room (up to `block_timeout`
+  seconds, forever if None), so no record is lost;
+- 'drop': the record is dropped at once and counted. The writer reports how
+  many were dropped in a WARNING record of its own.
+
+The handlers' own levels and filters are applied on the writer thread.
+Batched* handlers are the stdlib file and stream handlers without the flush
+after every record; the writer flushes them.
+
+stop() waits for puts already under way, so every record it accepted is
+written before the handlers close. Records put after that are not written:
+those at WARNING or above go to logging.lastResort (stderr), and all of them
+are counted as `after_stop`.
+"""
+import logging
+import queue
+import sys
+import threading
+
+POLICIES = ('block', 'drop')
+DEFAULT_MAX_QUEUE = 10_000
+DEFAULT_BATCH_SIZE = 512
+_STOP = object()
+
+
+class BatchedStreamHandler(logging.StreamHandler):
+    """StreamHandler that leaves flushing to QueueLogWriter."""
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+
+class BatchedFileHandler(logging.FileHandler):
+    """FileHandler that leaves flushing to QueueLogWriter."""
+    def emit(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        BatchedStreamHandler.emit(self, record)
+
+
+class QueueLogHandler(logging.Handler):
+    """Puts records on a QueueLogWriter's queue, with the message already merged with its arguments."""
+    def __init__(self, writer: 'QueueLogWriter'):
+        super().__init__()
+        self.writer = writer
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Formatted now, so queued records do not keep the traceback's frames alive
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            self.writer.put(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+
+class QueueLogWriter:
+    """Background thread writing queued records to `handlers`, in batches of up to `batch_size`."""
+    def __init__(self, handlers, max_queue: int = DEFAULT_MAX_QUEUE, policy: str = 'block',
+                 block_timeout: float = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, not {policy!r}")
+        self.handlers = list(handlers)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.batch_size = batch_size
+        self.queue = queue.Queue(max_queue)
+        self.handler = QueueLogHandler(self)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)    # notified when no put() is under way
+        self._thread = None
+        self._stopped = False
+        self._putting = 0
+        self.queued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.after_stop = 0
+        self._reported_drops = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and not self._stopped:
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+        return self
+
+    def put(self, record):
+        with self._lock:
+            stopped = self._stopped
+            if stopped:
+                self.after_stop += 1
+            else:
+                self._putting += 1
+                started = self._thread is not None
+        if stopped:
+            last_resort = logging.lastResort
+            if last_resort is not None and record.levelno >= last_resort.level:
+                last_resort.handle(record)
+            return
+        queued = dropped = False
+        try:
+            if not started:     # write on the caller's thread until the writer runs
+                self._write([record])
+                return
+            try:
+                if self.policy == 'drop':
+                    self.queue.put_nowait(record)
+                else:
+                    self.queue.put(record, timeout=self.block_timeout)
+                queued = True
+            except queue.Full:
+                dropped = True
+        finally:
+            with self._idle:
+                self._putting -= 1
+                self.queued += queued
+                self.dropped += dropped
+                if not self._putting:
+                    self._idle.notify_all()
+
+    def _run(self):
+        while True:
+            batch, stopping = [], False
+            record = self.queue.get()
+            while True:
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) == self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in range(len(batch) + stopping):
+                self.queue.task_done()
+            if stopping:
+                return
+
+    def _write(self, records):
+        with self._lock:
+            dropped = self.dropped - self._reported_drops
+            self._reported_drops = self.dropped
+        batch = list(records)
+        if dropped:
+            batch.append(logging.LogRecord('log_queue', logging.WARNING, __file__, 0,
+                                           f"{dropped} log record(s) dropped: log queue full", None, None))
+        for record in batch:
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+        if not batch:
+            return
+        for handler in self.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                print(f"log_queue: flushing {handler!r} failed", file=sys.stderr)
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(batch))
+
+    def flush(self):
+        """Waits until every record queued so far has been written and flushed."""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.join()
+
+    def stop(self):
+        """Writes what is queued, stops the thread and closes the handlers. Later puts are not written."""
+        with self._idle:
+            if self._stopped:
+                return
+            self._stopped = True
+            while self._putting:
+                self._idle.wait()
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self.queue.put(_STOP)
+            thread.join()
+        for handler in self.handlers:
+            handler.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'policy': self.policy,
+                'pending': self.queue.qsize(),
+                'capacity': self.queue.maxsize,
+                'queued': self.queued,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches,
+                'max_batch': self.max_batch,
+                'after_stop': self.after_stop,
+            }
@@ -367,7 +367,7 @@ from crewai import Agent, Task, Crew, Process
 
 # Load environment variables and import tool/LLM factory
 load_dotenv()
-from code_graph_tool import code_graph_tool
+from code_graph_tool import access_log_route_tool, code_graph_tool, graph_path_query_tool
 from llm_provider import get_llm
 
 app = Flask(__name__)
@@ -395,7 +395,7 @@ def analyze():
                 role='Expert System Diagnostician',
                 goal="Analyze logs and use the Code Intelligence Graph to find the root cause.",
                 backstory="You are a specialized AI agent for root cause analysis...",
-                tools=[code_graph_tool], llm=llm, verbose=False
+                tools=[code_graph_tool, graph_path_query_tool, access_log_route_tool], llm=llm, verbose=False
             )
             remediation_agent = Agent(
                 role='Senior Site Reliability Engineer (SRE)',
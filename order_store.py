@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Persistent Order Store
+
+INVENTORY and ORDERS for buggy_app.py, kept in a local SQLite database in WAL
+mode instead of process-local dicts, so they survive restarts and several
+worker processes (e.g. `gunicorn -w 4 buggy_app:app`) can share one store:
+
+- ordering is one short write transaction. `BEGIN IMMEDIATE` takes SQLite's
+  write lock up front, and the stock decrement is a single conditional
+  `UPDATE ... WHERE stock >= ?`, so two orders can never oversell an item
+  and no application lock (or lock ordering) is involved;
+- reads (consistency checks) run in a deferred transaction. Under WAL they
+  see one consistent snapshot and never block writers;
+- connections come from a bounded ConnectionPool. Callers wait up to
+  `timeout` for a free one and then get StoreBusy, like a writer that stays
+  locked out longer than `busy_timeout`. Saturation metrics (in use, waits,
+  timeouts, wait and hold time histograms) are served by buggy_app.py at
+  /debug/store.
+
+Connections are never shared across fork(). A pool used in a forked child
+abandons the parent's connections and opens its own.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from lock_profiler import LatencyHistogram
+
+DEFAULT_STORE_PATH = "ecommerce.db"
+DEFAULT_POOL_SIZE = 8
+DEFAULT_POOL_TIMEOUT = 1.0    # seconds to wait for a free connection
+DEFAULT_BUSY_TIMEOUT = 5.0    # seconds SQLite retries a locked database
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (
+    item_id TEXT PRIMARY KEY,
+    stock   INTEGER NOT NULL CHECK (stock >= 0)
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id   TEXT PRIMARY KEY,
+    item_id    TEXT NOT NULL,
+    quantity   INTEGER NOT NULL,
+    status     TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_by_item ON orders (item_id);
+"""
+
+
+class StoreBusy(RuntimeError):
+    """The store could not serve the request in time: no free connection, or the database stayed locked."""
+
+
+class PoolTimeout(StoreBusy):
+    """Raised when no pooled connection frees up within the pool timeout."""
+
+
+class ConnectionPool:
+    """A bounded, thread-safe pool of SQLite connections with saturation metrics."""
+    def __init__(self, path: str, size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_POOL_TIMEOUT,
+                 busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []          # most recently released last
+        self._created = 0
+        self._in_use = 0
+        self.acquisitions = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.max_in_use = 0
+        self.wait_times = LatencyHistogram()
+        self.hold_times = LatencyHistogram()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")   # durable at checkpoints; safe against corruption in WAL
+        return conn
+
+    def acquire(self):
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset()    # forked: the parent's connections must not be used (or closed) here
+            waited = False
+            while not self._idle and self._created >= self.size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No free connection to {self.path} after {self.timeout}s "
+                                      f"({self._in_use}/{self.size} in use)")
+                waited = True
+                self._cond.wait(remaining)
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._created += 1
+            self._in_use += 1
+            self.acquisitions += 1
+            self.waits += waited
+            self.max_in_use = max(self.max_in_use, self._in_use)
+            self.wait_times.record(time.perf_counter() - start)
+        if conn is None:
+            try:
+                conn = self._connect()
+            except BaseException:
+                with self._cond:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            self._idle.append(conn)
+            self._in_use -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        start = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._cond:
+                self.hold_times.record(time.perf_counter() - start)
+            self.release(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_in_use': self.max_in_use,
+                'acquisitions': self.acquisitions,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'saturation': round(self.waits / self.acquisitions, 4) if self.acquisitions else 0.0,
+                'wait': self.wait_times.to_dict(),
+                'hold': self.hold_times.to_dict(),
+            }
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for conn in idle:
+            conn.close()
+
+
+class SQLiteOrderStore:
+    """Inventory and orders in one SQLite database, safe to share between threads and processes."""
+    def __init__(self, path: str = DEFAULT_STORE_PATH, pool_size: int = DEFAULT_POOL_SIZE,
+                 pool_timeout: float = DEFAULT_POOL_TIMEOUT, busy_timeout: float = DEFAULT_BUSY_TIMEOUT):
+        self.path = path
+        self.pool = ConnectionPool(path, pool_size, pool_timeout, busy_timeout)
+        self.orders_created = 0
+        self.out_of_stock = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self, write: bool):
+        """One transaction on a pooled connection. Writes take the database write lock at BEGIN."""
+        with self.pool.connection() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+                yield conn
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError as e:
+                if "locked" in str(e) or "busy" in str(e):
+                    with self._lock:
+                        self.busy += 1
+                    raise StoreBusy(f"{self.path}: {e}") from e
+                raise
+
+    def seed_inventory(self, items: dict):
+        """Adds items that are not in the store yet; existing stock is left alone."""
+        with self._transaction(write=True) as conn:
+            conn.executemany("INSERT OR IGNORE INTO inventory (item_id, stock) VALUES (?, ?)", items.items())
+
+    def create_order(self, order_id: str, item_id: str, quantity: int):
+        """Reserves stock and records the order atomically.
+
+        Returns the order and the item's remaining stock, or None if the item is
+        unknown or has less than `quantity` left.
+        """
+        created_at = time.time()
+        with self._transaction(write=True) as conn:
+            row = conn.execute("UPDATE inventory SET stock = stock - ? WHERE item_id = ? AND stock >= ? "
+                               "RETURNING stock", (quantity, item_id, quantity)).fetchone()
+            if row is None:
+                with self._lock:
+                    self.out_of_stock += 1
+                return None
+            conn.execute("INSERT INTO orders (order_id, item_id, quantity, status, created_at) "
+                         "VALUES (?, ?, ?, 'created', ?)", (order_id, item_id, quantity, created_at))
+        with self._lock:
+            self.orders_created += 1
+        order = {'id': order_id, 'item': item_id, 'quantity': quantity, 'status': 'created',
+                 'created_at': created_at}
+        return order, row[0]
+
+    def snapshot(self, items=None) -> dict:
+        """Stock, order count and ordered quantity per item, read from one consistent snapshot."""
+        query = ("SELECT i.item_id, i.stock, COUNT(o.order_id), COALESCE(SUM(o.quantity), 0) "
+                 "FROM inventory i LEFT JOIN orders o ON o.item_id = i.item_id")
+        params = ()
+        if items is not None:
+            params = list(items)
+            query += f" WHERE i.item_id IN ({', '.join('?' * len(params))})"
+        with self._transaction(write=False) as conn:
+            rows = conn.execute(query + " GROUP BY i.item_id", params).fetchall()
+        return {item_id: {'stock': stock, 'orders': orders, 'ordered': ordered}
+                for item_id, stock, orders, ordered in rows}
+
+    def all_stock(self) -> dict:
+        """Current stock of every item."""
+        with self._transaction(write=False) as conn:
+            return dict(conn.execute("SELECT item_id, stock FROM inventory").fetchall())
+
+    def get_order(self, order_id: str):
+        with self._transaction(write=False) as conn:
+            row = conn.execute("SELECT order_id, item_id, quantity, status, created_at FROM orders "
+                               "WHERE order_id = ?", (order_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'item', 'quantity', 'status', 'created_at'), row))
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = {'orders_created': self.orders_created, 'out_of_stock': self.out_of_stock,
+                        'busy': self.busy}
+        return {'path': self.path, 'pid': os.getpid(), **counters, 'pool': self.pool.stats()}
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Path-Pattern Query Language for the Code Intelligence Graph
+
+A small, Cypher-like language that lets an agent ask multi-hop questions in a
+single call instead of chaining many hardcoded lookups. Example:
+
+    MATCH (ep:Function)-[:CALLS*1..3]->(f:Function)-[:CAN_CAUSE]->(:ErrorType {name: 'database_deadlock'}),
+          (f)-[:MODIFIES]->(t:DatabaseTable)<-[:MODIFIES]-({name: 'process_inventory_update'})
+    RETURN ep, f, t
+
+Grammar (keywords are case-insensitive, MATCH is optional):
+
+    query   := [MATCH] pattern (',' pattern)* [RETURN var (',' var)*] [LIMIT int]
+    pattern := node (edge node)*
+    node    := '(' [var] [':' Type] ['{' 'name' ':' string '}'] ')'
+    edge    := '-[' [':' TYPE ('|' TYPE)*] [hops] ']->'
+             | '<-[' [':' TYPE ('|' TYPE)*] [hops] ']-'
+    hops    := '*' | '*' int | '*' [int] '..' [int]
+
+Queries are compiled into an execution plan of Scan/Expand steps that start
+from the most selective node (a named node, else the smallest type) and use
+the engine's type and edge indexes. Variable-length hops run a BFS that expands
+each node at most once per depth up to the upper bound, so `*2..3` also finds
+nodes that are one hop away by another path, and cycles in the call graph
+cannot loop forever.
+"""
+import re
+
+# Upper bound for open-ended variable-length hops such as `*` or `*2..`.
+MAX_HOPS = 8
+DEFAULT_LIMIT = 100
+
+_TOKEN_SPEC = [
+    ('STRING', r"'[^']*'|\"[^\"]*\""),
+    ('LARROW', r'<-\['),
+    ('RARROW', r'\]->'),
+    ('LDASH', r'-\['),
+    ('RDASH', r'\]-'),
+    ('RANGE', r'\.\.'),
+    ('INT', r'\d+'),
+    ('IDENT', r'[A-Za-z_][\w\-]*'),
+    ('PUNCT', r'[(){}:,*|]'),
+    ('SKIP', r'\s+'),
+]
+_TOKEN_RE = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern in _TOKEN_SPEC))
+
+
+class PathQuerySyntaxError(ValueError):
+    """Raised when a path query cannot be parsed."""
+
+
+def _tokenize(text: str) -> list[tuple[str, str]]:
+    tokens, pos = [], 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise PathQuerySyntaxError(f"Unexpected character {text[pos]!r} at position {pos}")
+        pos = match.end()
+        if match.lastgroup != 'SKIP':
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.anonymous = 0
+        self.nodes = {}   # var -> {'type': str|None, 'name': str|None}
+        self.edges = []   # (src_var, dst_var, edge_types, min_hops, max_hops)
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def accept(self, kind, value=None):
+        tok_kind, tok_value = self.peek()
+        if tok_kind == kind and (value is None or tok_value.upper() == value.upper()):
+            self.pos += 1
+            return tok_value
+        return None
+
+    def expect(self, kind, value=None):
+        result = self.accept(kind, value)
+        if result is None:
+            found = self.peek()[1]
+            raise PathQuerySyntaxError(f"Expected {value or kind} but found {found!r}")
+        return result
+
+    def parse(self):
+        self.accept('IDENT', 'MATCH')
+        self.parse_pattern()
+        while self.accept('PUNCT', ','):
+            self.parse_pattern()
+
+        returns = []
+        if self.accept('IDENT', 'RETURN'):
+            returns.append(self.expect('IDENT'))
+            while self.accept('PUNCT', ','):
+                returns.append(self.expect('IDENT'))
+        limit = DEFAULT_LIMIT
+        if self.accept('IDENT', 'LIMIT'):
+            limit = int(self.expect('INT'))
+        if self.peek()[0] is not None:
+            raise PathQuerySyntaxError(f"Unexpected token {self.peek()[1]!r}")
+
+        for var in returns:
+            if var not in self.nodes:
+                raise PathQuerySyntaxError(f"RETURN references unknown variable '{var}'")
+        if not returns:
+            returns = [var for var in self.nodes if not var.startswith('_')]
+        return self.nodes, self.edges, returns, limit
+
+    def parse_pattern(self):
+        left = self.parse_node()
+        while self.peek()[0] in ('LDASH', 'LARROW'):
+            reverse = self.peek()[0] == 'LARROW'
+            self.pos += 1
+            edge_types, min_hops, max_hops = self.parse_edge_body()
+            self.expect('RDASH' if reverse else 'RARROW')
+            right = self.parse_node()
+            if reverse:
+                self.edges.append((right, left, edge_types, min_hops, max_hops))
+            else:
+                self.edges.append((left, right, edge_types, min_hops, max_hops))
+            left = right
+
+    def parse_node(self):
+        self.expect('PUNCT', '(')
+        var = self.accept('IDENT')
+        node_type = self.expect('IDENT') if self.accept('PUNCT', ':') else None
+        name = None
+        if self.accept('PUNCT', '{'):
+            key = self.expect('IDENT')
+            if key != 'name':
+                raise PathQuerySyntaxError(f"Only the 'name' property is supported, got '{key}'")
+            self.expect('PUNCT', ':')
+            name = self.expect('STRING')[1:-1]
+            self.expect('PUNCT', '}')
+        self.expect('PUNCT', ')')
+
+        if var is None:
+            var = f'_anon{self.anonymous}'
+            self.anonymous += 1
+        spec = self.nodes.setdefault(var, {'type': None, 'name': None})
+        for key, value in (('type', node_type), ('name', name)):
+            if value is not None:
+                if spec[key] not in (None, value):
+                    raise PathQuerySyntaxError(f"Conflicting {key} for variable '{var}'")
+                spec[key] = value
+        return var
+
+    def parse_edge_body(self):
+        edge_types = None
+        if self.accept('PUNCT', ':'):
+            edge_types = [self.expect('IDENT')]
+            while self.accept('PUNCT', '|'):
+                edge_types.append(self.expect('IDENT'))
+        min_hops = max_hops = 1
+        if self.accept('PUNCT', '*'):
+            min_hops, max_hops = 1, MAX_HOPS
+            low = self.accept('INT')
+            if self.accept('RANGE'):
+                high = self.accept('INT')
+                min_hops = int(low) if low is not None else 1
+                max_hops = int(high) if high is not None else MAX_HOPS
+            elif low is not None:
+                min_hops = max_hops = int(low)
+        if min_hops < 0 or max_hops < min_hops or max_hops > MAX_HOPS:
+            raise PathQuerySyntaxError(f"Invalid hop range {min_hops}..{max_hops} (max {MAX_HOPS})")
+        return frozenset(edge_types) if edge_types else None, min_hops, max_hops
+
+
+def parse_query(text: str):
+    """Parses a query into (nodes, edges, return_vars, limit)."""
+    return _Parser(text).parse()
+
+
+class QueryPlan:
+    """
+    An ordered list of steps compiled for a specific engine:
+
+    - ('scan', var): bind `var` from the name lookup or the type index.
+    - ('expand', src, dst, edge_types, direction, min_hops, max_hops): follow
+      edges from the bound `src` and bind (or check) `dst`.
+    """
+    def __init__(self, nodes, steps, returns, limit):
+        self.nodes = nodes
+        self.steps = steps
+        self.returns = returns
+        self.limit = limit
+
+    def describe(self) -> str:
+        lines = []
+        for step in self.steps:
+            if step[0] == 'scan':
+                spec = self.nodes[step[1]]
+                source = f"name={spec['name']!r}" if spec['name'] else f"type index {spec['type'] or '*'}"
+                lines.append(f"Scan {step[1]} via {source}")
+            else:
+                _, src, dst, edge_types, direction, low, high = step
+                types = '|'.join(sorted(edge_types)) if edge_types else '*'
+                lines.append(f"Expand {src} -[{types}*{low}..{high}]-{direction}-> {dst}")
+        return "\n".join(lines)
+
+    def execute(self, engine) -> list[dict]:
+        bindings = [{}]
+        for step in self.steps:
+            if step[0] == 'scan':
+                bindings = self._scan(engine, step[1], bindings)
+            else:
+                bindings = self._expand(engine, step, bindings)
+            if not bindings:
+                return []
+
+        rows, seen = [], set()
+        for binding in bindings:
+            row = tuple(binding[var] for var in self.returns)
+            if row not in seen:
+                seen.add(row)
+                rows.append(dict(zip(self.returns, row)))
+                if len(rows) >= self.limit:
+                    break
+        return rows
+
+    def _matches(self, engine, var, node) -> bool:
+        spec = self.nodes[var]
+        if spec['name'] is not None and node != spec['name']:
+            return False
+        return spec['type'] is None or engine.node_type(node) == spec['type']
+
+    def _scan(self, engine, var, bindings):
+        spec = self.nodes[var]
+        if spec['name'] is not None:
+            candidates = [spec['name']] if engine.graph.has_node(spec['name']) else []
+        elif spec['type'] is not None:
+            candidates = sorted(engine.nodes_of_type(spec['type']))
+        else:
+            candidates = list(engine.graph.nodes)
+        candidates = [node for node in candidates if self._matches(engine, var, node)]
+        return [{**binding, var: node} for binding in bindings for node in candidates]
+
+    def _expand(self, engine, step, bindings):
+        _, src, dst, edge_types, direction, low, high = step
+        reachable_cache = {}
+        result = []
+        for binding in bindings:
+            start = binding[src]
+            if start not in reachable_cache:
+                reachable_cache[start] = [
+                    node for node in engine.bounded_neighbourhood(start, edge_types, direction, low, high)
+                    if self._matches(engine, dst, node)
+                ]
+            targets = reachable_cache[start]
+            if dst in binding:
+                if binding[dst] in targets:
+                    result.append(binding)
+            else:
+                result.extend({**binding, dst: node} for node in targets)
+        return result
+
+
+def compile_query(text: str, engine) -> QueryPlan:
+    """
+    Compiles a query into a plan for `engine`. Nodes are bound starting with the
+    most selective one and each pattern edge is expanded from whichever end is
+    already bound, walking it backwards through the in-edge index if needed.
+    """
+    nodes, edges, returns, limit = parse_query(text)
+
+    def selectivity(var):
+        spec = nodes[var]
+        if spec['name'] is not None:
+            return 1
+        if spec['type'] is not None:
+            return len(engine.nodes_of_type(spec['type']))
+        return engine.graph.number_of_nodes()
+
+    steps, bound, pending = [], set(), list(edges)
+    while len(bound) < len(nodes) or pending:
+        if not any(src in bound or dst in bound for src, dst, *_ in pending):
+            anchor = min((var for var in nodes if var not in bound), key=selectivity)
+            steps.append(('scan', anchor))
+            bound.add(anchor)
+        # Expand every edge that now touches the bound set, preferring edges
+        # whose far end is already bound (a cheap membership check).
+        while True:
+            ready = [edge for edge in pending if edge[0] in bound or edge[1] in bound]
+            if not ready:
+                break
+            edge = min(ready, key=lambda e: (not (e[0] in bound and e[1] in bound),
+                                             selectivity(e[1] if e[0] in bound else e[0])))
+            pending.remove(edge)
+            src, dst, edge_types, low, high = edge
+            if src in bound:
+                steps.append(('expand', src, dst, edge_types, 'out', low, high))
+                bound.add(dst)
+            else:
+                steps.append(('expand', dst, src, edge_types, 'in', low, high))
+                bound.add(src)
+    return QueryPlan(nodes, steps, returns, limit)
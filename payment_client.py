@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Payment Service Client
+
+How the order service calls the payment service
+(buggy_app.call_payment_service_from_order_service):
+
+- one requests.Session per client, with a bounded keep-alive connection pool,
+  so calls reuse TCP connections instead of opening one per order;
+- separate connect and read timeouts on every call;
+- a CircuitBreaker. After `failure_threshold` consecutive failures (timeouts,
+  connection errors, 5xx, success responses whose body is not JSON) calls
+  fail fast with CircuitOpen for `reset_timeout` seconds. Then a limited
+  number of half-open probe calls decide whether to close the circuit again
+  or reopen it;
+- version negotiation. API versions are tried newest first. A 404/405/410
+  from a version's endpoint moves to the next one, and the first version
+  that answers is kept for later calls;
+- metrics: call outcomes, latency histogram, negotiated version, connection
+  reuse and breaker state/transitions, served by buggy_app.py at
+  /debug/payments.
+
+Every call sends the order ID as an Idempotency-Key header, so a payment
+service that honours it will not charge twice for a retried order.
+"""
+import threading
+import time
+from collections import Counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lock_profiler import LatencyHistogram
+
+# Newest first. v2 is the payment service's legacy endpoint.
+VERSION_PATHS = {
+    'v3': '/api/v3/payments/process',
+    'v2': '/api/v2/process-payment',
+}
+DEFAULT_VERSIONS = ('v3', 'v2')
+DEFAULT_CONNECT_TIMEOUT = 0.5   # seconds
+DEFAULT_READ_TIMEOUT = 2.0      # seconds
+DEFAULT_POOL_SIZE = 16          # keep-alive connections kept per host
+# Status codes meaning "this version's endpoint does not exist here".
+UNSUPPORTED_VERSION_STATUSES = {404, 405, 410}
+
+
+class PaymentError(RuntimeError):
+    """A payment call failed: timeout, connection error or an error response."""
+
+
+class CircuitOpen(PaymentError):
+    """Raised without calling the payment service while its circuit is open."""
+
+
+class PaymentVersionUnsupported(PaymentError):
+    """Raised when the payment service supports none of the client's API versions."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with half-open probing. Thread-safe."""
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0,
+                 half_open_max_calls: int = 1, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._changed_at = clock()
+        self._failures = 0          # consecutive, while closed
+        self._probes = 0            # half-open calls in flight
+        self.transitions = Counter()
+        self.rejected = 0
+
+    def _set_state(self, state):
+        self.transitions[f"{self._state}->{state}"] += 1
+        self._state = state
+        self._changed_at = self.clock()
+        self._failures = 0
+        self._probes = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead. An allowed call must be followed by record_success or record_failure."""
+        with self._lock:
+            if self._state == self.OPEN and self.clock() - self._changed_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._set_state(self.CLOSED)
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._set_state(self.OPEN)
+            elif self._state == self.CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._set_state(self.OPEN)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'name': self.name,
+                'state': self._state,
+                'state_seconds': round(self.clock() - self._changed_at, 3),
+                'consecutive_failures': self._failures,
+                'rejected': self.rejected,
+                'transitions': dict(self.transitions),
+            }
+
+
+class PaymentClient:
+    """Pooled, circuit-broken, version-negotiating client for the payment service."""
+    def __init__(self, base_url: str, versions=DEFAULT_VERSIONS, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT, pool_size: int = DEFAULT_POOL_SIZE,
+                 breaker: CircuitBreaker = None):
+        self.base_url = base_url.rstrip('/')
+        self.versions = list(versions)
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker('payment-service')
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+        self._version = None        # negotiated version, once one has answered
+        self._lock = threading.Lock()
+        self.outcomes = Counter()
+        self.version_fallbacks = 0
+        self.latency = LatencyHistogram()
+
+    @property
+    def version(self):
+        return self._version
+
+    def _count(self, outcome, start):
+        with self._lock:
+            self.outcomes[outcome] += 1
+            self.latency.record(time.perf_counter() - start)
+
+    def _post(self, version, payload, order_id):
+        return self.session.post(self.base_url + VERSION_PATHS[version], json=payload, timeout=self.timeout,
+                                 headers={'Idempotency-Key': str(order_id)})
+
+    def _negotiated_post(self, payload, order_id):
+        """Posts to the negotiated version, falling back to older ones while endpoints are missing."""
+        current = self._version
+        candidates = self.versions if current is None else \
+            [current] + [v for v in self.versions if v != current]
+        for version in candidates:
+            response = self._post(version, payload, order_id)
+            if response.status_code not in UNSUPPORTED_VERSION_STATUSES:
+                if version != current:
+                    with self._lock:
+                        self.version_fallbacks += current is not None
+                        self._version = version
+                return response
+        with self._lock:
+            self._version = None
+        raise PaymentVersionUnsupported(
+            f"{self.base_url} supports none of {', '.join(self.versions)} (last status {response.status_code})")
+
+    def process(self, order_id, amount) -> dict:
+        """Charges `amount` for `order_id` and returns the payment service's response body."""
+        if not self.breaker.allow():
+            with self._lock:
+                self.outcomes['circuit_open'] += 1
+            raise CircuitOpen(f"{self.breaker.name} circuit is open")
+        start = time.perf_counter()
+        try:
+            response = self._negotiated_post({'order_id': order_id, 'amount': amount}, order_id)
+        except requests.Timeout as e:
+            self.breaker.record_failure()
+            self._count('timeout', start)
+            raise PaymentError(f"Payment service timed out: {e}") from e
+        except requests.ConnectionError as e:
+            self.breaker.record_failure()
+            self._count('connection_error', start)
+            raise PaymentError(f"Cannot reach payment service: {e}") from e
+        except requests.RequestException as e:
+            self.breaker.record_failure()
+            self._count('request_error', start)
+            raise PaymentError(f"Payment request failed: {e}") from e
+        except PaymentVersionUnsupported:
+            self.breaker.record_failure()
+            self._count('version_unsupported', start)
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+            self._count('server_error', start)
+            raise PaymentError(f"Payment service error {response.status_code}")
+        if response.status_code >= 400:
+            # A 4xx is an answer about this payment; the service itself is healthy.
+            self.breaker.record_success()
+            self._count('rejected', start)
+            raise PaymentError(f"Payment rejected with {response.status_code}: {response.text[:200]}")
+        try:
+            body = response.json()
+        except ValueError as e:
+            # A success status with a body that is not JSON (or was cut short) is a broken answer
+            self.breaker.record_failure()
+            self._count('invalid_response', start)
+            raise PaymentError(f"Payment service sent an unreadable response ({response.status_code}): {e}") from e
+        self.breaker.record_success()
+        self._count('succeeded', start)
+        return body
+
+    def _connection_stats(self):
+        opened = requests_sent = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                requests_sent += pool.num_requests
+        return {'opened': opened, 'requests': requests_sent}
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = {
+                'base_url': self.base_url,
+                'version': self._version,
+                'version_fallbacks': self.version_fallbacks,
+                'outcomes': dict(self.outcomes),
+                'latency': self.latency.to_dict(),
+            }
+        return {**calls, 'connections': self._connection_stats(), 'breaker': self.breaker.stats()}
+
+    def close(self):
+        self.session.close()
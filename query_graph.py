@@ -7,12 +7,20 @@ multi-hop traversal queries to diagnose incidents. It simulates the process
 an AI agent would use to find the root cause of an issue.
 
 Scenario Simulated:
-- Incident: A 'database_deadlock' is reported.
+- Incident: A 'thread_pool_exhaustion' is reported (request threads stuck in
+  a handler that blocks).
 - Goal: Find the culpable functions, their source code, and construct a
   precise prompt for an LLM to perform the final analysis.
 """
+import json
 import networkx as nx
 import os
+from collections import defaultdict
+
+from path_query import compile_query
+from route_index import build_route_trie, resolve_access_log
+from reachability import ReachabilityIndex, build_reachability_index, load_reachability_index
+from runtime_tracer import HOTNESS_BOOST, STALE_ATTR
 
 class GraphQueryEngine:
     """
@@ -25,14 +33,181 @@ class GraphQueryEngine:
         
         print(f"🧠 Loading Code Intelligence Graph from '{graph_path}'...")
         self.graph = nx.read_graphml(graph_path)
+        self._build_indexes()
+        self._plan_cache = {}
+        # Graphs built before the reachability index existed (or before it covered
+        # ROUTES_TO) get it computed on load.
+        index = load_reachability_index(self.graph) or build_reachability_index(self.graph)
+        self.reachability = ReachabilityIndex(index)
+        # Set when a runtime profile merged into the saved graph changed its call
+        # graph after lock-order cycles and hazards were computed (see runtime_tracer.py).
+        self.analysis_stale = bool(self.graph.graph.get(STALE_ATTR, False))
+        self.routes = build_route_trie(self.graph)
         print("   - Graph loaded successfully.")
 
+    def _build_indexes(self):
+        """
+        Builds the node-type index and per-edge-type adjacency indexes used by
+        the path query planner, so a hop never has to filter every neighbour.
+        """
+        self._type_index = defaultdict(set)
+        for node, node_type in self.graph.nodes(data='type'):
+            self._type_index[node_type].add(node)
+
+        self._out_index = defaultdict(lambda: defaultdict(list))
+        self._in_index = defaultdict(lambda: defaultdict(list))
+        for src, dst, edge_type in self.graph.edges(data='type'):
+            self._out_index[src][edge_type].append(dst)
+            self._in_index[dst][edge_type].append(src)
+
+        # GlobalState node -> {function: {'reads': [lines], 'writes': [lines], 'held': [locks]}},
+        # plus bare variable names (`INVENTORY`) -> state nodes.
+        self._state_index = defaultdict(dict)
+        self._state_names = defaultdict(list)
+        for state in self._type_index.get('GlobalState', ()):
+            self._state_names[self.graph.nodes[state].get('name', state)].append(state)
+        for func, state, data in self.graph.edges(data=True):
+            if data.get('type') not in ('READS', 'WRITES'):
+                continue
+            entry = {'reads': [], 'writes': [], 'held': set()}
+            for access in json.loads(data.get('accesses', '[]')):
+                entry['reads' if access['mode'] == 'read' else 'writes'].append(access['line'])
+                entry['held'].update(access['held'])
+            entry['held'] = sorted(entry['held'])
+            self._state_index[state][func] = entry
+
+    def node_type(self, node: str):
+        return self.graph.nodes[node].get('type')
+
+    def nodes_of_type(self, node_type: str) -> set:
+        return self._type_index.get(node_type, set())
+
+    def neighbours(self, node: str, edge_types=None, direction: str = 'out') -> list[str]:
+        """Returns neighbours over the given edge types (all types if None)."""
+        index = self._out_index if direction == 'out' else self._in_index
+        by_type = index.get(node, {})
+        if edge_types is None:
+            return [other for others in by_type.values() for other in others]
+        return [other for edge_type in edge_types for other in by_type.get(edge_type, ())]
+
+    def bounded_neighbourhood(self, start: str, edge_types=None, direction: str = 'out',
+                              min_hops: int = 1, max_hops: int = 1) -> list[str]:
+        """
+        Returns every node at the end of some path of min_hops..max_hops hops
+        from `start`, so with min_hops > 1 a node is found even when it can also
+        be reached in fewer hops. The BFS runs over (node, depth) pairs: a node
+        is expanded at most once per depth, which bounds the work by max_hops
+        passes over the edges and makes call-graph cycles harmless. `start`
+        itself is included when it lies on a cycle within the hop range.
+        """
+        found = [start] if min_hops == 0 else []
+        seen, frontier = set(found), [start]
+        for depth in range(1, max_hops + 1):
+            next_frontier, at_depth = [], set()
+            for node in frontier:
+                for other in self.neighbours(node, edge_types, direction):
+                    if other not in at_depth:
+                        at_depth.add(other)
+                        next_frontier.append(other)
+                        if depth >= min_hops and other not in seen:
+                            seen.add(other)
+                            found.append(other)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return found
+
+    def can_reach(self, src: str, dst: str) -> bool:
+        """
+        True if `src` (a function, or an endpoint through the function it routes
+        to) transitively CALLS `dst` (answered from the precomputed index).
+        """
+        return self.reachability.can_reach(src, dst)
+
+    def find_callees(self, function_name: str) -> list[str]:
+        """All functions transitively called by `function_name`."""
+        return self.reachability.descendants(function_name)
+
+    def find_callers(self, function_name: str) -> list[str]:
+        """All functions that can transitively reach `function_name`."""
+        return [n for n in self.reachability.ancestors(function_name) if self.node_type(n) == 'Function']
+
+    def find_entry_endpoints(self, function_name: str) -> list[str]:
+        """All endpoints whose requests can reach `function_name`."""
+        return [n for n in self.reachability.ancestors(function_name) if self.node_type(n) == 'Endpoint']
+
+    def resolve_state(self, name: str) -> list[str]:
+        """Resolves a GlobalState node name or a bare variable name (`INVENTORY`) to state nodes."""
+        if self.graph.has_node(name) and self.node_type(name) == 'GlobalState':
+            return [name]
+        return list(self._state_names.get(name, []))
+
+    def find_state_accessors(self, state: str) -> dict:
+        """
+        Answers "who touches this state" from the precomputed index: returns
+        {state node: {function: {'reads': [lines], 'writes': [lines], 'held': [locks]}}}.
+        """
+        return {node: self._state_index.get(node, {}) for node in self.resolve_state(state)}
+
+    def find_shared_state(self, function_name: str) -> dict:
+        """
+        For each GlobalState `function_name` touches, returns the other functions
+        touching it: {state: {'writes': bool, 'common_locks': [...], 'others':
+        {function: entry}}}. These are the candidates for contention and races
+        with `function_name`.
+        """
+        shared = {}
+        for state in self.neighbours(function_name, ('READS', 'WRITES')):
+            accessors = self._state_index.get(state, {})
+            shared[state] = {
+                'writes': bool(accessors.get(function_name, {}).get('writes')),
+                'common_locks': json.loads(self.graph.nodes[state].get('common_locks', '[]')),
+                'others': {func: entry for func, entry in accessors.items() if func != function_name},
+            }
+        return shared
+
+    def match_request(self, method: str, path: str):
+        """Resolves an HTTP method and raw path to (handler, route template, params), or None."""
+        return self.routes.match(method, path)
+
+    def find_failing_handlers(self, log_lines, min_status: int = 500) -> dict:
+        """
+        Maps failing access-log requests to handler functions through the route
+        index. See route_index.resolve_access_log for the result format.
+        """
+        return resolve_access_log(self.routes, log_lines, min_status)
+
+    def find_deadlock_cycles(self, function_names: list[str] = None) -> list[dict]:
+        """
+        Returns the lock-order cycles precomputed at build time. Each cycle lists
+        its locks, the functions involved and, per lock-order edge, the exact
+        acquisition sites (function, line, and the callee if reached via a call).
+        Optionally keeps only cycles involving one of `function_names`.
+        """
+        cycles = json.loads(self.graph.graph.get('deadlock_cycles', '[]'))
+        if function_names is not None:
+            cycles = [c for c in cycles if set(c['functions']) & set(function_names)]
+        return cycles
+
+    def query(self, query_text: str) -> list[dict]:
+        """
+        Runs a path-pattern query (see path_query.py) and returns one dict per
+        distinct result row. Compiled plans are cached per query string.
+        """
+        plan = self._plan_cache.get(query_text)
+        if plan is None:
+            plan = compile_query(query_text, self)
+            self._plan_cache[query_text] = plan
+        return plan.execute(self)
+
     def find_functions_causing_error(self, error_type: str) -> list[str]:
         """
         Performs the initial query to find functions linked to a specific error type.
         
         Query: "Find all Function nodes that have a 'CAN_CAUSE' relationship
                 with the given ErrorType node."
+        Culprits are ordered by edge weight, strongest first; functions that a
+        merged runtime profile shows to be hot are boosted.
         """
         culprits = []
         # The graph is directional. Edges go from Function -> ErrorType.
@@ -45,8 +220,16 @@ class GraphQueryEngine:
             if (self.graph.nodes[predecessor].get('type') == 'Function' and
                 self.graph[predecessor][error_type].get('type') == 'CAN_CAUSE'):
                 culprits.append(predecessor)
+        culprits.sort(key=lambda func: -self.graph[func][error_type].get('weight', 1.0) *
+                      (1 + HOTNESS_BOOST * self.graph.nodes[func].get('hotness', 0.0)))
         return culprits
 
+    def get_error_evidence(self, function_name: str, error_type: str) -> list[dict]:
+        """Returns the evidence (hazard, line, detail) recorded on a CAN_CAUSE edge."""
+        if not self.graph.has_edge(function_name, error_type):
+            return []
+        return json.loads(self.graph[function_name][error_type].get('evidence', '[]'))
+
     def find_modified_tables(self, function_names: list[str]) -> dict:
         """
         Performs a multi-hop query to find what database tables a list of
@@ -76,16 +259,15 @@ class GraphQueryEngine:
             return self.graph.nodes[function_name].get('source_code', '# Source code not found.')
         return f"# Function '{function_name}' not found in graph."
 
-def run_deadlock_scenario(engine: GraphQueryEngine):
+def run_incident_scenario(engine: GraphQueryEngine, incident_error_type: str = 'thread_pool_exhaustion'):
     """
-    Simulates the end-to-end retrieval process for a database deadlock incident.
+    Simulates the end-to-end retrieval process for an incident of the given
+    ErrorType (by default thread pool exhaustion).
     """
     print("\n" + "="*70)
-    print("🚨 SIMULATING INCIDENT: 'database_deadlock' detected!")
+    print(f"🚨 SIMULATING INCIDENT: '{incident_error_type}' detected!")
     print("="*70)
 
-    incident_error_type = 'database_deadlock'
-
     # --- Step A: Initial Query ---
     print("\n[STEP 1/4] 🎯 Initial Query: Finding potential culprits...")
     print(f"   - Querying graph: Which functions CAN_CAUSE '{incident_error_type}'?")
@@ -96,6 +278,10 @@ def run_deadlock_scenario(engine: GraphQueryEngine):
         return
 
     print(f"   - ✅ Found {len(culprit_functions)} potential culprits: {', '.join(culprit_functions)}")
+    evidence = {func: engine.get_error_evidence(func, incident_error_type) for func in culprit_functions}
+    for func, items in evidence.items():
+        for item in items:
+            print(f"     - {func} (line {item['line']}): {item['detail']}")
 
     # --- Step B: Multi-Hop Query ---
     print("\n[STEP 2/4] 🔗 Multi-Hop Query: Understanding resource contention...")
@@ -104,7 +290,7 @@ def run_deadlock_scenario(engine: GraphQueryEngine):
     
     print("   - ✅ Resource interactions found:")
     for func, tables in table_modifications.items():
-        print(f"     - Function '{func}' modifies: {', '.join(tables)}")
+        print(f"     - Function '{func}' modifies: {', '.join(tables) or 'no tables'}")
         
     # --- Step C: Targeted Retrieval ---
     print("\n[STEP 3/4] 🔍 Targeted Retrieval: Fetching precise source code...")
@@ -118,7 +304,7 @@ def run_deadlock_scenario(engine: GraphQueryEngine):
     # --- Step D: Construct Augmented Prompt ---
     print("\n[STEP 4/4] 📝 Augmented Prompt Construction...")
     
-    prompt_context = "A 'database_deadlock' incident occurred. A Code Intelligence Graph analysis has identified the following functions as the most likely root cause due to their interaction with shared database resources. The relevant source code is provided below."
+    prompt_context = f"A '{incident_error_type}' incident occurred. A Code Intelligence Graph analysis has identified the following functions as the most likely root cause, from the evidence listed with each. The relevant source code is provided below."
     
     final_prompt = f"{prompt_context}\n\n"
     final_prompt += "#" * 50 + "\n"
@@ -128,12 +314,14 @@ def run_deadlock_scenario(engine: GraphQueryEngine):
     for func_name, source_code in retrieved_code.items():
         final_prompt += f"--- Function: {func_name} ---\n"
         final_prompt += f"--- Modifies Tables: {', '.join(table_modifications.get(func_name, []))} ---\n"
+        for item in evidence[func_name]:
+            final_prompt += f"--- Evidence (line {item['line']}): {item['detail']} ---\n"
         final_prompt += "```python\n"
         final_prompt += source_code + "\n"
         final_prompt += "```\n\n"
 
     final_prompt += "--- TASK ---\n"
-    final_prompt += "Analyze the provided source code for these functions. Specifically, examine the order in which they acquire database locks (e.g., `DB_LOCK_ORDERS`, `DB_LOCK_INVENTORY`). Identify the inconsistent lock ordering that is causing the deadlock and describe the exact remediation required to fix it."
+    final_prompt += "Analyze the provided source code for these functions. Specifically, examine the lines cited as evidence and how long each request holds its worker thread there. Identify what exhausts the request thread pool and describe the exact remediation required to fix it."
 
     print("   - ✅ Final, surgical prompt for the LLM has been constructed:")
     print("\n" + "-"*70)
@@ -144,7 +332,7 @@ def main():
     """Main execution function."""
     try:
         query_engine = GraphQueryEngine()
-        run_deadlock_scenario(query_engine)
+        run_incident_scenario(query_engine)
     except FileNotFoundError as e:
         print(f"\nERROR: {e}")
         print("Please ensure you have run 'build_graph.py' to generate the graph file first.")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Call-Graph Reachability Index
+
+Precomputes transitive reachability over CALLS and ROUTES_TO edges, between
+Function and Endpoint nodes, so questions such as "which endpoints can reach
+`run_heavy_computation`" are answered with a bit test instead of a BFS.
+
+The call graph is condensed into its strongly connected components (SCCs),
+which form a DAG. Walking that DAG in reverse topological order, each SCC gets
+a closure bitset (a Python int) of every SCC it can reach; ancestor bitsets are
+the transpose. Nodes in the same SCC share a bitset, so recursion and mutual
+recursion cost nothing extra.
+
+The index is stored as graph attributes (JSON strings, since GraphML only
+supports scalar values) plus an `scc` attribute on every indexed node. An index
+persisted over other edge types (older graphs indexed CALLS only) is not
+loaded, so it is rebuilt.
+"""
+import json
+
+import networkx as nx
+
+REACH_EDGE_TYPES = ('CALLS', 'ROUTES_TO')
+REACH_NODE_TYPES = ('Function', 'Endpoint')
+
+
+def _iter_bits(bits: int):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+def build_reachability_index(graph, edge_types=REACH_EDGE_TYPES, node_types=REACH_NODE_TYPES) -> dict:
+    """
+    Computes the SCC condensation and closure bitsets for edges of `edge_types`.
+    Every node of `node_types` is indexed, even if it has no such edges.
+    """
+    subgraph = nx.DiGraph()
+    subgraph.add_nodes_from(n for n, t in graph.nodes(data='type') if t in node_types)
+    subgraph.add_edges_from((u, v) for u, v, t in graph.edges(data='type')
+                            if t in edge_types and u in subgraph and v in subgraph)
+
+    condensed = nx.condensation(subgraph)
+    members = [sorted(condensed.nodes[c]['members']) for c in range(condensed.number_of_nodes())]
+    cyclic = [len(members[c]) > 1 or subgraph.has_edge(members[c][0], members[c][0])
+              for c in range(len(members))]
+
+    descendants = [0] * len(members)
+    for c in reversed(list(nx.topological_sort(condensed))):
+        bits = 1 << c if cyclic[c] else 0
+        for succ in condensed.successors(c):
+            bits |= (1 << succ) | descendants[succ]
+        descendants[c] = bits
+
+    ancestors = [0] * len(members)
+    for c, bits in enumerate(descendants):
+        for d in _iter_bits(bits):
+            ancestors[d] |= 1 << c
+
+    return {
+        'edge_types': list(edge_types),
+        'members': members,
+        'descendants': descendants,
+        'ancestors': ancestors,
+    }
+
+
+def attach_reachability_index(graph, index: dict):
+    """Stores the index on the graph so it is persisted with the GraphML file."""
+    for c, nodes in enumerate(index['members']):
+        for node in nodes:
+            graph.nodes[node]['scc'] = c
+    graph.graph.pop('reach_edge_type', None)
+    graph.graph['reach_edge_types'] = json.dumps(index['edge_types'])
+    graph.graph['reach_members'] = json.dumps(index['members'])
+    graph.graph['reach_descendants'] = json.dumps([format(b, 'x') for b in index['descendants']])
+    graph.graph['reach_ancestors'] = json.dumps([format(b, 'x') for b in index['ancestors']])
+
+
+def load_reachability_index(graph, edge_types=REACH_EDGE_TYPES):
+    """Reads a persisted index over `edge_types` back from graph attributes, or returns None."""
+    if 'reach_members' not in graph.graph or 'reach_edge_types' not in graph.graph:
+        return None
+    if json.loads(graph.graph['reach_edge_types']) != list(edge_types):
+        return None
+    return {
+        'edge_types': list(edge_types),
+        'members': json.loads(graph.graph['reach_members']),
+        'descendants': [int(b, 16) for b in json.loads(graph.graph['reach_descendants'])],
+        'ancestors': [int(b, 16) for b in json.loads(graph.graph['reach_ancestors'])],
+    }
+
+
+class ReachabilityIndex:
+    """Answers reachability, descendant and ancestor queries from an index dict."""
+    def __init__(self, index: dict):
+        self.edge_types = index['edge_types']
+        self.members = index['members']
+        self.descendant_bits = index['descendants']
+        self.ancestor_bits = index['ancestors']
+        self.scc_of = {node: c for c, nodes in enumerate(self.members) for node in nodes}
+
+    def __contains__(self, node):
+        return node in self.scc_of
+
+    def can_reach(self, src: str, dst: str) -> bool:
+        """True if `dst` is reachable from `src` over one or more edges."""
+        if src not in self.scc_of or dst not in self.scc_of:
+            return False
+        return bool(self.descendant_bits[self.scc_of[src]] >> self.scc_of[dst] & 1)
+
+    def _expand(self, bits: int, exclude: str) -> list[str]:
+        return [node for c in _iter_bits(bits) for node in self.members[c] if node != exclude]
+
+    def descendants(self, node: str) -> list[str]:
+        if node not in self.scc_of:
+            return []
+        return self._expand(self.descendant_bits[self.scc_of[node]], node)
+
+    def ancestors(self, node: str) -> list[str]:
+        if node not in self.scc_of:
+            return []
+        return self._expand(self.ancestor_bits[self.scc_of[node]], node)
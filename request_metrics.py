@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Request Metrics
+
+WSGI middleware for buggy_app.py that records, per route (the URL rule, e.g.
+`/jobs/<job_id>`, so IDs do not explode the key space; unrouted paths share
+`<unmatched>`):
+
+- an HDR-style latency histogram: log-linear buckets with 2 significant
+  digits (relative error under 1%) from 1 µs to over an hour, so p99/p99.9
+  are exact to within a bucket instead of a log2 bucket's factor of two;
+- status code counts, error (5xx) count and the number in flight;
+
+and for the whole process: requests in flight, the peak, time-weighted mean
+concurrency (Little's law L = λW) and, when the request thread count is
+known, thread-pool occupancy. snapshot() is JSON-ready and served at /metrics
+as input for root-cause analysis.
+
+Recording costs one clock read at each end of a request and a short critical
+section: a few microseconds.
+"""
+import threading
+import time
+from collections import Counter
+
+SUB_BUCKET_BITS = 8                      # 256 sub-buckets: 2 significant digits
+SUB_BUCKET_HALF = 1 << (SUB_BUCKET_BITS - 1)
+MAX_TRACKABLE_US = 1 << 42               # ~51 days; larger values are clamped
+UNMATCHED_ROUTE = '<unmatched>'
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def _index(value):
+    bucket = max(0, value.bit_length() - SUB_BUCKET_BITS)
+    return (bucket << (SUB_BUCKET_BITS - 1)) + (value >> bucket)
+
+
+def _bounds(index):
+    """Lowest and highest value that fall into counts[index]."""
+    bucket = max(0, (index >> (SUB_BUCKET_BITS - 1)) - 1)
+    lowest = (index - (bucket << (SUB_BUCKET_BITS - 1))) << bucket
+    return lowest, lowest + (1 << bucket) - 1
+
+
+class HdrHistogram:
+    """Log-linear histogram of integer microseconds (HdrHistogram layout). Callers serialise record()."""
+    def __init__(self, max_value: int = MAX_TRACKABLE_US):
+        self.max_value = max_value
+        self.counts = [0] * (_index(max_value) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_us: int):
+        value_us = min(max(value_us, 0), self.max_value)
+        self.counts[_index(value_us)] += 1
+        self.count += 1
+        self.total += value_us
+        if value_us > self.max:
+            self.max = value_us
+        if self.min is None or value_us < self.min:
+            self.min = value_us
+
+    def merge(self, other: 'HdrHistogram'):
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def percentiles(self, percentiles=PERCENTILES) -> dict:
+        """Value at each percentile: the highest value of the bucket holding that rank, capped at max."""
+        result = {}
+        if not self.count:
+            return {p: 0 for p in percentiles}
+        targets = sorted((max(1, -(-self.count * p // 100)), p) for p in percentiles)
+        seen, t = 0, 0
+        for i, n in enumerate(self.counts):
+            if not n:
+                continue
+            seen += n
+            while t < len(targets) and seen >= targets[t][0]:
+                result[targets[t][1]] = min(_bounds(i)[1], self.max)
+                t += 1
+            if t == len(targets):
+                break
+        return result
+
+    def buckets(self) -> dict:
+        """Non-empty buckets as {highest value in µs: count}."""
+        return {_bounds(i)[1]: n for i, n in enumerate(self.counts) if n}
+
+    def to_dict(self, buckets: bool = False) -> dict:
+        d = {
+            'count': self.count,
+            'mean_us': round(self.total / self.count, 1) if self.count else 0.0,
+            'min_us': self.min or 0,
+            'max_us': self.max,
+            **{f"p{p:g}_us": value for p, value in self.percentiles().items()},
+        }
+        if buckets:
+            d['buckets_us'] = self.buckets()
+        return d
+
+
+class _RouteStats:
+    __slots__ = ('latency', 'statuses', 'in_flight', 'errors')
+
+    def __init__(self):
+        self.latency = HdrHistogram()
+        self.statuses = Counter()
+        self.in_flight = 0
+        self.errors = 0
+
+
+class RequestMetrics:
+    """Per-route latency, status and concurrency metrics; thread-safe."""
+    def __init__(self, capacity: int = None, clock=time.perf_counter):
+        self.capacity = capacity        # request threads per process, when known
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._routes = {}               # (method, route) -> _RouteStats
+        self.started = clock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self._busy_integral = 0.0       # sum of in_flight over time, in request-seconds
+        self._changed_at = self.started
+
+    def _concurrency_changed(self, now, delta):
+        self._busy_integral += self.in_flight * (now - self._changed_at)
+        self._changed_at = now
+        self.in_flight += delta
+        if self.in_flight > self.max_in_flight:
+            self.max_in_flight = self.in_flight
+
+    def begin(self) -> float:
+        now = self.clock()
+        with self._lock:
+            self._concurrency_changed(now, 1)
+        return now
+
+    def route_started(self, method: str, route: str):
+        """Counts the request as in flight on its route, once routing has matched it."""
+        with self._lock:
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = _RouteStats()
+            stats.in_flight += 1
+
+    def end(self, start: float, method: str, route: str, status: int, routed: bool):
+        now = self.clock()
+        elapsed_us = int((now - start) * 1e6)
+        with self._lock:
+            self._concurrency_changed(now, -1)
+            self.requests += 1
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = _RouteStats()
+            if routed:
+                stats.in_flight -= 1
+            stats.latency.record(elapsed_us)
+            stats.statuses[status] += 1
+            if status >= 500:
+                stats.errors += 1
+
+    def snapshot(self, buckets: bool = False) -> dict:
+        now = self.clock()
+        with self._lock:
+            uptime = now - self.started
+            busy = self._busy_integral + self.in_flight * (now - self._changed_at)
+            routes = {}
+            for (method, route), stats in sorted(self._routes.items(), key=lambda item: (item[0][1], item[0][0])):
+                count = stats.latency.count
+                routes[f"{method} {route}"] = {
+                    'requests': count,
+                    'rate_per_s': round(count / uptime, 3) if uptime else 0.0,
+                    'errors': stats.errors,
+                    'error_rate': round(stats.errors / count, 4) if count else 0.0,
+                    'in_flight': stats.in_flight,
+                    'statuses': {str(code): n for code, n in sorted(stats.statuses.items())},
+                    'latency': stats.latency.to_dict(buckets),
+                }
+            process = {
+                'uptime_s': round(uptime, 3),
+                'requests': self.requests,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'mean_concurrency': round(busy / uptime, 4) if uptime else 0.0,
+                'threads': threading.active_count(),
+                'capacity': self.capacity,
+                'occupancy': round(busy / uptime / self.capacity, 4) if uptime and self.capacity else None,
+            }
+        return {'process': process, 'routes': routes}
+
+
+class MetricsMiddleware:
+    """
+    WSGI middleware feeding a RequestMetrics. Times the whole application call,
+    including errors (counted as 500). The route name comes from the framework
+    through environ['request_metrics.route'] (see instrument_flask).
+    """
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    def __call__(self, environ, start_response):
+        start = self.metrics.begin()
+        status = [500]
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status[0] = int(status_line[:3])
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.app(environ, recording_start_response)
+        finally:
+            route = environ.get('request_metrics.route')
+            self.metrics.end(start, environ.get('REQUEST_METHOD', ''), route or UNMATCHED_ROUTE, status[0],
+                             routed=route is not None)
+
+
+def instrument_flask(app, metrics: RequestMetrics) -> RequestMetrics:
+    """Wraps a Flask app's WSGI callable with MetricsMiddleware, naming requests by their URL rule."""
+    from flask import request
+
+    @app.before_request
+    def _record_route():
+        rule = request.url_rule
+        route = rule.rule if rule is not None else UNMATCHED_ROUTE
+        request.environ['request_metrics.route'] = route
+        metrics.route_started(request.method, route)
+
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics)
+    return metrics
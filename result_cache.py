@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Query Result Cache
+
+ResultCache memoises expensive lookups (product searches in buggy_app.py) with:
+
+- LRU eviction once `max_entries` is reached, and a TTL after which an entry
+  is treated as a miss, so results are at most `ttl` seconds stale;
+- single-flight loading: concurrent misses for one key wait for the first
+  caller's computation instead of running their own, so a burst of identical
+  queries costs one backend call (a "cache stampede" otherwise);
+- metrics: hits, misses, coalesced waits, LRU evictions, expirations, load
+  errors and a load-time histogram, served by buggy_app.py at /debug/cache.
+
+A failed load is not cached; its exception is raised in every caller waiting
+on it. clear() drops every entry and makes loads already in flight discard
+their result, so a reload (e.g. of the catalog) is never overwritten by data
+computed before it.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from lock_profiler import LatencyHistogram
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL = 5.0             # seconds
+DEFAULT_WAIT_TIMEOUT = 5.0    # how long a coalesced caller waits before loading itself
+
+
+class _Flight:
+    """One in-progress load that concurrent callers of the same key wait on."""
+    __slots__ = ('done', 'value', 'error', 'generation')
+
+    def __init__(self, generation):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.generation = generation
+
+
+class ResultCache:
+    """A thread-safe LRU + TTL cache with single-flight loading. Cached values are shared: do not mutate them."""
+    def __init__(self, name: str, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.clock = clock
+        self._entries = OrderedDict()   # key -> (expires_at, value), least recently used first
+        self._flights = {}              # key -> _Flight
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.wait_timeouts = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.load_errors = 0
+        self.load_times = LatencyHistogram()
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for `key`, calling `loader()` at most once across concurrent misses."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            flight = self._flights.get(key)
+            if flight is None:
+                self.misses += 1
+                flight = self._flights[key] = _Flight(self._generation)
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if flight.done.wait(self.wait_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                return flight.value
+            with self._lock:
+                self.wait_timeouts += 1
+            return loader()
+
+        start = time.perf_counter()
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self.load_errors += 1
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.error = e
+            flight.done.set()
+            raise
+        with self._lock:
+            self.load_times.record(time.perf_counter() - start)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            if flight.generation == self._generation:
+                self._entries[key] = (self.clock() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        flight.value = value
+        flight.done.set()
+        return value
+
+    def invalidate(self, key) -> bool:
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        """Drops every entry; loads already in flight will not store their results."""
+        with self._lock:
+            self._entries.clear()
+            self._flights.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                'in_flight': len(self._flights),
+                'wait_timeouts': self.wait_timeouts,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'load_errors': self.load_errors,
+                'load': self.load_times.to_dict(),
+            }
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Route Index
+
+Maps raw HTTP request lines from access logs to the handler functions in the
+Code Intelligence Graph. Endpoint nodes (extracted by build_graph.py from
+`@app.route(...)` decorators) are compiled into a segment trie, so matching a
+path costs one dict lookup per path segment regardless of how many routes
+exist. Literal segments win over `{param}` segments, as in Flask.
+"""
+import re
+from collections import Counter
+
+# Matches the request part and status of a combined-format access log line:
+#   ... "GET /api/v1/orders/status/1234 HTTP/1.1" 503 812 "-" "curl/7.68.0" 0.412s
+ACCESS_LOG_PATTERN = re.compile(r'"(?P<method>[A-Z]+) (?P<path>\S+) HTTP/[\d.]+" (?P<status>\d{3})')
+
+_FLASK_PARAM = re.compile(r'<(?:[^:<>]+:)?([^<>]+)>')
+
+
+def flask_rule_to_template(rule: str) -> str:
+    """Converts a Flask rule such as `/orders/<int:id>` to `/orders/{id}`."""
+    return _FLASK_PARAM.sub(r'{\1}', rule)
+
+
+def _segments(path: str) -> list[str]:
+    return [segment for segment in path.split('?', 1)[0].split('/') if segment]
+
+
+class _TrieNode:
+    __slots__ = ('literals', 'param', 'param_name', 'handlers')
+
+    def __init__(self):
+        self.literals = {}
+        self.param = None
+        self.param_name = None
+        self.handlers = {}   # HTTP method -> (handler, template)
+
+
+class RouteTrie:
+    """A compiled path-template matcher keyed by path segments and HTTP method."""
+    def __init__(self):
+        self.root = _TrieNode()
+        self.size = 0
+
+    def insert(self, method: str, template: str, handler: str):
+        node = self.root
+        for segment in _segments(template):
+            if segment.startswith('{') and segment.endswith('}'):
+                if node.param is None:
+                    node.param = _TrieNode()
+                    node.param_name = segment[1:-1]
+                node = node.param
+            else:
+                node = node.literals.setdefault(segment, _TrieNode())
+        node.handlers[method.upper()] = (handler, template)
+        self.size += 1
+
+    def _find(self, node, segments, index, params):
+        if index == len(segments):
+            return node if node.handlers else None
+        child = node.literals.get(segments[index])
+        if child is not None:
+            found = self._find(child, segments, index + 1, params)
+            if found is not None:
+                return found
+        if node.param is not None:
+            params[node.param_name] = segments[index]
+            found = self._find(node.param, segments, index + 1, params)
+            if found is not None:
+                return found
+            del params[node.param_name]
+        return None
+
+    def match(self, method: str, path: str):
+        """
+        Returns (handler, template, params) for a request, or None. HEAD falls
+        back to GET handlers, as in Flask.
+        """
+        params = {}
+        node = self._find(self.root, _segments(path), 0, params)
+        if node is None:
+            return None
+        method = method.upper()
+        entry = node.handlers.get(method) or (node.handlers.get('GET') if method == 'HEAD' else None)
+        if entry is None:
+            return None
+        return entry[0], entry[1], params
+
+
+def build_route_trie(graph) -> RouteTrie:
+    """Compiles every Endpoint node and its ROUTES_TO handler into a RouteTrie."""
+    trie = RouteTrie()
+    for node, data in graph.nodes(data=True):
+        if data.get('type') != 'Endpoint':
+            continue
+        for handler in graph.successors(node):
+            if graph[node][handler].get('type') == 'ROUTES_TO':
+                trie.insert(data['method'], data['path'], handler)
+    return trie
+
+
+def resolve_access_log(trie: RouteTrie, lines, min_status: int = 500) -> dict:
+    """
+    Aggregates access log lines with status >= min_status by handler function.
+
+    Returns {'handlers': {handler: {'count', 'statuses', 'routes'}},
+             'unmatched': Counter of 'METHOD /path' that no route matches}.
+    """
+    handlers, unmatched = {}, Counter()
+    for line in lines:
+        match = ACCESS_LOG_PATTERN.search(line)
+        if not match or int(match.group('status')) < min_status:
+            continue
+        method, path, status = match.group('method'), match.group('path'), match.group('status')
+        resolved = trie.match(method, path)
+        if resolved is None:
+            unmatched[f"{method} {path.split('?', 1)[0]}"] += 1
+            continue
+        handler, template, _ = resolved
+        entry = handlers.setdefault(handler, {'count': 0, 'statuses': Counter(), 'routes': Counter()})
+        entry['count'] += 1
+        entry['statuses'][status] += 1
+        entry['routes'][f"{method} {template}"] += 1
+    return {'handlers': handlers, 'unmatched': unmatched}
@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Product Search Index
+
+An in-process replacement for the unindexed product query in buggy_app.py:
+
+- an inverted index from terms (lower-cased words of the product name and
+  category) to products. A term's postings are bucketed by impact level (name
+  vs category match, in stock vs out of stock), so its best matches are
+  visited first. Terms in at least BITMAP_MIN_DF products also keep their
+  postings as bitmaps split into fixed-size blocks (Python ints, as in
+  reachability.py), so intersecting common words costs a few int ANDs per
+  block instead of a set walk;
+- a term trie for typeahead. The last word of a query is treated as a prefix
+  and expanded to the most common terms it completes to. Each trie node
+  keeps its top completions cached, patched as term counts change;
+- ranked retrieval. A product must match every query word. Its score is the
+  sum over words of idf(term) * impact, so name matches beat category matches,
+  rare words count more than common ones, and in-stock products outrank
+  out-of-stock ones. Queries of common words intersect bitmaps, level by
+  level in descending score order; otherwise posting buckets are scored in
+  descending value order, cheapest word first. Either way the scan stops as
+  soon as nothing left can enter the top `limit`.
+
+Stock changes move a product between impact levels in O(terms), so the index
+can be kept in step with INVENTORY on every order; adding or removing a
+product touches only its own terms.
+
+    python benchmarks/search_index_benchmark.py --products 1000000
+"""
+import heapq
+import json
+import math
+import re
+import sys
+import threading
+from itertools import zip_longest
+
+NAME_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.0
+OUT_OF_STOCK_FACTOR = 0.25
+PREFIX_EXPANSIONS = 16    # terms a typeahead prefix expands to (also the per-node cache size)
+DEFAULT_LIMIT = 10
+
+BITMAP_MIN_DF = 1024      # terms in at least this many products also get bitmaps
+BITMAP_BLOCK_BITS = 14    # products per bitmap block: 2**14
+DIRECT_SCORE_FACTOR = 2   # intersections of up to this many times `limit` are scored product by product
+_BLOCK_MASK = (1 << BITMAP_BLOCK_BITS) - 1
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def _field_weights(name: str, category: str) -> dict:
+    """term -> combined field weight for one product."""
+    weights = {}
+    for term in set(tokenize(name)):
+        weights[term] = NAME_WEIGHT
+    for term in set(tokenize(category)):
+        weights[term] = weights.get(term, 0.0) + CATEGORY_WEIGHT
+    return weights
+
+
+def _impact(field_weight: float, stock: int) -> float:
+    return field_weight if stock > 0 else field_weight * OUT_OF_STOCK_FACTOR
+
+
+def _set_bit(blocks: list, doc: int):
+    block = doc >> BITMAP_BLOCK_BITS
+    if block >= len(blocks):
+        blocks.extend([0] * (block + 1 - len(blocks)))
+    blocks[block] |= 1 << (doc & _BLOCK_MASK)
+
+
+def _clear_bit(blocks: list, doc: int):
+    block = doc >> BITMAP_BLOCK_BITS
+    if block < len(blocks):
+        blocks[block] &= ~(1 << (doc & _BLOCK_MASK))
+
+
+def _bitmap(docs, size: int) -> list[int]:
+    """Blocked bitmap of `docs`, built through a bytearray (far cheaper than per-bit int ops)."""
+    data = bytearray((size + 7) >> 3)
+    for doc in docs:
+        data[doc >> 3] |= 1 << (doc & 7)
+    step = 1 << (BITMAP_BLOCK_BITS - 3)
+    return [int.from_bytes(data[i:i + step], 'little') for i in range(0, len(data), step)]
+
+
+def _union(bitmaps) -> list[int]:
+    result = []
+    for blocks in bitmaps:
+        result = [a | b for a, b in zip_longest(result, blocks, fillvalue=0)]
+    return result
+
+
+def _iter_bits(blocks):
+    """Set bits of a blocked bitmap, in ascending order."""
+    for index, bits in enumerate(blocks):
+        base = index << BITMAP_BLOCK_BITS
+        while bits:
+            low = bits & -bits
+            yield base + low.bit_length() - 1
+            bits ^= low
+
+
+def _best_combinations(slots):
+    """
+    Yields (score, picks) over one bucket from each slot, in descending total
+    value. Each slot is a list of buckets sorted by descending value.
+    """
+    start = (0,) * len(slots)
+    heap, seen = [(-sum(buckets[0][0] for buckets in slots), start)], {start}
+    while heap:
+        negated, picks = heapq.heappop(heap)
+        yield -negated, [buckets[i] for buckets, i in zip(slots, picks)]
+        for k, buckets in enumerate(slots):
+            if picks[k] + 1 < len(buckets):
+                following = picks[:k] + (picks[k] + 1,) + picks[k + 1:]
+                if following not in seen:
+                    seen.add(following)
+                    heapq.heappush(heap, (negated + buckets[picks[k]][0] - buckets[picks[k] + 1][0], following))
+
+
+class _TrieNode:
+    __slots__ = ('children', 'is_term', 'top', 'generation')
+
+    def __init__(self):
+        self.children = {}
+        self.is_term = False
+        self.top = None
+        self.generation = -1
+
+
+class TermTrie:
+    """
+    Character trie over the index vocabulary. complete() returns the most
+    frequent terms under a prefix; the answer is cached on the prefix node.
+    When a term's count changes, changed() patches the caches on its path;
+    invalidate() drops them all at once (one counter bump) after bulk loads.
+    """
+    def __init__(self, counts: dict):
+        self.root = _TrieNode()
+        self.counts = counts      # term -> number of products containing it
+        self.generation = 0
+
+    def insert(self, term: str):
+        node = self.root
+        for char in term:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        node.is_term = True
+
+    def remove(self, term: str):
+        node = self._find(term)
+        if node is not None:
+            node.is_term = False
+
+    def changed(self, term: str, increased: bool):
+        """
+        Re-ranks `term` in the cached completions on its path after its count
+        changed. A count that grew can only move the term up, so caches are
+        patched in place; one that shrank drops a full cache holding the term,
+        since a term outside it may now rank higher.
+        """
+        count = self.counts.get(term, 0)
+        rank = lambda t: (-self.counts.get(t, 0), t)
+        node = self.root
+        for depth in range(len(term) + 1):
+            if depth:
+                node = node.children.get(term[depth - 1])
+                if node is None:
+                    return
+            if node.generation != self.generation:
+                continue
+            top = node.top
+            if increased:
+                if term not in top:
+                    if len(top) == PREFIX_EXPANSIONS and rank(term) > rank(top[-1]):
+                        continue
+                    top.append(term)
+                top.sort(key=rank)
+                del top[PREFIX_EXPANSIONS:]
+            elif term in top:
+                if len(top) == PREFIX_EXPANSIONS:
+                    node.generation = -1
+                elif count:
+                    top.sort(key=rank)
+                else:
+                    top.remove(term)
+
+    def invalidate(self):
+        self.generation += 1
+
+    def warm(self, depth: int = 2):
+        """Fills the caches of every prefix up to `depth` characters long."""
+        level = [(self.root, '')]
+        for _ in range(depth):
+            level = [(child, text + char) for node, text in level for char, child in node.children.items()]
+            for _, text in level:
+                self.complete(text)
+
+    def _find(self, prefix: str):
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def complete(self, prefix: str, limit: int = PREFIX_EXPANSIONS) -> list[str]:
+        """Terms starting with `prefix`, most frequent first (ties alphabetical)."""
+        node = self._find(prefix)
+        if node is None:
+            return []
+        if limit <= PREFIX_EXPANSIONS and node.generation == self.generation:
+            return node.top[:limit]
+        terms, stack = [], [(node, prefix)]
+        while stack:
+            current, text = stack.pop()
+            if current.is_term:
+                terms.append(text)
+            stack.extend((child, text + char) for char, child in current.children.items())
+        top = heapq.nsmallest(max(limit, PREFIX_EXPANSIONS), terms, key=lambda t: (-self.counts.get(t, 0), t))
+        node.top, node.generation = top[:PREFIX_EXPANSIONS], self.generation
+        return top[:limit]
+
+
+class ProductSearchIndex:
+    """Thread-safe inverted index over product names and categories."""
+    def __init__(self):
+        self._ids = []            # doc -> product id (None once removed)
+        self._names = []
+        self._categories = []
+        self._stock = []
+        self._docs = {}           # product id -> doc
+        self._postings = {}       # term -> {impact: set(doc)}
+        self._counts = {}         # term -> document frequency
+        self._level_bits = {}     # common term -> {impact: blocked bitmap}
+        self._term_bits = {}      # common term -> blocked bitmap of every level
+        self._trie = TermTrie(self._counts)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    # --- updates ---
+
+    def _build_bitmaps(self, term):
+        size = len(self._ids)
+        levels = self._level_bits[term] = {impact: _bitmap(docs, size)
+                                           for impact, docs in self._postings[term].items()}
+        self._term_bits[term] = _union(levels.values())
+
+    def _add(self, product_id, name, category, stock, bulk=False):
+        if product_id in self._docs:
+            self._remove(product_id)
+        doc = len(self._ids)
+        category = sys.intern(category or '')
+        self._ids.append(product_id)
+        self._names.append(name or '')
+        self._categories.append(category)
+        self._stock.append(stock)
+        self._docs[product_id] = doc
+        for term, weight in _field_weights(name, category).items():
+            levels = self._postings.get(term)
+            if levels is None:
+                levels = self._postings[term] = {}
+                self._counts[term] = 0
+                self._trie.insert(term)
+            impact = _impact(weight, stock)
+            levels.setdefault(impact, set()).add(doc)
+            self._counts[term] += 1
+            if term in self._term_bits:
+                _set_bit(self._level_bits[term].setdefault(impact, []), doc)
+                _set_bit(self._term_bits[term], doc)
+            elif not bulk and self._counts[term] >= BITMAP_MIN_DF:
+                self._build_bitmaps(term)
+            if not bulk:
+                self._trie.changed(term, increased=True)
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id)
+        for term, weight in _field_weights(self._names[doc], self._categories[doc]).items():
+            levels = self._postings[term]
+            impact = _impact(weight, self._stock[doc])
+            levels[impact].discard(doc)
+            if not levels[impact]:
+                del levels[impact]
+            self._counts[term] -= 1
+            if term in self._term_bits:
+                if self._counts[term] < BITMAP_MIN_DF // 2:
+                    del self._level_bits[term], self._term_bits[term]
+                else:
+                    _clear_bit(self._level_bits[term][impact], doc)
+                    _clear_bit(self._term_bits[term], doc)
+            if not self._counts[term]:
+                del self._postings[term], self._counts[term]
+                self._trie.remove(term)
+            self._trie.changed(term, increased=False)
+        self._ids[doc] = self._names[doc] = self._categories[doc] = None
+
+    def add_product(self, product_id, name: str, category: str = '', stock: int = 0):
+        """Adds a product, or re-indexes it if the id is already present."""
+        with self._lock:
+            self._add(product_id, name, category, stock)
+
+    def add_products(self, products):
+        """Bulk-loads dicts with id, name, category and stock."""
+        with self._lock:
+            for product in products:
+                self._add(product['id'], product['name'], product.get('category', ''),
+                          product.get('stock', 0), bulk=True)
+            for term, count in self._counts.items():
+                if count >= BITMAP_MIN_DF and term not in self._term_bits:
+                    self._build_bitmaps(term)
+            self._trie.invalidate()
+            self._trie.warm()
+
+    def remove_product(self, product_id) -> bool:
+        with self._lock:
+            if product_id not in self._docs:
+                return False
+            self._remove(product_id)
+            return True
+
+    def update_stock(self, product_id, stock: int) -> bool:
+        """
+        Records a stock level. Crossing zero moves the product between impact
+        levels of each of its terms; other changes only update the stored level.
+        """
+        with self._lock:
+            doc = self._docs.get(product_id)
+            if doc is None:
+                return False
+            previous, self._stock[doc] = self._stock[doc], stock
+            if (previous > 0) == (stock > 0):
+                return True
+            for term, weight in _field_weights(self._names[doc], self._categories[doc]).items():
+                levels = self._postings[term]
+                old, new = _impact(weight, previous), _impact(weight, stock)
+                levels[old].discard(doc)
+                if not levels[old]:
+                    del levels[old]
+                levels.setdefault(new, set()).add(doc)
+                if term in self._level_bits:
+                    _clear_bit(self._level_bits[term][old], doc)
+                    _set_bit(self._level_bits[term].setdefault(new, []), doc)
+            return True
+
+    # --- queries ---
+
+    def _slot(self, terms):
+        """
+        The buckets one query word matches, as (value, docs, bitmap or None)
+        sorted best first, with their total size and, when every term has
+        bitmaps, the word's combined bitmap.
+        """
+        total = len(self._docs) or 1
+        buckets, size, bitmaps = [], 0, []
+        for term in terms:
+            levels = self._postings.get(term)
+            if not levels:
+                continue
+            idf = math.log(1 + total / self._counts[term])
+            level_bits = self._level_bits.get(term, {})
+            bitmaps.append(self._term_bits.get(term))
+            for impact, docs in levels.items():
+                buckets.append((idf * impact, docs, level_bits.get(impact)))
+                size += len(docs)
+        buckets.sort(key=lambda bucket: -bucket[0])
+        dense = bool(bitmaps) and None not in bitmaps
+        return {'buckets': buckets, 'size': size, 'bits': _union(bitmaps) if dense else None}
+
+    def _expand(self, prefix):
+        terms = self._trie.complete(prefix)
+        if prefix in self._counts and prefix not in terms:
+            terms.append(prefix)
+        return terms
+
+    @staticmethod
+    def _value(slot, doc):
+        """Best value `doc` gets from a slot, or None if it does not match the word."""
+        for value, docs, _ in slot['buckets']:
+            if doc in docs:
+                return value
+        return None
+
+    def _search_postings(self, slots, limit):
+        """
+        Bucket at a time: scores every unseen doc of the smallest of the words'
+        best remaining buckets, then moves that word on. A doc not seen yet is
+        in a remaining bucket of every word, so once those buckets' values sum
+        to no more than the `limit`-th best score, or a word runs out of
+        buckets, nothing unseen can rank.
+        """
+        positions = [0] * len(slots)
+        heap, seen = [], set()
+        while True:
+            tops = [slot['buckets'][i] for slot, i in zip(slots, positions)]
+            bound = sum(top[0] for top in tops)
+            if len(heap) == limit and bound <= heap[0][0]:
+                break
+            k = min(range(len(slots)), key=lambda k: len(tops[k][1]))
+            value, docs, _ = tops[k]
+            others = slots[:k] + slots[k + 1:]
+            for doc in docs:
+                if doc in seen:
+                    continue
+                seen.add(doc)
+                score = value
+                for slot in others:
+                    best = self._value(slot, doc)
+                    if best is None:
+                        break
+                    score += best
+                else:
+                    entry = (score, -doc)
+                    if len(heap) < limit:
+                        heapq.heappush(heap, entry)
+                    elif entry > heap[0]:
+                        heapq.heapreplace(heap, entry)
+                    elif bound <= heap[0][0]:
+                        break   # every later doc in this bucket scores at most the bound
+            positions[k] += 1
+            if positions[k] == len(slots[k]['buckets']):
+                break
+        return [(score, -negated) for score, negated in sorted(heap, reverse=True)]   # ties: lower doc first
+
+    def _search_bitmaps(self, slots, limit):
+        """Words that all have bitmaps: intersect them, then walk level combinations best first."""
+        mask = slots[0]['bits']
+        for slot in slots[1:]:
+            mask = [a & b for a, b in zip(mask, slot['bits'])]
+        direct_limit, matches = limit * DIRECT_SCORE_FACTOR, 0
+        for bits in mask:
+            matches += bits.bit_count()
+            if matches > direct_limit:
+                break
+        if not matches:
+            return []
+        if matches <= direct_limit:
+            scored = ((sum(self._value(slot, doc) for slot in slots), -doc) for doc in _iter_bits(mask))
+            return [(score, -negated) for score, negated in heapq.nlargest(limit, scored)]
+
+        hits, seen = [], set()
+        for score, picks in _best_combinations([slot['buckets'] for slot in slots]):
+            bitmaps = [bits for _, _, bits in picks]
+            for index, bits in enumerate(mask):
+                for level in bitmaps:
+                    bits &= level[index] if index < len(level) else 0
+                    if not bits:
+                        break
+                while bits:
+                    low = bits & -bits
+                    bits ^= low
+                    doc = (index << BITMAP_BLOCK_BITS) + low.bit_length() - 1
+                    if doc not in seen:   # a prefix word can match a doc through several terms
+                        seen.add(doc)
+                        hits.append((score, doc))
+                        if len(hits) == limit:
+                            return hits
+        return hits
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT, prefix: bool = True) -> list[dict]:
+        """
+        Returns up to `limit` products matching every word of `query`, best
+        first. With `prefix`, the last word also matches terms it starts, so
+        partially typed queries work.
+        """
+        words = tokenize(query)
+        if not words or limit <= 0:
+            return []
+        with self._lock:
+            slots = [self._slot([word]) for word in words[:-1]]
+            slots.append(self._slot(self._expand(words[-1]) if prefix else [words[-1]]))
+            if any(not slot['buckets'] for slot in slots):
+                return []
+            if len(slots) > 1 and all(slot['bits'] is not None for slot in slots):
+                hits = self._search_bitmaps(slots, limit)
+            else:
+                hits = self._search_postings(slots, limit)
+            return [{'id': self._ids[doc], 'name': self._names[doc], 'category': self._categories[doc],
+                     'stock': self._stock[doc], 'score': round(score, 4)} for score, doc in hits]
+
+    def suggest(self, query: str, limit: int = 5) -> list[str]:
+        """Typeahead completions of the last word of `query`, most common first."""
+        words = tokenize(query)
+        if not words or query[-1:].isspace():
+            return []
+        with self._lock:
+            head = ' '.join(words[:-1])
+            return [f"{head} {term}" if head else term for term in self._trie.complete(words[-1], limit)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'products': len(self._docs), 'terms': len(self._counts),
+                    'postings': sum(self._counts.values()), 'bitmap_terms': len(self._term_bits)}
+
+
+def load_catalog(path: str):
+    """Yields products from a JSON-lines file of {"id", "name", "category", "stock"} objects."""
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
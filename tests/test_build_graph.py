@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import textwrap
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from build_graph import CodeGraphBuilder  # noqa: E402
+from runtime_tracer import STALE_ATTR, merge_runtime_profile  # noqa: E402
+
+MAPPINGS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'graph_mappings.json')
+
+
+def build(tmp_path, source, **modules):
+    for name, text in modules.items():
+        (tmp_path / f'{name}.py').write_text(textwrap.dedent(text))
+    path = tmp_path / 'app.py'
+    path.write_text(textwrap.dedent(source))
+    builder = CodeGraphBuilder(str(path), mappings_path=MAPPINGS)
+    builder.build()
+    return builder.graph
+
+
+def can_cause(graph, error):
+    return sorted(u for u, v, t in graph.edges(data='type') if t == 'CAN_CAUSE' and v == error)
+
+
+def test_env_var_read_reaches_functions_using_an_object_built_from_it(tmp_path):
+    graph = build(tmp_path, """
+        import os
+        from mailer import Mailer
+
+        SMTP_HOST = os.environ.get('SMTP_HOST')
+        MAILER = Mailer(SMTP_HOST)
+
+        def send_notification():
+            return MAILER.send('hello')
+
+        def unrelated():
+            return 1
+        """, mailer="""
+        class Mailer:
+            def __init__(self, host):
+                self.host = host
+        """)
+    assert can_cause(graph, 'environment_variable_missing') == ['send_notification']
+
+
+DISPATCH_APP = """
+    import time
+    from flask import Flask
+
+    app = Flask(__name__)
+
+    def slow_export():
+        time.sleep(1)
+
+    EXPORTERS = {'csv': slow_export}
+
+    @app.route('/export')
+    def export():
+        return EXPORTERS['csv']()
+    """
+
+
+def dispatch_profile():
+    """A runtime profile observing export -> slow_export, a call the AST cannot see."""
+    stats = {'samples': 10, 'seconds': 1.0, 'self_seconds': 1.0, 'calls': 1}
+    return {'duration': 1.0, 'samples': 10, 'interval': 0.005, 'overhead': 0.001,
+            'functions': {'export': stats, 'slow_export': stats},
+            'edges': [{'caller': 'export', 'callee': 'slow_export', **stats}]}
+
+
+def hazard_details(graph, function, error):
+    if not graph.has_edge(function, error):
+        return []
+    return [item['detail'] for item in json.loads(graph[function][error]['evidence'])]
+
+
+def test_runtime_calls_merged_during_a_build_feed_the_hazard_pass(tmp_path):
+    (tmp_path / 'app.py').write_text(textwrap.dedent(DISPATCH_APP))
+    builder = CodeGraphBuilder(str(tmp_path / 'app.py'), mappings_path=MAPPINGS)
+    builder.build(runtime_profile=dispatch_profile())
+    assert hazard_details(builder.graph, 'slow_export', 'thread_pool_exhaustion') == [
+        'blocking sleep time.sleep(1) reached from handler(s) export']
+    assert STALE_ATTR not in builder.graph.graph
+
+
+def test_merging_runtime_calls_into_a_built_graph_marks_its_analysis_stale(tmp_path):
+    graph = build(tmp_path, DISPATCH_APP)
+    assert hazard_details(graph, 'slow_export', 'thread_pool_exhaustion') == []
+    counts = merge_runtime_profile(graph, dispatch_profile())
+    assert counts['call_graph_changed'] and graph.graph[STALE_ATTR] is True
+    assert merge_runtime_profile(graph, dispatch_profile())['call_graph_changed'] is False
+
+
+def calls(graph, function):
+    return sorted(v for v, t in graph[function].items() if t.get('type') == 'CALLS')
+
+
+def test_local_modules_resolve_from_any_working_directory(tmp_path, monkeypatch):
+    app = tmp_path / 'app'
+    app.mkdir()
+    (app / 'jobs.py').write_text("def crunch():\n    return 1\n")
+    (app / 'main.py').write_text("from jobs import crunch\n\ndef handler():\n    return crunch()\n")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'jobs.py').write_text("def unrelated():\n    return 2\n")   # must not be picked up
+    builder = CodeGraphBuilder(os.path.join('app', 'main.py'), mappings_path=MAPPINGS)
+    builder.build()
+    assert calls(builder.graph, 'handler') == ['jobs.crunch']
+    assert builder.graph.nodes['jobs.crunch']['file'] == os.path.join('app', 'jobs.py')
+
+    monkeypatch.chdir(app)
+    builder = CodeGraphBuilder('main.py', mappings_path=MAPPINGS)
+    builder.build()
+    assert builder.graph.nodes['jobs.crunch']['file'] == 'jobs.py'
+
+
+def test_relative_imports_resolve_to_local_modules(tmp_path):
+    package = tmp_path / 'shop'
+    package.mkdir()
+    (tmp_path / 'shared.py').write_text("def audit():\n    return 0\n")
+    (package / 'helpers.py').write_text("def slow():\n    return 1\n\ndef fast():\n    return 2\n")
+    (package / 'app.py').write_text(textwrap.dedent("""
+        from . import helpers
+        from .helpers import slow
+        from .. import shared
+
+        def handler():
+            helpers.fast()
+            shared.audit()
+            return slow()
+        """))
+    builder = CodeGraphBuilder(str(package / 'app.py'), mappings_path=MAPPINGS)
+    builder.build()
+    assert calls(builder.graph, 'handler') == ['.shared.audit', 'helpers.fast', 'helpers.slow']
+    assert builder.graph.nodes['.shared.audit']['file'] == str(tmp_path / 'shared.py')
+    assert not any(name.startswith('None') for name in builder.graph)
@@ -0,0 +1,48 @@
+import os
+import sys
+
+import networkx as nx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from context_builder import ContextBuilder, MAX_HELPER_SCORE, estimate_tokens  # noqa: E402
+
+
+def function(name, body_lines=1):
+    body = "\n".join(f"    total_{i} = compute_{i}(value) + {i}" for i in range(body_lines))
+    return f"def {name}(value):\n{body}\n    return value\n"
+
+
+def make_graph(culprits, helper, hotness=1.0):
+    graph = nx.DiGraph()
+    for name in culprits + [helper]:
+        graph.add_node(name, type='Function', source_code=function(name, body_lines=3))
+    for name in culprits:
+        graph.add_edge(name, helper, type='CALLS', hotness=hotness)
+    return graph
+
+
+def test_helper_shared_by_three_culprits_ranks_below_them():
+    culprits = ['charge_card', 'reserve_stock', 'create_invoice']
+    graph = make_graph(culprits, 'load_customer')
+    builder = ContextBuilder(graph)
+    scores = builder.rank_functions(culprits)
+    assert scores['load_customer'] == MAX_HELPER_SCORE
+    assert all(scores[name] > scores['load_customer'] for name in culprits)
+
+    # Room for every culprit in full but not for the helper as well
+    culprit_tokens = sum(estimate_tokens(builder.build([name])['snippets'][0]['code']) for name in culprits)
+    context = ContextBuilder(graph, token_budget=culprit_tokens).build(culprits)
+    assert [s['name'] for s in context['snippets']] == culprits
+    assert not any(s['elided'] for s in context['snippets'])
+    assert context['omitted'] == ['load_customer']
+    assert context['tokens_over_budget'] == 0
+
+
+def test_culprit_signatures_over_budget_are_reported():
+    culprits = ['charge_card', 'reserve_stock', 'create_invoice']
+    context = ContextBuilder(make_graph(culprits, 'load_customer'), token_budget=5).build(culprits)
+    assert [s['name'] for s in context['snippets']] == culprits
+    assert all(s['elided'] for s in context['snippets'])
+    assert context['tokens_used'] > context['token_budget']
+    assert context['tokens_over_budget'] == context['tokens_used'] - context['token_budget']
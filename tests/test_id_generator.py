@@ -0,0 +1,82 @@
+import gc
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import weakref
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from id_generator import IdGenerator  # noqa: E402
+
+
+@pytest.fixture
+def lease_dir(tmp_path):
+    return str(tmp_path / 'leases')
+
+
+def generate(generator, count, results):
+    results.put((generator.worker_id, [generator.next_id() for _ in range(count)]))
+
+
+def test_ids_are_unique_across_threads_and_increase_per_thread(lease_dir):
+    generator = IdGenerator(lease_dir=lease_dir)
+    per_thread = []
+    def run():
+        ids = [generator.next_id() for _ in range(20000)]
+        per_thread.append(ids)
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(ids == sorted(ids) and len(set(ids)) == len(ids) for ids in per_thread)
+    assert len(set().union(*per_thread)) == 80000
+
+
+def test_forked_children_lease_their_own_worker_id_and_never_repeat_ids(lease_dir):
+    generator = IdGenerator(lease_dir=lease_dir)
+    parent_ids = [generator.next_id() for _ in range(1000)]
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    children = [context.Process(target=generate, args=(generator, 5000, results)) for _ in range(3)]
+    for child in children:
+        child.start()
+    reports = [results.get(timeout=30) for _ in children]
+    for child in children:
+        child.join()
+    parent_ids += [generator.next_id() for _ in range(1000)]
+
+    worker_ids = [generator.worker_id] + [worker_id for worker_id, _ in reports]
+    assert len(set(worker_ids)) == 4
+    all_ids = parent_ids + [id_ for _, ids in reports for id_ in ids]
+    assert len(set(all_ids)) == len(all_ids)
+
+
+def test_generators_in_one_process_lease_different_worker_ids(lease_dir):
+    first, second = IdGenerator(lease_dir=lease_dir), IdGenerator(lease_dir=lease_dir)
+    assert first.worker_id != second.worker_id
+
+
+def test_parse_recovers_the_fields_of_an_id(lease_dir):
+    generator = IdGenerator(worker_id=5, lease_dir=lease_dir)
+    before = time.time_ns() // 1_000_000
+    parsed = generator.parse(generator.next_id())
+    assert parsed['worker_id'] == 5
+    assert before <= parsed['timestamp_ms'] <= time.time_ns() // 1_000_000
+
+
+def test_explicit_worker_id_is_range_checked(lease_dir):
+    with pytest.raises(ValueError):
+        IdGenerator(worker_id=1024, lease_dir=lease_dir)
+
+
+def test_generators_are_not_kept_alive_by_the_fork_hook(lease_dir):
+    generator = IdGenerator(lease_dir=lease_dir)
+    ref = weakref.ref(generator)
+    del generator
+    gc.collect()
+    assert ref() is None
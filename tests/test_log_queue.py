@@ -0,0 +1,78 @@
+import logging
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_queue import BatchedFileHandler, QueueLogWriter  # noqa: E402
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    return tmp_path / 'app.log'
+
+
+def make_logger(writer, name):
+    logger = logging.getLogger(f'test_log_queue.{name}')
+    logger.handlers[:] = [writer.handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    return logger
+
+
+def lines(path):
+    return path.read_text().splitlines() if path.exists() else []
+
+
+def test_records_are_written_in_order_in_batches(log_file):
+    writer = QueueLogWriter([BatchedFileHandler(log_file)], batch_size=8).start()
+    logger = make_logger(writer, 'order')
+    for i in range(50):
+        logger.info('record %d', i)
+    writer.flush()
+    assert lines(log_file) == [f'record {i}' for i in range(50)]
+    stats = writer.stats()
+    assert stats['written'] == 50 and stats['max_batch'] <= 8
+    writer.stop()
+
+
+def test_records_after_stop_go_to_last_resort_without_reopening_the_file(log_file, capsys):
+    handler = BatchedFileHandler(log_file)
+    writer = QueueLogWriter([handler]).start()
+    logger = make_logger(writer, 'stopped')
+    logger.info('before stop')
+    writer.stop()
+    logger.info('after stop, quietly')
+    logger.error('after stop, loudly')
+    assert lines(log_file) == ['before stop']
+    assert handler.stream is None
+    assert capsys.readouterr().err == 'after stop, loudly\n'
+    assert writer.stats()['after_stop'] == 2
+    writer.start()
+    assert writer._thread is None
+
+
+def test_stop_writes_every_record_it_accepted_from_concurrent_threads(log_file):
+    writer = QueueLogWriter([BatchedFileHandler(log_file)], max_queue=16).start()
+    logger = make_logger(writer, 'race')
+    stop_now = threading.Event()
+
+    def log_records(n):
+        for i in range(5000):
+            logger.info('thread %d record %d', n, i)
+            if i == 200:
+                stop_now.set()
+
+    threads = [threading.Thread(target=log_records, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    stop_now.wait(5)
+    writer.stop()
+    for thread in threads:
+        thread.join()
+    stats = writer.stats()
+    assert len(lines(log_file)) == stats['queued'] == stats['written']
+    assert stats['queued'] + stats['after_stop'] == 20_000
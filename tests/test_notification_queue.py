@@ -0,0 +1,223 @@
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from email import message_from_bytes
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notification_queue import NotificationQueue, NotificationRejected  # noqa: E402
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib. Recipients containing 'bounce' are refused with 550."""
+    def handle(self):
+        relay = self.server
+        with relay.lock:
+            relay.connections += 1
+            relay.sockets.add(self.connection)
+        try:
+            self._converse(relay)
+        except OSError:
+            pass
+        finally:
+            with relay.lock:
+                relay.sockets.discard(self.connection)
+
+    def _converse(self, relay):
+        self._reply('220 fake-relay ESMTP')
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == 'EHLO':
+                self._reply('250-fake-relay\r\n250 8BITMIME')
+            elif verb in ('HELO', 'MAIL', 'RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                self._reply('550 No such user' if 'bounce' in command else '250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for line in self.rfile:
+                    if line in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(line[1:] if line.startswith(b'..') else line)
+                with relay.lock:
+                    relay.received.append(message_from_bytes(b''.join(data))['X-Notification-Id'])
+                self._reply('250 Queued')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Not implemented')
+
+    def _reply(self, text):
+        self.wfile.write(text.encode() + b'\r\n')
+
+
+class FakeSMTPRelay(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0):
+        super().__init__(('127.0.0.1', port), FakeSMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.received = []
+        self.sockets = set()
+        threading.Thread(target=self.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def down(self):
+        """Stops accepting and drops every open connection, like a relay crash."""
+        self.shutdown()
+        self.server_close()
+        with self.lock:
+            for sock in self.sockets:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+@pytest.fixture
+def relay():
+    server = FakeSMTPRelay()
+    yield server
+    server.down()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+
+    def make(host='127.0.0.1', port=25, **options):
+        options.setdefault('backoff', 0.05)
+        options.setdefault('max_backoff', 0.2)
+        notifications = NotificationQueue(host, port, spool_dir=str(tmp_path / 'spool'), **options)
+        queues.append(notifications)
+        return notifications
+    yield make
+    for notifications in queues:
+        notifications.stop()
+
+
+def test_unexpected_error_mid_batch_spools_the_batch_and_retries(relay, make_queue):
+    notifications = make_queue(port=relay.port, batch_wait=0.2)
+    email, failures = notifications._email, []
+
+    def fail_once(message):
+        if not failures:
+            failures.append(message['id'])
+            raise RuntimeError("template engine crashed")
+        return email(message)
+    notifications._email = fail_once
+    notifications.start()
+    ids = [notifications.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.') for i in range(2)]
+
+    assert notifications.flush(5)
+    assert sorted(relay.received) == sorted(ids)
+    assert notifications._queue.unfinished_tasks == 0
+    stats = notifications.stats()
+    assert stats['worker_errors'] == 1
+    assert stats['sent'] == 2
+
+
+def test_enqueue_rejects_overflow_without_touching_the_spool(make_queue, tmp_path):
+    notifications = make_queue(host=None, max_queue=2)      # not started: nothing takes messages off
+    notifications.enqueue('a@example.com', 'Order', 'Confirmed.')
+    notifications.enqueue('b@example.com', 'Order', 'Confirmed.')
+    with pytest.raises(NotificationRejected):
+        notifications.enqueue('c@example.com', 'Order', 'Confirmed.')
+    assert not (tmp_path / 'spool').exists()
+    assert notifications.stats()['rejected'] == 1
+
+    notifications.stop()                                     # queued messages are kept in the spool
+    assert len(list((tmp_path / 'spool').glob('*.json'))) == 2
+    with pytest.raises(NotificationRejected):
+        notifications.enqueue('d@example.com', 'Order', 'Confirmed.')
+
+
+def test_messages_are_sent_in_batches_over_one_connection(relay, make_queue):
+    notifications = make_queue(port=relay.port, batch_size=10)
+    ids = [notifications.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.') for i in range(25)]
+    notifications.start()                                   # everything is queued before the worker runs
+    assert notifications.flush(5)
+    assert sorted(relay.received) == sorted(ids)
+    stats = notifications.stats()
+    assert (stats['sent'], stats['batches'], stats['connections']) == (25, 3, 1)
+    assert relay.connections == 1
+
+
+def test_messages_spool_while_the_relay_is_down_and_are_sent_once_it_is_back(make_queue, tmp_path):
+    relay = FakeSMTPRelay()
+    port = relay.port
+    relay.down()
+    notifications = make_queue(port=port).start()
+    ids = [notifications.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.') for i in range(3)]
+    assert wait_for(lambda: len(list((tmp_path / 'spool').glob('*.json'))) == 3)
+    assert notifications.stats()['relay_state'] == 'down'
+    assert notifications._queue.unfinished_tasks == 0
+
+    revived = FakeSMTPRelay(port=port)
+    try:
+        assert notifications.flush(5)
+        assert sorted(revived.received) == sorted(ids)
+        assert notifications.stats()['relay_state'] == 'up'
+        assert not list((tmp_path / 'spool').glob('*.json*'))
+    finally:
+        revived.down()
+
+
+def test_spooled_messages_are_claimed_by_rename_once(make_queue, tmp_path):
+    writer = make_queue(host=None)
+    for i in range(5):
+        writer.enqueue(f'user{i}@example.com', 'Order', 'Confirmed.')
+    writer.stop()                                           # spools what is queued
+    first, second = make_queue(host=None), make_queue(host=None)
+    claimed = first._claim_spooled(2)
+    rest = second._claim_spooled(10)
+    assert len(claimed) == 2 and len(rest) == 3
+    assert {message['id'] for message, _ in claimed}.isdisjoint(message['id'] for message, _ in rest)
+    assert all(path.endswith(f'.claimed-{os.getpid()}') for _, path in claimed + rest)
+    assert not list((tmp_path / 'spool').glob('*.json'))
+    assert second._claim_spooled(10) == []
+
+
+def test_claims_of_dead_processes_are_released_on_start(make_queue, tmp_path):
+    spool = tmp_path / 'spool'
+    spool.mkdir()
+    message = {'id': 'abc', 'to': 'a@example.com', 'subject': 'Order', 'body': 'Confirmed.',
+               'attempts': 0, 'queued_at': 1.0}
+    name = spool / '00000000000001000000-abc.json'
+    (spool / (name.name + '.claimed-999999999')).write_text(json.dumps(message))
+    make_queue(host=None).start()
+    assert name.exists()
+
+
+def test_permanently_refused_recipient_is_dead_lettered(relay, make_queue, tmp_path):
+    notifications = make_queue(port=relay.port).start()
+    bounced = notifications.enqueue('bounce@example.com', 'Order', 'Confirmed.')
+    delivered = notifications.enqueue('user@example.com', 'Order', 'Confirmed.')
+    assert notifications.flush(5)
+    assert relay.received == [delivered]
+    dead = json.loads((tmp_path / 'spool' / 'dead' / f'{bounced}.json').read_text())
+    assert '550' in dead['error']
+    assert notifications.stats()['dead_letters'] == 1
@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_store import PoolTimeout, SQLiteOrderStore  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteOrderStore(str(tmp_path / 'orders.db'), pool_size=4)
+    store.seed_inventory({'widget': 50, 'gadget': 3})
+    yield store
+    store.close()
+
+
+def order_until_sold_out(store, prefix):
+    """Orders one widget at a time until the store refuses; returns how many succeeded."""
+    created = 0
+    while store.create_order(f'{prefix}-{created}', 'widget', 1) is not None:
+        created += 1
+    return created
+
+
+def order_in_process(path, prefix, results):
+    results.put(order_until_sold_out(SQLiteOrderStore(path, pool_size=1), prefix))
+
+
+def test_concurrent_threads_never_oversell(store):
+    counts = []
+    threads = [threading.Thread(target=lambda i=i: counts.append(order_until_sold_out(store, f't{i}')))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(counts) == 50
+    assert store.snapshot(['widget']) == {'widget': {'stock': 0, 'orders': 50, 'ordered': 50}}
+    assert store.stats()['orders_created'] == 50
+
+
+def test_concurrent_processes_sharing_the_database_never_oversell(store):
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=order_in_process, args=(store.path, f'p{i}', results)) for i in range(4)]
+    for worker in workers:
+        worker.start()
+    counts = [results.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert sum(counts) == 50
+    assert store.snapshot() == {'widget': {'stock': 0, 'orders': 50, 'ordered': 50},
+                                'gadget': {'stock': 3, 'orders': 0, 'ordered': 0}}
+
+
+def test_an_order_larger_than_the_stock_changes_nothing(store):
+    assert store.create_order('o1', 'gadget', 4) is None
+    assert store.create_order('o2', 'unknown', 1) is None
+    order, remaining = store.create_order('o3', 'gadget', 3)
+    assert (order['id'], remaining) == ('o3', 0)
+    assert store.get_order('o1') is None
+    assert store.get_order('o3')['quantity'] == 3
+    assert store.stats()['out_of_stock'] == 2
+
+
+def test_seeding_keeps_existing_stock(store):
+    store.create_order('o1', 'widget', 5)
+    store.seed_inventory({'widget': 50, 'gizmo': 7})
+    assert store.all_stock() == {'widget': 45, 'gadget': 3, 'gizmo': 7}
+
+
+def test_callers_beyond_the_pool_time_out(tmp_path):
+    store = SQLiteOrderStore(str(tmp_path / 'orders.db'), pool_size=1, pool_timeout=0.05)
+    with store.pool.connection():
+        with pytest.raises(PoolTimeout):
+            store.all_stock()
+    assert store.all_stock() == {}
+    assert store.pool.stats()['timeouts'] == 1
+    store.close()
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payment_client import (CircuitBreaker, CircuitOpen, PaymentClient, PaymentError,  # noqa: E402
+                            PaymentVersionUnsupported)
+
+
+class FakePaymentHandler(BaseHTTPRequestHandler):
+    """Answers each path with the server's configured (status, body); unknown paths get 404."""
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests.append((self.path, self.headers.get('Idempotency-Key'), payload))
+            status, body = server.routes.get(self.path, (404, b'{"error": "not found"}'))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def payment_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakePaymentHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.routes = {'/api/v3/payments/process': (200, b'{"status": "paid"}')}
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_paid_call_sends_the_order_id_as_idempotency_key(payment_server):
+    client = PaymentClient(payment_server.url)
+    assert client.process('ord_42', 9.5) == {'status': 'paid'}
+    assert payment_server.requests == [('/api/v3/payments/process', 'ord_42', {'order_id': 'ord_42', 'amount': 9.5})]
+    assert client.version == 'v3'
+    assert client.stats()['outcomes'] == {'succeeded': 1}
+
+
+@pytest.mark.parametrize('status', [404, 405, 410])
+def test_falls_back_to_an_older_version_while_endpoints_are_missing(payment_server, status):
+    payment_server.routes = {'/api/v3/payments/process': (status, b'{}'),
+                             '/api/v2/process-payment': (200, b'{"status": "paid"}')}
+    client = PaymentClient(payment_server.url)
+    assert client.process('ord_1', 1.0) == {'status': 'paid'}
+    assert client.version == 'v2'
+    assert [path for path, _, _ in payment_server.requests] == ['/api/v3/payments/process',
+                                                               '/api/v2/process-payment']
+    client.process('ord_2', 1.0)                      # the negotiated version is tried first from now on
+    assert payment_server.requests[-1][0] == '/api/v2/process-payment'
+
+
+def test_no_supported_version_raises(payment_server):
+    payment_server.routes = {}
+    client = PaymentClient(payment_server.url)
+    with pytest.raises(PaymentVersionUnsupported):
+        client.process('ord_1', 1.0)
+    assert client.version is None
+
+
+@pytest.mark.parametrize('body', [b'<html>OK</html>', b'{"status": '])
+def test_success_status_with_unreadable_body_is_a_failure(payment_server, body):
+    payment_server.routes = {'/api/v3/payments/process': (200, body)}
+    breaker = CircuitBreaker('payment-service', failure_threshold=1)
+    client = PaymentClient(payment_server.url, breaker=breaker)
+    with pytest.raises(PaymentError):
+        client.process('ord_1', 1.0)
+    assert client.stats()['outcomes'] == {'invalid_response': 1}
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_rejection_does_not_count_against_the_service(payment_server):
+    payment_server.routes = {'/api/v3/payments/process': (402, b'{"error": "card declined"}')}
+    breaker = CircuitBreaker('payment-service', failure_threshold=1)
+    client = PaymentClient(payment_server.url, breaker=breaker)
+    with pytest.raises(PaymentError):
+        client.process('ord_1', 1.0)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_opens_fails_fast_and_closes_after_a_half_open_probe(payment_server):
+    clock = FakeClock()
+    breaker = CircuitBreaker('payment-service', failure_threshold=2, reset_timeout=10.0, clock=clock)
+    client = PaymentClient(payment_server.url, breaker=breaker)
+    payment_server.routes = {'/api/v3/payments/process': (503, b'{}')}
+    for _ in range(2):
+        with pytest.raises(PaymentError):
+            client.process('ord_1', 1.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    calls = len(payment_server.requests)
+    with pytest.raises(CircuitOpen):
+        client.process('ord_1', 1.0)
+    assert len(payment_server.requests) == calls      # failed fast, without a request
+
+    clock.now += 10.0                                 # half-open: one probe goes through and fails
+    with pytest.raises(PaymentError) as failed:
+        client.process('ord_1', 1.0)
+    assert not isinstance(failed.value, CircuitOpen)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 10.0                                 # the next probe succeeds and closes the circuit
+    payment_server.routes = {'/api/v3/payments/process': (200, b'{"status": "paid"}')}
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()                        # only half_open_max_calls probes at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert client.process('ord_1', 1.0) == {'status': 'paid'}
+    assert breaker.stats()['transitions'] == {'closed->open': 1, 'open->half_open': 2,
+                                              'half_open->open': 1, 'half_open->closed': 1}
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import networkx as nx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_graph import GraphQueryEngine  # noqa: E402
+from reachability import attach_reachability_index, build_reachability_index  # noqa: E402
+
+
+@pytest.fixture
+def diamond_engine(tmp_path):
+    """a -> b -> d and a -> c -> d, with a shortcut a -> d, then d -> e."""
+    graph = nx.DiGraph()
+    for name in 'abcde':
+        graph.add_node(name, type='Function', name=name)
+    for src, dst in [('a', 'b'), ('a', 'c'), ('b', 'd'), ('c', 'd'), ('a', 'd'), ('d', 'e')]:
+        graph.add_edge(src, dst, type='CALLS')
+    path = tmp_path / 'diamond.graphml'
+    nx.write_graphml(graph, path)
+    return GraphQueryEngine(str(path))
+
+
+def test_bounded_neighbourhood_keeps_nodes_also_reachable_in_fewer_hops(diamond_engine):
+    assert sorted(diamond_engine.bounded_neighbourhood('a', ['CALLS'], 'out', 1, 1)) == ['b', 'c', 'd']
+    assert sorted(diamond_engine.bounded_neighbourhood('a', ['CALLS'], 'out', 2, 3)) == ['d', 'e']
+    assert sorted(diamond_engine.bounded_neighbourhood('e', ['CALLS'], 'in', 2, 2)) == ['a', 'b', 'c']
+
+
+def test_variable_length_query_over_the_shortcut(diamond_engine):
+    rows = diamond_engine.query("MATCH (s {name: 'a'})-[:CALLS*2..3]->(f:Function) RETURN f")
+    assert sorted(row['f'] for row in rows) == ['d', 'e']
+
+
+def routed_graph():
+    """GET /x routes to a, which calls b, which calls c."""
+    graph = nx.DiGraph()
+    graph.add_node('GET /x', type='Endpoint', method='GET', path='/x', rule='/x')
+    for name in 'abc':
+        graph.add_node(name, type='Function', name=name)
+    graph.add_edge('GET /x', 'a', type='ROUTES_TO')
+    graph.add_edge('a', 'b', type='CALLS')
+    graph.add_edge('b', 'c', type='CALLS')
+    return graph
+
+
+def test_reachability_index_covers_endpoints_through_their_routes(tmp_path):
+    path = tmp_path / 'routed.graphml'
+    graph = routed_graph()
+    attach_reachability_index(graph, build_reachability_index(graph))
+    nx.write_graphml(graph, path)
+    engine = GraphQueryEngine(str(path))
+    assert engine.can_reach('GET /x', 'c')
+    assert engine.find_entry_endpoints('c') == ['GET /x']
+    assert sorted(engine.find_callers('c')) == ['a', 'b']
+    assert sorted(engine.find_callees('GET /x')) == ['a', 'b', 'c']
+
+
+def test_index_persisted_over_calls_only_is_rebuilt_on_load(tmp_path):
+    path = tmp_path / 'routed.graphml'
+    graph = routed_graph()
+    attach_reachability_index(graph, build_reachability_index(graph, edge_types=('CALLS',)))
+    nx.write_graphml(graph, path)
+    assert GraphQueryEngine(str(path)).find_entry_endpoints('b') == ['GET /x']
@@ -0,0 +1,78 @@
+import os
+import random
+import sys
+
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_metrics import (MAX_TRACKABLE_US, HdrHistogram, RequestMetrics, _bounds, _index,  # noqa: E402
+                             instrument_flask)
+
+
+def sample_values():
+    rng = random.Random(3)
+    return list(range(5000)) + [rng.randrange(1 << bits) for bits in range(12, 43) for _ in range(200)]
+
+
+def test_every_value_falls_within_its_bucket_bounds():
+    for value in sample_values():
+        lowest, highest = _bounds(_index(value))
+        assert lowest <= value <= highest
+
+
+def test_buckets_tile_the_value_range_without_gaps_or_overlaps():
+    next_lowest = 0
+    for index in range(_index(MAX_TRACKABLE_US) + 1):
+        lowest, highest = _bounds(index)
+        assert lowest == next_lowest and highest >= lowest
+        next_lowest = highest + 1
+    assert next_lowest > MAX_TRACKABLE_US
+
+
+def test_bucket_width_stays_under_one_percent_of_its_values():
+    for value in sample_values():
+        lowest, highest = _bounds(_index(value))
+        assert highest - lowest <= max(0, value) / 100
+
+
+def test_percentiles_are_within_one_bucket_of_the_exact_value():
+    histogram = HdrHistogram()
+    values = list(range(1, 100001))
+    random.Random(5).shuffle(values)
+    for value in values:
+        histogram.record(value)
+    for p, reported in histogram.percentiles().items():
+        exact = int(100000 * p / 100)
+        assert exact <= reported <= exact * 1.01
+
+
+def test_merge_matches_recording_everything_in_one_histogram():
+    together, first, second = HdrHistogram(), HdrHistogram(), HdrHistogram()
+    for i, value in enumerate(sample_values()):
+        together.record(value)
+        (first if i % 2 else second).record(value)
+    first.merge(second)
+    assert first.counts == together.counts
+    assert first.to_dict(buckets=True) == together.to_dict(buckets=True)
+
+
+def test_routes_are_named_by_url_rule():
+    app = Flask(__name__)
+
+    @app.route('/jobs/<job_id>')
+    def job(job_id):
+        if job_id == 'boom':
+            raise RuntimeError(job_id)
+        return job_id
+
+    metrics = instrument_flask(app, RequestMetrics(capacity=4))
+    client = app.test_client()
+    for path in ['/jobs/1', '/jobs/2', '/jobs/boom', '/missing']:
+        client.get(path)
+    routes = metrics.snapshot()['routes']
+    assert routes['GET /jobs/<job_id>']['statuses'] == {'200': 2, '500': 1}
+    assert routes['GET /jobs/<job_id>']['errors'] == 1
+    assert routes['GET /jobs/<job_id>']['in_flight'] == 0
+    assert routes['GET <unmatched>']['statuses'] == {'404': 1}
+    assert metrics.snapshot()['process']['requests'] == 4
@@ -0,0 +1,115 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from result_cache import ResultCache  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class GatedLoader:
+    """A loader that blocks until released, counting its calls."""
+    def __init__(self, value='loaded', error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def load_concurrently(cache, key, loader, callers):
+    results, threads = [], []
+    for _ in range(callers):
+        def call():
+            try:
+                results.append(cache.get_or_load(key, loader))
+            except Exception as e:
+                results.append(e)
+        threads.append(threading.Thread(target=call))
+        threads[-1].start()
+    return results, threads
+
+
+def wait_for_waiters(cache, count):
+    for _ in range(500):
+        if cache.stats()['coalesced'] == count:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"{cache.stats()['coalesced']} callers waiting, expected {count}")
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ResultCache('test')
+    loader = GatedLoader()
+    results, threads = load_concurrently(cache, 'q', loader, 8)
+    loader.started.wait(5)
+    wait_for_waiters(cache, 7)
+    loader.release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ['loaded'] * 8
+    assert loader.calls == 1
+    assert cache.get_or_load('q', GatedLoader('other')) == 'loaded'
+    stats = cache.stats()
+    assert (stats['misses'], stats['coalesced'], stats['hits'], stats['in_flight']) == (1, 7, 1, 0)
+
+
+def test_a_failed_load_reaches_every_waiter_and_is_not_cached():
+    cache = ResultCache('test')
+    loader = GatedLoader(error=ValueError('backend down'))
+    results, threads = load_concurrently(cache, 'q', loader, 4)
+    loader.started.wait(5)
+    wait_for_waiters(cache, 3)
+    loader.release.set()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 4 and all(isinstance(result, ValueError) for result in results)
+    assert loader.calls == 1
+    assert cache.get_or_load('q', lambda: 'recovered') == 'recovered'
+    assert cache.stats()['load_errors'] == 1
+
+
+def test_clear_discards_results_of_loads_already_in_flight():
+    cache = ResultCache('test')
+    stale = GatedLoader('stale')
+    results, threads = load_concurrently(cache, 'q', stale, 1)
+    stale.started.wait(5)
+    cache.clear()                                           # e.g. the catalog was reloaded
+    assert cache.get_or_load('q', lambda: 'fresh') == 'fresh'
+    stale.release.set()
+    threads[0].join()
+    assert results == ['stale']                             # its own caller still gets it...
+    assert cache.get_or_load('q', lambda: 'reloaded') == 'fresh'   # ...but it never replaces the fresh entry
+
+
+def test_entries_expire_after_ttl_and_least_recently_used_are_evicted():
+    clock = FakeClock()
+    cache = ResultCache('test', max_entries=2, ttl=5.0, clock=clock)
+    cache.get_or_load('a', lambda: 1)
+    cache.get_or_load('b', lambda: 2)
+    cache.get_or_load('a', pytest.fail)                     # hit: 'a' becomes most recently used
+    cache.get_or_load('c', lambda: 3)                       # evicts 'b'
+    assert cache.get_or_load('b', lambda: 'reloaded') == 'reloaded'
+    clock.now = 5.0
+    assert cache.get_or_load('b', lambda: 'expired') == 'expired'
+    stats = cache.stats()
+    assert (stats['evictions'], stats['expirations'], stats['entries']) == (2, 1, 2)
@@ -0,0 +1,107 @@
+import math
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import search_index  # noqa: E402
+from search_index import ProductSearchIndex, tokenize  # noqa: E402
+
+WORDS = ['red', 'blue', 'green', 'steel', 'wooden', 'chair', 'table', 'lamp', 'desk', 'shelf']
+CATEGORIES = ['furniture', 'lighting', 'office', 'garden']
+
+
+def catalog(count, seed=7):
+    rng = random.Random(seed)
+    return [{'id': i, 'name': ' '.join(rng.sample(WORDS, rng.randint(1, 3))),
+             'category': rng.choice(CATEGORIES), 'stock': rng.choice([0, 0, 3, 10])} for i in range(count)]
+
+
+def reference_scores(products, query):
+    """Scores of every product matching all of the query's words, computed by brute force."""
+    counts = {}
+    for product in products:
+        for term in set(tokenize(product['name']) + tokenize(product['category'])):
+            counts[term] = counts.get(term, 0) + 1
+    scores = {}
+    for product in products:
+        name, category = set(tokenize(product['name'])), set(tokenize(product['category']))
+        score = 0.0
+        for word in tokenize(query):
+            if word not in name and word not in category:
+                break
+            weight = search_index.NAME_WEIGHT * (word in name) + search_index.CATEGORY_WEIGHT * (word in category)
+            if product['stock'] <= 0:
+                weight *= search_index.OUT_OF_STOCK_FACTOR
+            score += math.log(1 + len(products) / counts[word]) * weight
+        else:
+            scores[product['id']] = round(score, 4)
+    return scores
+
+
+def assert_top_matches(index, products, query, limit):
+    expected = reference_scores(products, query)
+    hits = index.search(query, limit=limit, prefix=False)
+    assert [hit['score'] for hit in hits] == sorted(expected.values(), reverse=True)[:limit]
+    assert all(expected[hit['id']] == hit['score'] for hit in hits)
+
+
+@pytest.mark.parametrize('query', ['chair', 'red chair', 'steel desk lamp', 'office', 'green furniture'])
+def test_search_returns_the_best_scoring_products_from_postings(query):
+    products = catalog(500)
+    index = ProductSearchIndex()
+    index.add_products(products)
+    assert index.stats()['bitmap_terms'] == 0
+    assert_top_matches(index, products, query, limit=10)
+
+
+@pytest.mark.parametrize('query', ['red chair', 'steel desk lamp', 'green furniture', 'office lamp'])
+@pytest.mark.parametrize('limit', [3, 200])    # scanning level combinations, and scoring the intersection directly
+def test_search_returns_the_best_scoring_products_from_bitmaps(monkeypatch, query, limit):
+    monkeypatch.setattr(search_index, 'BITMAP_MIN_DF', 16)
+    products = catalog(2000)
+    index = ProductSearchIndex()
+    index.add_products(products)
+    assert index.stats()['bitmap_terms'] == len(WORDS) + len(CATEGORIES)
+    assert_top_matches(index, products, query, limit)
+
+
+def test_stock_changes_and_removals_are_reflected_in_results():
+    index = ProductSearchIndex()
+    index.add_products([{'id': 'a', 'name': 'Red Chair', 'category': 'Furniture', 'stock': 5},
+                        {'id': 'b', 'name': 'Red Chair Deluxe', 'category': 'Furniture', 'stock': 0}])
+    assert [hit['id'] for hit in index.search('red chair')] == ['a', 'b']
+    index.update_stock('a', 0)
+    index.update_stock('b', 2)
+    assert [hit['id'] for hit in index.search('red chair')] == ['b', 'a']
+    assert index.remove_product('b')
+    assert [hit['id'] for hit in index.search('deluxe')] == []
+    assert [hit['id'] for hit in index.search('red chair')] == ['a']
+
+
+def test_last_word_is_completed_as_a_prefix():
+    index = ProductSearchIndex()
+    index.add_products([{'id': 1, 'name': 'Desk Lamp', 'category': 'Lighting', 'stock': 1},
+                        {'id': 2, 'name': 'Desk Organiser', 'category': 'Office', 'stock': 1},
+                        {'id': 3, 'name': 'Lamp Shade', 'category': 'Lighting', 'stock': 1}])
+    assert sorted(hit['id'] for hit in index.search('desk la')) == [1]
+    assert sorted(hit['id'] for hit in index.search('la')) == [1, 3]
+    assert index.search('la', prefix=False) == []
+    assert index.suggest('desk l') == ['desk lamp', 'desk lighting']
+    assert index.suggest('desk ') == []
+
+
+def test_suggestions_follow_term_counts_as_products_are_added_and_removed():
+    index = ProductSearchIndex()
+    index.add_products([{'id': 1, 'name': 'Lamp'}, {'id': 2, 'name': 'Lamp'}, {'id': 3, 'name': 'Ladder'}])
+    assert index.suggest('la') == ['lamp', 'ladder']
+    index.add_product(4, 'Ladder')
+    index.add_product(5, 'Ladder')
+    assert index.suggest('la') == ['ladder', 'lamp']
+    index.remove_product(4)
+    index.remove_product(5)
+    index.remove_product(3)
+    assert index.suggest('la') == ['lamp']
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Virtual Clock
+
+The clocks enhanced_ecommerce_runner.py reads every timestamp from and
+sleeps through:
+
+- SystemClock: real time. sleep() blocks.
+- VirtualClock: simulated time, starting at any datetime. sleep() returns at
+  once and moves the clock forward, so hours of incident timeline are
+  generated in milliseconds, with timestamps that are spaced as if the
+  sleeps had happened.
+
+use_for_logging() stamps log records with a clock, so `%(asctime)s` in every
+handler shows simulated time too.
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+
+
+class SystemClock:
+    """Wall-clock time."""
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    def advance(self, seconds: float):
+        """Accounts for `seconds` of real work done outside the clock; they have already passed."""
+
+
+class VirtualClock:
+    """
+    Simulated time from `start` (default: now). It only moves through sleep()
+    and advance(); both return immediately. Thread-safe.
+    """
+    def __init__(self, start: datetime = None):
+        self.start = start or datetime.now()
+        self._epoch = self.start.timestamp()
+        self._elapsed = 0.0         # kept apart from the epoch so small sleeps do not lose precision
+        self._lock = threading.Lock()
+        self.sleeps = 0
+
+    @property
+    def elapsed(self) -> float:
+        """Simulated seconds since start."""
+        return self._elapsed
+
+    def time(self) -> float:
+        return self._epoch + self._elapsed
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time(), tz=self.start.tzinfo)
+
+    def sleep(self, seconds: float):
+        if seconds < 0:
+            raise ValueError("sleep length must be non-negative")
+        with self._lock:
+            self._elapsed += seconds
+            self.sleeps += 1
+
+    def advance(self, seconds: float):
+        """Moves the clock past `seconds` of real work (e.g. a live load test) done meanwhile."""
+        if seconds < 0:
+            raise ValueError("cannot move the clock backwards")
+        with self._lock:
+            self._elapsed += seconds
+
+
+def use_for_logging(clock):
+    """
+    Makes every log record created from now on carry `clock`'s time instead of
+    the wall clock's. Returns a function that restores the previous record
+    factory.
+    """
+    previous = logging.getLogRecordFactory()
+    installed = clock.time()
+
+    def record_factory(*args, **kwargs):
+        record = previous(*args, **kwargs)
+        created = clock.time()
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        record.relativeCreated = (created - installed) * 1000
+        return record
+
+    logging.setLogRecordFactory(record_factory)
+    return lambda: logging.setLogRecordFactory(previous)